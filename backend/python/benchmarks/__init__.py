@@ -0,0 +1,6 @@
+"""Offline end-to-end benchmarks for the letter generators.
+
+fake_openai      local chat-completions stand-in (selected via OPENAI_BASE_URL)
+run_benchmarks   scenarios for every generator mode with throughput and p50/p95/p99
+table_benchmark  in-process timing of 1,000-row annexure tables
+"""
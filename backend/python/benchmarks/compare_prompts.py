@@ -0,0 +1,194 @@
+# backend/python/benchmarks/compare_prompts.py
+"""Side-by-side comparison of the NFA prompt profiles (full vs compact).
+
+Runs generate_ai_nfa_from_summary from both generators under every prompt
+profile for a few sample requests and reports, per generator and profile:
+prompt size, the prefix shared by every request (what the API can reuse
+from its prompt cache), token usage, latency and the structure of the
+output (subject line, request paragraph length, bullet count).
+
+By default it runs offline against the fake OpenAI server, so latency and
+token counts only reflect prompt size; pass --base-url (and set
+BENCHMARK_OPENAI_API_KEY) to compare against a real endpoint.
+
+Usage (from backend/python):
+    python -m benchmarks.compare_prompts
+    python -m benchmarks.compare_prompts --iterations 5 --latency-ms 800 --tokens-per-second 60
+"""
+import os
+import re
+import sys
+import json
+import time
+
+from benchmarks.fake_openai import start_fake_server
+
+SAMPLES = [
+    {"subject": "Workshop on Applied Machine Learning", "nfa_type": "advance", "need_bullets": True,
+     "summary": "Two-day national workshop on applied machine learning for 120 participants with invited industry speakers"},
+    {"subject": "Annual Cultural Fest", "nfa_type": "reimbursement", "need_bullets": False,
+     "summary": "Reimbursement of stage, sound and hospitality expenses for the three-day annual cultural fest"},
+    {"subject": "Hackathon Prize Money", "nfa_type": "advance", "need_bullets": True,
+     "summary": "Prize money and mentoring costs for a 24-hour inter-university hackathon with 40 teams"},
+]
+
+# ==========================
+# Measurements
+# ==========================
+def messages_text(messages):
+    return "\n".join(message["content"] for message in messages)
+
+def shared_prefix_chars(texts):
+    """Length of the prefix common to every prompt"""
+    prefix = os.path.commonprefix(texts)
+    return len(prefix)
+
+def output_structure(text, subject_prefix):
+    """What the generated text looks like: subject line, request paragraph sentences, bullets"""
+    from nfa_sections import CONCLUSION, split_sections, classify_sections
+
+    sections = split_sections(text)
+    first = sections[0] if sections else ""
+    request = next((section for section in sections if section.startswith("Request for approval regarding")), "")
+    bullets = [line for line in text.split("\n") if line.strip().startswith("•")]
+    return {
+        "subject_line": first.startswith("Subject:") == subject_prefix,
+        "request_paragraph": bool(request),
+        "request_sentences": len([s for s in re.split(r"(?<=[.!?])\s+", request) if s.strip()]),
+        "bullets": len(bullets),
+        "conclusions": sum(1 for kind, _ in classify_sections(text) if kind == CONCLUSION),
+        "words": len(text.split()),
+    }
+
+def mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+# ==========================
+# Runs
+# ==========================
+def run_profile(module, profile, subject_prefix, iterations):
+    """Generate every sample `iterations` times with one profile; returns the aggregated report"""
+    from letter_common import start_timer
+    from nfa_prompts import COMPACT, compact_generate_messages
+
+    prompts = []
+    for sample in SAMPLES:
+        if profile == COMPACT:
+            messages = compact_generate_messages(sample["subject"], sample["summary"], sample["nfa_type"],
+                                                 sample["need_bullets"], subject_prefix=subject_prefix)
+        else:
+            messages = module.build_full_generate_messages(sample["subject"], sample["summary"],
+                                                           sample["nfa_type"], sample["need_bullets"])
+        prompts.append(messages_text(messages))
+
+    latencies, prompt_tokens, completion_tokens, cached_tokens = [], [], [], []
+    structures = []
+    for _ in range(iterations):
+        for sample in SAMPLES:
+            timer = start_timer()
+            started = time.perf_counter()
+            text = module.generate_ai_nfa_from_summary(sample["subject"], sample["summary"], sample["nfa_type"],
+                                                       need_bullets=sample["need_bullets"], prompt_profile=profile)
+            latencies.append((time.perf_counter() - started) * 1000)
+            for call in timer.llm_usage:
+                prompt_tokens.append(call["prompt_tokens"])
+                completion_tokens.append(call["completion_tokens"])
+                cached_tokens.append(call["cached_prompt_tokens"])
+            structure = output_structure(text, subject_prefix)
+            structure["bullets_ok"] = structure["bullets"] == (3 if sample["need_bullets"] else 0)
+            structures.append(structure)
+
+    return {
+        "prompt_chars_mean": mean([len(prompt) for prompt in prompts]),
+        "shared_prefix_chars": shared_prefix_chars(prompts),
+        "prompt_tokens_mean": mean(prompt_tokens),
+        "cached_prompt_tokens_mean": mean(cached_tokens),
+        "completion_tokens_mean": mean(completion_tokens),
+        "latency_ms_mean": mean(latencies),
+        "structure": {
+            "subject_line_ok": sum(s["subject_line"] for s in structures),
+            "request_paragraph_ok": sum(s["request_paragraph"] for s in structures),
+            "request_sentences_mean": mean([s["request_sentences"] for s in structures]),
+            "bullets_ok": sum(s["bullets_ok"] for s in structures),
+            "conclusions_mean": mean([s["conclusions"] for s in structures]),
+            "words_mean": mean([s["words"] for s in structures]),
+            "outputs": len(structures),
+        },
+    }
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    options = {"iterations": 2, "latency_ms": 300.0, "tokens_per_second": 0.0, "base_url": None}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--iterations" and args:
+            options["iterations"] = max(1, int(args.pop(0)))
+        elif flag == "--latency-ms" and args:
+            options["latency_ms"] = float(args.pop(0))
+        elif flag == "--tokens-per-second" and args:
+            options["tokens_per_second"] = float(args.pop(0))
+        elif flag == "--base-url" and args:
+            options["base_url"] = args.pop(0)
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    return options
+
+def print_summary(report):
+    print(f"{'generator':<10}{'profile':<9}{'chars':>8}{'prefix':>8}{'p.tok':>8}{'c.tok':>7}{'ms':>9}"
+          f"  subject/request/bullets ok", file=sys.stderr)
+    for generator, profiles in report["generators"].items():
+        for profile, result in profiles.items():
+            structure = result["structure"]
+            checks = f"{structure['subject_line_ok']}/{structure['request_paragraph_ok']}/{structure['bullets_ok']} of {structure['outputs']}"
+            print(f"{generator:<10}{profile:<9}{result['prompt_chars_mean'] or 0:>8.0f}{result['shared_prefix_chars']:>8}"
+                  f"{result['prompt_tokens_mean'] or 0:>8.0f}{result['completion_tokens_mean'] or 0:>7.0f}"
+                  f"{result['latency_ms_mean'] or 0:>9.1f}  {checks}", file=sys.stderr)
+
+def main():
+    options = parse_args(sys.argv[1:])
+
+    server = None
+    base_url = options["base_url"]
+    if not base_url:
+        server = start_fake_server(latency_ms=options["latency_ms"], tokens_per_second=options["tokens_per_second"])
+        base_url = server.base_url
+    print(f"Comparing prompt profiles against {base_url}", file=sys.stderr)
+
+    # The generators create their OpenAI client from the environment on first use
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = os.environ.get("BENCHMARK_OPENAI_API_KEY", "fake-benchmark-key")
+    os.environ["LLM_CACHE_BYPASS"] = "1"
+
+    import generate_nfa_automation as original_nfa
+    import generate_nfa_automation_fixed as fixed_nfa
+    from nfa_prompts import PROMPT_PROFILES
+
+    report = {
+        "base_url": base_url,
+        "fake_latency_ms": None if options["base_url"] else options["latency_ms"],
+        "iterations": options["iterations"],
+        "samples": len(SAMPLES),
+        "generators": {},
+    }
+    # Warm-up: importing openai and creating the shared client is not part of any profile's latency
+    fixed_nfa.get_openai_client()
+    try:
+        for name, module, subject_prefix in (("original", original_nfa, True), ("fixed", fixed_nfa, False)):
+            report["generators"][name] = {
+                profile: run_profile(module, profile, subject_prefix, options["iterations"])
+                for profile in PROMPT_PROFILES
+            }
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    print_summary(report)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# backend/python/benchmarks/fake_openai.py
+"""Local stand-in for the OpenAI chat-completions API.
+
+Speaks POST /v1/chat/completions (plain JSON and SSE streaming) with canned
+NFA / edit / recommendation outputs and configurable latency, so the
+generators can be benchmarked offline:
+
+    python -m benchmarks.fake_openai --port 8089 --latency-ms 800 --tokens-per-second 60
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python generate_job_reco.py ...
+"""
+import re
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8089
+
+CANNED_NFA = """{subject}
+
+Request for approval regarding the two-day national workshop on applied machine learning for 120 participants. The event strengthens industry collaboration and hands-on research skills.
+
+• Sessions led by invited speakers from industry and academia on 12-13 March
+• Hands-on labs covering model training, evaluation and deployment
+• Certificates issued to all participants on completion"""
+
+CANNED_EDIT = """{subject}
+
+Request for approval regarding the revised workshop plan with an additional hands-on session. The change improves practical exposure for participants.
+
+• Sessions led by invited speakers from industry and academia
+• Extended hands-on labs on the second day
+
+The above proposal is submitted for approval."""
+
+CANNED_PARAGRAPH = (
+    "During the project, the candidate designed and delivered a reliable system, "
+    "showing strong analytical skills, ownership and clear communication with the team. "
+    "Their work measurably improved the outcome and reflects genuine technical depth."
+)
+
+# ==========================
+# Canned Responses
+# ==========================
+def pick_response(messages):
+    """Choose a canned completion from the prompt contents"""
+    text = "\n".join(str(m.get("content", "")) for m in messages)
+    subject = "NFA Request"
+    for line in text.splitlines():
+        if line.startswith("Subject:"):
+            subject = line.split(":", 1)[1].strip() or subject
+            break
+
+    if "### 1" in text:
+        return canned_section_edit(text)
+    if "NFA editor" in text or "MODIFICATION REQUEST" in text:
+        return CANNED_EDIT.format(subject=subject)
+    if "NFA" in text:
+        return CANNED_NFA.format(subject=subject)
+    return CANNED_PARAGRAPH
+
+def canned_section_edit(text):
+    """Echo each "### n" section of a section edit back with its first line revised"""
+    sections = []
+    for number, body in re.findall(r"^### (\d+)[^\n]*\n(.*?)(?:\n\n|\Z)", text, re.MULTILINE | re.DOTALL):
+        lines = body.split("\n")
+        lines[0] = lines[0].rstrip(".") + ", as revised."
+        sections.append(f"### {number}\n" + "\n".join(lines))
+    return "\n".join(sections)
+
+def estimate_tokens(text):
+    return max(1, int(len(text.split()) * 1.3))
+
+def split_tokens(text):
+    """Split text into word-sized deltas that re-join to the original"""
+    pieces = []
+    current = ""
+    for char in text:
+        current += char
+        if char in " \n":
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+# ==========================
+# HTTP Handler
+# ==========================
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            print(f"fake-openai - {format % args}", file=sys.stderr)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown route: {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown route: {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._send_json(400, {"error": {"message": f"Invalid JSON: {e}"}})
+            return
+
+        self.server.count_request()
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send_json(429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}})
+            return
+
+        messages = request.get("messages") or []
+        content = pick_response(messages)
+        usage = {
+            "prompt_tokens": estimate_tokens(" ".join(str(m.get("content", "")) for m in messages)),
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = request.get("model", "gpt-4o-mini")
+
+        self.server.sleep_first_token()
+        if request.get("stream"):
+            self._stream(model, content, usage, (request.get("stream_options") or {}).get("include_usage"))
+        else:
+            self.server.sleep_generation(content)
+            self._send_json(200, {
+                "id": f"chatcmpl-fake-{int(time.time() * 1000)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+    def _stream(self, model, content, usage, include_usage):
+        """Send the completion as SSE chunks paced at tokens_per_second"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        created = int(time.time())
+        base = {"id": f"chatcmpl-fake-{created}", "object": "chat.completion.chunk", "created": created, "model": model}
+
+        def send(payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        for piece in split_tokens(content):
+            self.server.sleep_token()
+            send({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+        send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if include_usage:
+            send({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=500, jitter_ms=0, tokens_per_second=0, error_rate=0.0, verbose=False):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def sleep_first_token(self):
+        delay = self.latency_ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def sleep_token(self):
+        if self.tokens_per_second:
+            time.sleep(1 / self.tokens_per_second)
+
+    def sleep_generation(self, content):
+        """Non-streaming responses still pay the generation time of their tokens"""
+        if self.tokens_per_second:
+            time.sleep(len(split_tokens(content)) / self.tokens_per_second)
+
+def start_fake_server(host="127.0.0.1", port=0, **options):
+    """Start a FakeOpenAIServer on a background thread; port 0 picks a free port"""
+    server = FakeOpenAIServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True)
+    thread.start()
+    return server
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    options = {"host": "127.0.0.1", "port": DEFAULT_PORT, "latency_ms": 500, "jitter_ms": 0,
+               "tokens_per_second": 0, "error_rate": 0.0, "verbose": True}
+    flags = {
+        "--host": ("host", str), "--port": ("port", int), "--latency-ms": ("latency_ms", float),
+        "--jitter-ms": ("jitter_ms", float), "--tokens-per-second": ("tokens_per_second", float),
+        "--error-rate": ("error_rate", float),
+    }
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag in flags and args:
+            key, cast = flags[flag]
+            options[key] = cast(args.pop(0))
+        elif flag == "--quiet":
+            options["verbose"] = False
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    return options
+
+def main():
+    options = parse_args(sys.argv[1:])
+    server = FakeOpenAIServer((options.pop("host"), options.pop("port")), **options)
+    print(f"✅ Fake OpenAI listening on {server.base_url} (set OPENAI_BASE_URL to this)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
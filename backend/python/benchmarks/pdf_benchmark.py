@@ -0,0 +1,136 @@
+# backend/python/benchmarks/pdf_benchmark.py
+"""In-process benchmark of the docx path against direct PDF rendering.
+
+Renders the same NFA (subject, body with bullets, an N-row annexure table,
+conclusion and signatures) as the fixed generator's docx (build, one-page
+fit, save to memory) and as a PDF with nfa_pdf.render_nfa_pdf, and reports
+per-stage timings and output sizes. No OpenAI calls and no files on disk.
+Needs reportlab.
+
+Usage (from backend/python):
+    python -m benchmarks.pdf_benchmark
+    python -m benchmarks.pdf_benchmark --rows 40 --repeats 20
+"""
+import sys
+import json
+import time
+
+import generate_nfa_automation_fixed as fixed_nfa
+from letter_storage import render_bytes
+from nfa_pdf import render_nfa_pdf, pdf_available
+
+DEFAULT_ROWS = 8
+DEFAULT_REPEATS = 10
+
+SUBJECT = "Subject: Approval for reimbursement of expenses for the National Robotics Workshop"
+BODY = (
+    "The School of Computer Science and Engineering conducted a two-day National Robotics Workshop on "
+    "12th and 13th September 2026 for undergraduate students, with hands-on sessions on embedded control, "
+    "sensor integration and autonomous navigation delivered by faculty and two industry experts.\n\n"
+    "The expenses incurred towards the event were met by the coordinator and are submitted for reimbursement:\n"
+    "• Honorarium and travel for the invited experts\n"
+    "• Robotics kits, consumables and printing of participant material\n"
+    "• Refreshments for participants and volunteers on both days\n\n"
+    "All bills and receipts have been verified by the department and are enclosed for reference."
+)
+CLOSING = "Approval is requested for the reimbursement of ₹1,24,500 as detailed in the annexure above."
+
+def make_table(rows):
+    """Header row, `rows` line items and the total row, as the frontend sends them"""
+    table = [["Sl. No.", "Item", "Quantity", "Amount (₹)"]]
+    for i in range(1, rows + 1):
+        table.append([str(i), f"Workshop expense item {i}", str(i % 5 + 1), f"{i * 1500:,}"])
+    table.append(["", "Total", "", f"{sum(i * 1500 for i in range(1, rows + 1)):,}"])
+    return table
+
+# ==========================
+# Scenarios
+# ==========================
+def render_docx(table_data):
+    """generate_nfa_automation_fixed.py: build the document, fit it on one page, save to memory"""
+    stages = {}
+    started = time.perf_counter()
+    doc = fixed_nfa.create_proper_nfa_document(SUBJECT, BODY, CLOSING, table_data, "reimbursement")
+    stages["render_document"] = time.perf_counter()
+    fixed_nfa.fit_to_single_page(doc)
+    stages["fit_layout"] = time.perf_counter()
+    data = render_bytes(doc)
+    stages["save"] = time.perf_counter()
+    return started, stages, len(data)
+
+def render_pdf(table_data):
+    """nfa_pdf.py: lay out and write the PDF in memory (including its own one-page fit)"""
+    stages = {}
+    started = time.perf_counter()
+    data, _ = render_nfa_pdf(SUBJECT, BODY, CLOSING, table_data, fixed_nfa.SIGNATURE_LAYOUT)
+    stages["render_pdf"] = time.perf_counter()
+    return started, stages, len(data)
+
+SCENARIOS = {
+    "docx": render_docx,
+    "pdf": render_pdf,
+}
+
+def run_scenario(render, table_data, repeats):
+    """Run one scenario `repeats` times; returns mean per-stage and best/mean total in ms plus the output size"""
+    totals = []
+    stage_sums = {}
+    size = 0
+    for _ in range(repeats):
+        started, stages, size = render(table_data)
+        previous = started
+        for name, finished in stages.items():
+            stage_sums[name] = stage_sums.get(name, 0.0) + (finished - previous) * 1000
+            previous = finished
+        totals.append((previous - started) * 1000)
+    return {
+        "stages_ms_mean": {name: round(total / repeats, 1) for name, total in stage_sums.items()},
+        "total_ms_mean": round(sum(totals) / repeats, 1),
+        "total_ms_best": round(min(totals), 1),
+        "output_bytes": size,
+    }
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    options = {"rows": DEFAULT_ROWS, "repeats": DEFAULT_REPEATS}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--rows" and args:
+            options["rows"] = int(args.pop(0))
+        elif flag == "--repeats" and args:
+            options["repeats"] = max(1, int(args.pop(0)))
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    return options
+
+def main():
+    if not pdf_available():
+        raise SystemExit("pdf_benchmark needs reportlab (pip install reportlab)")
+    options = parse_args(sys.argv[1:])
+    table_data = make_table(options["rows"])
+
+    # Warm-up: imports, the cached base template, header image and signature fragments
+    for render in SCENARIOS.values():
+        render(table_data)
+
+    report = {"rows": options["rows"], "repeats": options["repeats"], "scenarios": {}}
+    for name, render in SCENARIOS.items():
+        report["scenarios"][name] = run_scenario(render, table_data, options["repeats"])
+    docx_ms = report["scenarios"]["docx"]["total_ms_mean"]
+    pdf_ms = report["scenarios"]["pdf"]["total_ms_mean"]
+    report["pdf_vs_docx"] = round(pdf_ms / docx_ms, 2) if docx_ms else None
+
+    print(f"{'scenario':<10}{'mean ms':>10}{'best ms':>10}{'bytes':>10}  stages", file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        stages = ", ".join(f"{stage} {ms}" for stage, ms in result["stages_ms_mean"].items())
+        print(f"{name:<10}{result['total_ms_mean']:>10.1f}{result['total_ms_best']:>10.1f}"
+              f"{result['output_bytes']:>10}  {stages}", file=sys.stderr)
+    print(f"PDF takes {report['pdf_vs_docx']}x the docx render time", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# backend/python/benchmarks/run_benchmarks.py
+"""End-to-end benchmark scenarios for the letter generators.
+
+Starts the fake OpenAI server, points the generators at it through
+OPENAI_BASE_URL and drives every mode the backend uses (one process per
+request, exactly like server.js) plus the warm --serve worker. Reports
+throughput and p50/p95/p99 latency per scenario.
+
+Usage (from backend/python):
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --scenarios nfa_generate,job --iterations 50 --concurrency 8
+    python -m benchmarks.run_benchmarks --latency-ms 1500 --tokens-per-second 60 --output report.json
+    python -m benchmarks.run_benchmarks --list
+
+The JSON report is printed on stdout; a summary table goes to stderr.
+"""
+import sys
+import os
+import json
+import math
+import time
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_openai import start_fake_server
+
+python_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NFA_SCRIPT = os.path.join(python_dir, "generate_nfa_automation_fixed.py")
+JOB_SCRIPT = os.path.join(python_dir, "generate_job_reco.py")
+MS_SCRIPT = os.path.join(python_dir, "generate_ms_reco.py")
+
+SUMMARY = "Two-day national workshop on applied machine learning for 120 participants with invited industry speakers"
+TABLE_JSON = json.dumps([
+    ["slno", "item", "unit", "total"],
+    ["1", "Speaker honorarium", "4", "20000"],
+    ["2", "Lunch and refreshments", "240", "36000"],
+    ["3", "Printing and kits", "120", "12000"],
+])
+EDITED_TEXT = """Workshop on Applied Machine Learning
+
+Request for approval regarding the two-day national workshop on applied machine learning. The event strengthens research skills.
+
+• Sessions led by invited speakers from industry and academia
+• Hands-on labs covering model training and deployment
+
+The above proposal is submitted for approval, and the advance amount may kindly be released to the organizing committee to conduct the event smoothly."""
+
+# ==========================
+# Scenarios
+# ==========================
+def nfa_generate_args(i):
+    return [f"Workshop on Applied Machine Learning {i}", SUMMARY, "advance", "yes", TABLE_JSON]
+
+def nfa_edit_args(i):
+    return ["--edit-mode", EDITED_TEXT, f"Add a bullet about lab session {i}"]
+
+def nfa_download_args(i):
+    return ["--download-mode", EDITED_TEXT, f"Workshop {i}", SUMMARY, "advance", TABLE_JSON]
+
+def nfa_generate_request(i):
+    return {"mode": "generate", "subject": f"Workshop {i}", "summary": SUMMARY,
+            "nfaType": "advance", "needBullets": True, "tableData": json.loads(TABLE_JSON)}
+
+def reco_args(i):
+    return [f"Student {i}", f"Project {i}", "Built an end-to-end computer vision pipeline for crop disease detection"]
+
+# name -> (kind, script, args(i) or request(i), streams); "stdin" pipes request(i) to --stdin
+SCENARIOS = {
+    "nfa_generate": ("argv", NFA_SCRIPT, nfa_generate_args, False),
+    "nfa_generate_stream": ("argv", NFA_SCRIPT, lambda i: ["--stream"] + nfa_generate_args(i), True),
+    "nfa_edit": ("argv", NFA_SCRIPT, nfa_edit_args, False),
+    "nfa_edit_full": ("argv", NFA_SCRIPT, lambda i: ["--edit-mode", EDITED_TEXT, f"Make the whole document more formal {i}"], False),
+    "nfa_edit_stream": ("argv", NFA_SCRIPT, lambda i: ["--stream"] + nfa_edit_args(i), True),
+    "nfa_download": ("argv", NFA_SCRIPT, nfa_download_args, False),
+    "nfa_stdin_generate": ("stdin", NFA_SCRIPT, nfa_generate_request, False),
+    "nfa_serve_generate": ("serve", NFA_SCRIPT, nfa_generate_request, False),
+    "nfa_serve_edit": ("serve", NFA_SCRIPT, lambda i: {
+        "mode": "edit", "text": EDITED_TEXT, "prompt": f"Add a bullet about lab session {i}"}, False),
+    "nfa_serve_download": ("serve", NFA_SCRIPT, lambda i: {
+        "mode": "download", "editedText": EDITED_TEXT, "subject": f"Workshop {i}", "summary": SUMMARY,
+        "nfaType": "advance", "tableData": json.loads(TABLE_JSON)}, False),
+    "job": ("argv", JOB_SCRIPT, reco_args, False),
+    "job_json": ("argv", JOB_SCRIPT, lambda i: reco_args(i) + ["--json"], False),
+    "ms": ("argv", MS_SCRIPT, reco_args, False),
+    "ms_json": ("argv", MS_SCRIPT, lambda i: reco_args(i) + ["--json"], False),
+}
+
+# ==========================
+# Runners
+# ==========================
+def parse_result_line(line):
+    """Decode a JSON result line; plain-path output (job/MS) counts as success when non-empty"""
+    line = line.strip()
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return {"success": bool(line), "filePath": line}
+
+def run_argv_once(script, args, env, streams, payload=None):
+    """Spawn one generator process (optionally piping a JSON request to stdin); returns (latency_ms, first_event_ms, result)"""
+    started = time.perf_counter()
+    first_event_ms = None
+    process = subprocess.Popen(
+        [sys.executable, script] + args, cwd=python_dir, env=env,
+        stdin=subprocess.PIPE if payload is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    if payload is not None:
+        process.stdin.write(json.dumps(payload))
+        process.stdin.close()
+    last_line = ""
+    for line in process.stdout:
+        if streams and first_event_ms is None:
+            first_event_ms = (time.perf_counter() - started) * 1000
+        if line.strip():
+            last_line = line
+    process.wait()
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    result = parse_result_line(last_line)
+    if process.returncode != 0:
+        result["success"] = False
+    return latency_ms, first_event_ms, result
+
+def run_argv_scenario(script, make_args, iterations, concurrency, env, streams):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_argv_once, script, make_args(i), env, streams) for i in range(iterations)]
+        return [future.result() for future in futures]
+
+def run_stdin_scenario(script, make_request, iterations, concurrency, env, streams):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_argv_once, script, ["--stdin"], env, streams, make_request(i))
+                   for i in range(iterations)]
+        return [future.result() for future in futures]
+
+class ServeWorker:
+    """One warm `--serve` process answering JSON lines"""
+
+    def __init__(self, script, env):
+        self.process = subprocess.Popen(
+            [sys.executable, script, "--serve"], cwd=python_dir, env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+
+    def request(self, payload):
+        started = time.perf_counter()
+        self.process.stdin.write(json.dumps(payload) + "\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        latency_ms = (time.perf_counter() - started) * 1000
+        if not line:
+            return latency_ms, None, {"success": False, "error": "worker exited"}
+        return latency_ms, None, parse_result_line(line)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=30)
+
+def run_serve_scenario(script, make_request, iterations, concurrency, env):
+    """Warm one worker per concurrency slot, then split the iterations across them"""
+    workers = [ServeWorker(script, env) for _ in range(concurrency)]
+    try:
+        # Warm-up request per worker (imports, template cache) is not measured
+        for index, worker in enumerate(workers):
+            worker.request(make_request(-1 - index))
+
+        samples = []
+        lock = threading.Lock()
+
+        def drain(worker, indexes):
+            for i in indexes:
+                sample = worker.request(make_request(i))
+                with lock:
+                    samples.append(sample)
+
+        threads = [
+            threading.Thread(target=drain, args=(worker, range(slot, iterations, concurrency)))
+            for slot, worker in enumerate(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+    finally:
+        for worker in workers:
+            worker.close()
+
+# ==========================
+# Statistics
+# ==========================
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return round(ordered[min(rank, len(ordered)) - 1], 1)
+
+def latency_summary(values):
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": round(sum(values) / len(values), 1),
+        "max": round(max(values), 1),
+    }
+
+def stage_means(results):
+    """Mean of each timings.stages_ms entry across successful results that report timings"""
+    totals = {}
+    counts = {}
+    for result in results:
+        for stage, value in ((result.get("timings") or {}).get("stages_ms") or {}).items():
+            totals[stage] = totals.get(stage, 0) + value
+            counts[stage] = counts.get(stage, 0) + 1
+    return {stage: round(totals[stage] / counts[stage], 1) for stage in totals}
+
+def run_scenario(name, iterations, concurrency, env):
+    kind, script, make_input, streams = SCENARIOS[name]
+    started = time.perf_counter()
+    if kind == "serve":
+        samples = run_serve_scenario(script, make_input, iterations, concurrency, env)
+    elif kind == "stdin":
+        samples = run_stdin_scenario(script, make_input, iterations, concurrency, env, streams)
+    else:
+        samples = run_argv_scenario(script, make_input, iterations, concurrency, env, streams)
+    wall_s = time.perf_counter() - started
+
+    ok = [sample for sample in samples if sample[2].get("success")]
+    report = {
+        "mode": kind,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(samples) - len(ok),
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s else None,
+        "latency_ms": latency_summary([sample[0] for sample in ok]),
+        "stages_ms_mean": stage_means([sample[2] for sample in ok]),
+    }
+    if streams:
+        report["first_event_ms"] = latency_summary([sample[1] for sample in ok if sample[1] is not None])
+    if len(ok) < len(samples):
+        report["first_error"] = next(sample[2] for sample in samples if not sample[2].get("success"))
+    return report
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    options = {
+        "scenarios": list(SCENARIOS),
+        "iterations": 20,
+        "concurrency": 4,
+        "latency_ms": 500.0,
+        "jitter_ms": 0.0,
+        "tokens_per_second": 0.0,
+        "base_url": None,
+        "with_cache": False,
+        "output": None,
+    }
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--scenarios" and args:
+            options["scenarios"] = [name.strip() for name in args.pop(0).split(",") if name.strip()]
+        elif flag == "--iterations" and args:
+            options["iterations"] = int(args.pop(0))
+        elif flag == "--concurrency" and args:
+            options["concurrency"] = max(1, int(args.pop(0)))
+        elif flag == "--latency-ms" and args:
+            options["latency_ms"] = float(args.pop(0))
+        elif flag == "--jitter-ms" and args:
+            options["jitter_ms"] = float(args.pop(0))
+        elif flag == "--tokens-per-second" and args:
+            options["tokens_per_second"] = float(args.pop(0))
+        elif flag == "--base-url" and args:
+            options["base_url"] = args.pop(0)
+        elif flag == "--with-cache":
+            options["with_cache"] = True
+        elif flag == "--output" and args:
+            options["output"] = args.pop(0)
+        elif flag == "--list":
+            print("\n".join(SCENARIOS))
+            sys.exit(0)
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+
+    unknown = [name for name in options["scenarios"] if name not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(unknown)} (see --list)")
+    return options
+
+def print_summary(report):
+    print(f"{'scenario':<22}{'ok/n':>8}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}  first p50", file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"] or {}
+        first = (result.get("first_event_ms") or {}).get("p50")
+        ok = result["iterations"] - result["errors"]
+        print(f"{name:<22}{ok:>4}/{result['iterations']:<3}{result['throughput_rps'] or 0:>8.2f}"
+              f"{latency.get('p50') or 0:>9.1f}{latency.get('p95') or 0:>9.1f}{latency.get('p99') or 0:>9.1f}"
+              f"  {'' if first is None else f'{first:.1f}'}", file=sys.stderr)
+
+def main():
+    options = parse_args(sys.argv[1:])
+
+    server = None
+    base_url = options["base_url"]
+    if not base_url:
+        server = start_fake_server(
+            latency_ms=options["latency_ms"], jitter_ms=options["jitter_ms"],
+            tokens_per_second=options["tokens_per_second"]
+        )
+        base_url = server.base_url
+    print(f"Benchmarking against {base_url}", file=sys.stderr)
+
+    env = dict(os.environ)
+    env["OPENAI_BASE_URL"] = base_url
+    env["OPENAI_API_KEY"] = env.get("BENCHMARK_OPENAI_API_KEY", "fake-benchmark-key")
+    if not options["with_cache"]:
+        env["LLM_CACHE_BYPASS"] = "1"
+        env["NFA_RENDER_CACHE_BYPASS"] = "1"
+
+    report = {
+        "base_url": base_url,
+        "fake_latency_ms": None if options["base_url"] else options["latency_ms"],
+        "tokens_per_second": None if options["base_url"] else options["tokens_per_second"],
+        "llm_cache": options["with_cache"],
+        "scenarios": {},
+    }
+    try:
+        for name in options["scenarios"]:
+            print(f"▶ {name} ({options['iterations']} iterations, concurrency {options['concurrency']})", file=sys.stderr)
+            report["scenarios"][name] = run_scenario(name, options["iterations"], options["concurrency"], env)
+    finally:
+        if server:
+            report["fake_requests"] = server.requests
+            server.shutdown()
+            server.server_close()
+
+    print_summary(report)
+    output = json.dumps(report, indent=2)
+    if options["output"]:
+        with open(options["output"], "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
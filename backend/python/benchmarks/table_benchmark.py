@@ -0,0 +1,130 @@
+# backend/python/benchmarks/table_benchmark.py
+"""In-process benchmark for large NFA annexure tables.
+
+Renders an N-row table through both generators' table paths (the table
+itself plus the per-table work each path does before/after saving) and
+reports per-stage timings. No OpenAI calls are involved.
+
+Usage (from backend/python):
+    python -m benchmarks.table_benchmark
+    python -m benchmarks.table_benchmark --rows 5000 --repeats 3 --budget-ms 1000
+"""
+import sys
+import io
+import json
+import time
+
+import generate_nfa_automation as original_nfa
+import generate_nfa_automation_fixed as fixed_nfa
+
+DEFAULT_ROWS = 1000
+DEFAULT_REPEATS = 5
+DEFAULT_BUDGET_MS = 1000.0
+
+def make_table(rows):
+    """Header row plus `rows` line items in the frontend's list-of-lists layout"""
+    table = [["slno", "item", "unit", "total"]]
+    for i in range(1, rows + 1):
+        table.append([str(i), f"Line item {i}: lab consumables & printing <batch {i % 7}>", str(i % 12 + 1), f"{i * 150:,}"])
+    return table
+
+# ==========================
+# Scenarios
+# ==========================
+def render_original(table_data):
+    """generate_nfa_automation.py: table, single-page compaction, validation, save"""
+    from docx import Document
+
+    doc = Document()
+    stages = {}
+    started = time.perf_counter()
+    original_nfa.add_table_to_document(doc, table_data)
+    stages["table"] = time.perf_counter()
+    original_nfa.optimize_for_single_page(doc)
+    stages["optimize"] = time.perf_counter()
+    original_nfa.validate_document_structure(doc)
+    stages["validate"] = time.perf_counter()
+    doc.save(io.BytesIO())
+    stages["save"] = time.perf_counter()
+    return started, stages
+
+def render_fixed(table_data):
+    """generate_nfa_automation_fixed.py: table, save, preview text extraction"""
+    from docx import Document
+
+    doc = Document()
+    stages = {}
+    started = time.perf_counter()
+    fixed_nfa.add_table_to_document(doc, table_data)
+    stages["table"] = time.perf_counter()
+    doc.save(io.BytesIO())
+    stages["save"] = time.perf_counter()
+    fixed_nfa.extract_document_text(doc)
+    stages["extract_text"] = time.perf_counter()
+    return started, stages
+
+SCENARIOS = {
+    "original_table": render_original,
+    "fixed_table": render_fixed,
+}
+
+def run_scenario(render, table_data, repeats):
+    """Run one scenario `repeats` times; returns mean per-stage and best/mean total in ms"""
+    totals = []
+    stage_sums = {}
+    for _ in range(repeats):
+        started, stages = render(table_data)
+        previous = started
+        for name, finished in stages.items():
+            stage_sums[name] = stage_sums.get(name, 0.0) + (finished - previous) * 1000
+            previous = finished
+        totals.append((previous - started) * 1000)
+    return {
+        "stages_ms_mean": {name: round(total / repeats, 1) for name, total in stage_sums.items()},
+        "total_ms_mean": round(sum(totals) / repeats, 1),
+        "total_ms_best": round(min(totals), 1),
+    }
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    options = {"rows": DEFAULT_ROWS, "repeats": DEFAULT_REPEATS, "budget_ms": DEFAULT_BUDGET_MS}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--rows" and args:
+            options["rows"] = int(args.pop(0))
+        elif flag == "--repeats" and args:
+            options["repeats"] = max(1, int(args.pop(0)))
+        elif flag == "--budget-ms" and args:
+            options["budget_ms"] = float(args.pop(0))
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    return options
+
+def main():
+    options = parse_args(sys.argv[1:])
+    table_data = make_table(options["rows"])
+
+    # Warm-up: python-docx imports and the default template load
+    for render in SCENARIOS.values():
+        render(table_data[:2])
+
+    report = {"rows": options["rows"], "repeats": options["repeats"], "budget_ms": options["budget_ms"], "scenarios": {}}
+    for name, render in SCENARIOS.items():
+        result = run_scenario(render, table_data, options["repeats"])
+        result["within_budget"] = result["total_ms_mean"] <= options["budget_ms"]
+        report["scenarios"][name] = result
+
+    print(f"{'scenario':<18}{'mean ms':>10}{'best ms':>10}  stages", file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        stages = ", ".join(f"{stage} {ms}" for stage, ms in result["stages_ms_mean"].items())
+        print(f"{name:<18}{result['total_ms_mean']:>10.1f}{result['total_ms_best']:>10.1f}  {stages}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if not all(result["within_budget"] for result in report["scenarios"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
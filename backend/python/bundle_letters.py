@@ -0,0 +1,268 @@
+# backend/python/bundle_letters.py
+"""Bundle generated letters (NFA, job and MS recommendations) into one ZIP.
+
+The archive is written as a stream: every file is copied into it in 1 MB
+chunks and entry sizes/CRCs go into data descriptors, so neither the
+letters nor the archive are ever held in memory and the output can be a
+pipe or an HTTP response. .docx (and other already-compressed) files are
+stored as they are; only the manifest is deflated. Entries are grouped by
+letter type (nfa/, job_reco/, ms_reco/) and manifest.csv lists every
+requested file, including the ones that could not be found.
+
+Files can be given as paths relative to backend/ (the filePath of the
+generators), as /generated_letters/... URLs or as absolute paths; anything
+outside the generated-letter directories is refused.
+
+Usage:
+    python bundle_letters.py -o letters.zip generated_letters/nfa/2026-10/3f/NFA_advance_x.docx ...
+    echo '["/generated_letters/nfa/...", "uploads/generated_letters/job_reco/..."]' | python bundle_letters.py --stdin -o -
+    python generate_nfa_batch.py events.csv | python bundle_letters.py --stdin -o events.zip
+"""
+import sys
+import os
+import io
+import csv
+import json
+import time
+import zipfile
+from datetime import datetime
+from letter_common import backend_dir, uploads_dir, get_logger
+
+log = get_logger("bundle_letters")
+
+CHUNK_SIZE = 1024 * 1024
+MAX_BUNDLE_FILES = 5000
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = ["archive_path", "letter_type", "file_name", "size_bytes", "modified", "source", "status"]
+LETTER_TYPES = ("nfa", "job_reco", "ms_reco")
+
+# Formats that are already compressed: deflating them again costs CPU for nothing
+STORED_EXTENSIONS = {".docx", ".xlsx", ".pptx", ".pdf", ".zip", ".png", ".jpg", ".jpeg"}
+
+# ==========================
+# File Resolution
+# ==========================
+def letter_roots():
+    """Directories bundled files may come from (both generator layouts plus OUTPUT_DIR)"""
+    roots = [os.path.join(backend_dir, "generated_letters"), os.path.join(uploads_dir, "generated_letters")]
+    output_dir = os.getenv("OUTPUT_DIR")
+    if output_dir:
+        if output_dir.startswith("./backend/"):
+            output_dir = output_dir.replace("./backend/", "./")
+        roots.append(os.path.join(backend_dir, output_dir.lstrip("./")))
+    return [os.path.realpath(root) for root in roots]
+
+def _within(path, root):
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        return False
+
+def resolve_letter(reference, roots=None):
+    """(absolute path, root) of a generated letter reference; path is None when it is not a letter file"""
+    roots = roots or letter_roots()
+    reference = str(reference or "").strip().replace("\\", "/")
+    if reference.startswith("/generated_letters/"):
+        # URL as served by server.js: try every root
+        candidates = [os.path.join(root, reference[len("/generated_letters/"):]) for root in roots]
+    elif os.path.isabs(reference):
+        candidates = [reference]
+    else:
+        candidates = [os.path.join(backend_dir, reference)]
+
+    for candidate in candidates:
+        path = os.path.realpath(candidate)
+        root = next((root for root in roots if _within(path, root)), None)
+        if root and os.path.isfile(path):
+            return path, root
+    return None, None
+
+def letter_type_of(path, root):
+    first = os.path.relpath(path, root).split(os.sep)[0]
+    return first if first in LETTER_TYPES else "other"
+
+def file_references(payload):
+    """File references from a JSON payload: a list of paths, {"files": [...]}, or a batch report with results"""
+    if isinstance(payload, dict):
+        if "files" in payload:
+            payload = payload["files"]
+        elif "results" in payload:
+            payload = [path for r in payload["results"] if isinstance(r, dict)
+                       for path in (r.get("filePath"), r.get("pdfPath")) if path]
+    if not isinstance(payload, list):
+        raise ValueError('Bundle input must be a list of file paths or {"files": [...]}')
+    references = [item.get("filePath") if isinstance(item, dict) else item for item in payload]
+    if not references:
+        raise ValueError("No files to bundle")
+    if len(references) > MAX_BUNDLE_FILES:
+        raise ValueError(f"Too many files to bundle: {len(references)} (limit {MAX_BUNDLE_FILES})")
+    return references
+
+def plan_bundle(references):
+    """One entry per reference: archive path, source path and manifest fields (nothing is read yet)"""
+    roots = letter_roots()
+    entries = []
+    used_names = set()
+    for reference in references:
+        path, root = resolve_letter(reference, roots)
+        entry = {"source": str(reference), "path": path, "status": "ok" if path else "missing",
+                 "archive_path": "", "letter_type": "", "file_name": "", "size_bytes": "", "modified": ""}
+        if path:
+            stat = os.stat(path)
+            letter_type = letter_type_of(path, root)
+            name = os.path.basename(path)
+            archive_path = f"{letter_type}/{name}"
+            stem, extension = os.path.splitext(archive_path)
+            counter = 2
+            while archive_path in used_names:
+                archive_path = f"{stem}_{counter}{extension}"
+                counter += 1
+            used_names.add(archive_path)
+            entry.update(archive_path=archive_path, letter_type=letter_type, file_name=name, size_bytes=stat.st_size,
+                         modified=datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"))
+        else:
+            log.warning("⚠️ Not a generated letter, skipped: %s", reference)
+        entries.append(entry)
+    if not any(entry["path"] for entry in entries):
+        raise ValueError("None of the requested files were found")
+    return entries
+
+# ==========================
+# Streaming ZIP
+# ==========================
+class _CountingWriter:
+    """Write-only stream wrapper; having no tell() makes zipfile stream with data descriptors"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_written = 0
+        self.aborted = False
+
+    def abort(self):
+        """Drop everything written from now on, so a failed bundle never gets a central directory"""
+        self.aborted = True
+
+    def write(self, data):
+        if self.aborted:
+            return len(data)
+        self._stream.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        self._stream.flush()
+
+def manifest_csv(entries):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=MANIFEST_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(entries)
+    return buffer.getvalue().encode("utf-8-sig")
+
+def write_bundle(entries, stream):
+    """Stream the ZIP for planned entries into a binary stream; returns the bundle summary"""
+    started = time.perf_counter()
+    output = _CountingWriter(stream)
+    with zipfile.ZipFile(output, "w", allowZip64=True) as archive:
+        for entry in entries:
+            if not entry["path"]:
+                continue
+            info = zipfile.ZipInfo.from_file(entry["path"], entry["archive_path"])
+            stored = os.path.splitext(entry["path"])[1].lower() in STORED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            # Only the source side is guarded: a write error (client gone) ends the bundle at once
+            try:
+                source = open(entry["path"], "rb")
+            except OSError as e:
+                # Deleted or unreadable between planning and writing
+                log.warning("⚠️ Could not read %s: %s", entry["path"], e)
+                entry["status"] = "unreadable"
+                continue
+            with source, archive.open(info, "w", force_zip64=entry["size_bytes"] > 2 ** 31) as target:
+                while True:
+                    try:
+                        chunk = source.read(CHUNK_SIZE)
+                    except OSError as e:
+                        # Part of the file is already in the archive: fail the bundle rather than
+                        # finish a valid-looking ZIP with a truncated letter in it
+                        output.abort()
+                        raise OSError(f"Could not read {entry['path']} while bundling: {e}") from e
+                    if not chunk:
+                        break
+                    target.write(chunk)
+
+        manifest = zipfile.ZipInfo(MANIFEST_NAME, date_time=datetime.now().timetuple()[:6])
+        manifest.compress_type = zipfile.ZIP_DEFLATED
+        archive.writestr(manifest, manifest_csv(entries))
+    output.flush()
+
+    counts = {}
+    for entry in entries:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return {
+        "success": True,
+        "files": counts.get("ok", 0),
+        "missing": len(entries) - counts.get("ok", 0),
+        "archive_bytes": output.bytes_written,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+def bundle_letters(references, stream):
+    """Resolve references and stream their ZIP into stream (raises ValueError before writing anything)"""
+    return write_bundle(plan_bundle(references), stream)
+
+def bundle_file_name():
+    return f"letters_{datetime.now():%Y%m%d_%H%M%S}.zip"
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    """Parse -o/--output, --stdin and the file references"""
+    options = {"output": None, "stdin": False, "files": []}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag in ("-o", "--output") and args:
+            options["output"] = args.pop(0)
+        elif flag == "--stdin":
+            options["stdin"] = True
+        elif not flag.startswith("--"):
+            options["files"].append(flag)
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    if not options["stdin"] and not options["files"]:
+        raise ValueError("Usage: bundle_letters.py [-o letters.zip|-] (--stdin | <file> ...)")
+    return options
+
+def main():
+    options = parse_args(sys.argv[1:])
+    references = file_references(json.load(sys.stdin)) if options["stdin"] else file_references(options["files"])
+    entries = plan_bundle(references)
+
+    output = options["output"] or os.path.join(os.getcwd(), bundle_file_name())
+    if output == "-":
+        summary = write_bundle(entries, sys.stdout.buffer)
+        # stdout carries the archive: the summary goes to stderr
+        print(json.dumps(summary), file=sys.stderr)
+        return
+
+    from letter_storage import atomic_write_stream
+    summaries = []
+    atomic_write_stream(os.path.abspath(output), lambda stream: summaries.append(write_bundle(entries, stream)))
+    summary = summaries[0]
+    summary.update(filePath=os.path.abspath(output), fileName=os.path.basename(output))
+    print(f"✅ Bundled {summary['files']} letters ({summary['missing']} missing) into {output}", file=sys.stderr)
+    print(json.dumps(summary))
+
+def streams_to_stdout(argv):
+    """True when -o - sends the archive to stdout (then stdout must not carry anything else)"""
+    return any(flag in ("-o", "--output") and value == "-" for flag, value in zip(argv, argv[1:]))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        error_stream = sys.stderr if streams_to_stdout(sys.argv[1:]) else sys.stdout
+        print(json.dumps({"success": False, "error": str(e)}), file=error_stream)
+        sys.exit(1)
@@ -1,60 +1,28 @@
 import sys
 import os
-import re
-from openai import OpenAI
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from dotenv import load_dotenv
-
-# Check Python version
-print(f"Python version: {sys.version}", file=sys.stderr)
-print(f"Python executable: {sys.executable}", file=sys.stderr)
-
-# Load env vars and initialize OpenAI client
-try:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("Warning: OPENAI_API_KEY not found in environment variables", file=sys.stderr)
-    else:
-        print("OPENAI_API_KEY loaded successfully", file=sys.stderr)
-    
-    # Initialize OpenAI client with new API
-    client = OpenAI(api_key=api_key)
-    print("OpenAI client initialized successfully", file=sys.stderr)
-except Exception as e:
-    print(f"Error loading environment variables: {e}", file=sys.stderr)
-    client = None
-
-# Paths (from uploads folder)
-script_dir = os.path.dirname(os.path.abspath(__file__))
-backend_dir = os.path.dirname(script_dir)
-uploads_dir = os.path.join(backend_dir, "uploads")
-
-header_image_path = os.path.join(uploads_dir, "header.png")
-
-# Output directory - organize into job_reco folder
-env_output_dir = os.getenv("OUTPUT_DIR")
-if env_output_dir:
-    # If OUTPUT_DIR is set in .env, resolve it relative to backend directory
-    if env_output_dir.startswith("./backend/"):
-        # Remove the "./backend/" prefix since we're already in the backend directory
-        env_output_dir = env_output_dir.replace("./backend/", "./")
-    
-    # Resolve the path relative to backend directory
-    base_output_directory = os.path.abspath(os.path.join(backend_dir, env_output_dir.lstrip("./")))
-else:
-    # Default fallback
-    base_output_directory = os.path.join(uploads_dir, "generated_letters")
-
-# Create job_reco subfolder
-output_directory = os.path.join(base_output_directory, "job_reco")
-
-print(f"Final output directory: {output_directory}", file=sys.stderr)
-print(f"Environment OUTPUT_DIR: {env_output_dir}", file=sys.stderr)
-print(f"Backend directory: {backend_dir}", file=sys.stderr)
-os.makedirs(output_directory, exist_ok=True)
+import json
+from letter_common import (
+    script_dir, backend_dir, uploads_dir, get_openai_client,
+    resolve_output_directory, find_header_image, get_base_document,
+    start_timer, timed_stage, get_logger, dump_log_buffer
+)
+from letter_storage import letter_path, safe_name_part, atomic_save
+
+log = get_logger("job_reco")
+
+# openai, python-docx and dotenv are imported lazily by the functions that
+# need them; nothing heavy happens at import time.
+
+def get_header_image_path():
+    """Header image from the uploads folder (or the shared fallback locations)"""
+    return find_header_image() or os.path.join(uploads_dir, "header.png")
+
+def get_output_directory():
+    """Resolve (and create) the job_reco output directory on first use"""
+    output_directory = resolve_output_directory("job_reco")
+    log.debug("Final output directory: %s", output_directory)
+    log.debug("Environment OUTPUT_DIR: %s", os.getenv('OUTPUT_DIR'))
+    return output_directory
 
 def generate_job_letter(name, title1, para1):
     return f"""
@@ -69,65 +37,45 @@ I am confident that {name} will bring the same level of passion, innovation, and
 Sincerely,
 """
 
-def generate_ai_paragraph(name, title, summary):
-    if not client:
-        return f"{name} has demonstrated exceptional skills and dedication in their project '{title}'. {summary}"
-    
+def fallback_ai_paragraph(name, title, summary):
+    """Paragraph used when the AI call is unavailable or fails"""
+    return f"{name} has demonstrated exceptional skills and dedication in their project '{title}'. {summary}"
+
+def build_ai_paragraph_request(name, title, summary):
+    """Chat completion arguments (model, messages, max_tokens, temperature) for the project paragraph"""
     prompt = f"""
 Write a very concise and professional paragraph (maximum 3-4 sentences) about {name}'s project titled '{title}'.
 The project summary is: {summary}.
 Focus on highlighting their key strengths and contributions. Keep it brief and impactful for a single-page recommendation letter.
 """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional letter generator specializing in job recommendations. Keep responses very concise for single-page letters."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=100,  # Reduced for brevity
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Warning: AI generation failed, using fallback text: {e}", file=sys.stderr)
-        return f"{name} has demonstrated exceptional skills and dedication in their project '{title}'. {summary}"
-
-def main():
-    # Read arguments from Node.js (form inputs)
-    name = sys.argv[1]
-    title1 = sys.argv[2]
-    summary1 = sys.argv[3]
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a professional letter generator specializing in job recommendations. Keep responses very concise for single-page letters."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 100,  # Reduced for brevity
+        "temperature": 0.7
+    }
 
-    # Debug: Print paths and working directory to stderr (not captured by Node.js)
-    print(f"Current working directory: {os.getcwd()}", file=sys.stderr)
-    print(f"Script directory: {script_dir}", file=sys.stderr)
-    print(f"Backend directory: {backend_dir}", file=sys.stderr)
-    print(f"Uploads directory: {uploads_dir}", file=sys.stderr)
-    print(f"Header image path: {header_image_path}", file=sys.stderr)
-    print(f"Output directory: {output_directory}", file=sys.stderr)
-    
-    # Check if header image exists
-    if os.path.exists(header_image_path):
-        print(f"OK: header.png found at: {header_image_path}", file=sys.stderr)
-    else:
-        print(f"ERROR: header.png NOT found at: {header_image_path}", file=sys.stderr)
-
-    # Check OpenAI client status
-    if client:
-        print("OpenAI client ready for AI generation", file=sys.stderr)
-    else:
-        print("Warning: OpenAI client not available, will use fallback text", file=sys.stderr)
+def generate_ai_paragraph(name, title, summary):
+    client = get_openai_client()
+    if not client:
+        return fallback_ai_paragraph(name, title, summary)
 
-    ai_paragraph = generate_ai_paragraph(name, title1, summary1)
-    letter = generate_job_letter(name, title1, ai_paragraph)
+    try:
+        from llm_cache import cached_chat_completion
+        completion = cached_chat_completion(client, **build_ai_paragraph_request(name, title, summary))
+        return completion["content"].strip()
+    except Exception as e:
+        log.warning("Warning: AI generation failed, using fallback text: %s", e)
+        return fallback_ai_paragraph(name, title, summary)
 
-    # Save as docx
-    sanitized_name = re.sub(r'[\\/:*?"<>|]', '_', name.replace(' ', '_'))
-    filename = os.path.join(output_directory, f"Job_Recommendation_Letter_{sanitized_name}.docx")
-    
-    print(f"Creating document: {filename}", file=sys.stderr)
+def build_job_recommendation_base_template(header_image_path):
+    """Build the fixed letter skeleton (margins, header, date, title, letterhead, fonts) once per process"""
+    from docx import Document
+    from docx.shared import Inches, Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 
     try:
         doc = Document()
@@ -145,13 +93,18 @@ def main():
             # Calculate full page width (page width - margins)
             page_width = Inches(8.5) - Inches(0.7) - Inches(0.7)  # Full page minus margins
             doc.add_picture(header_image_path, width=page_width)
-            print("Header image added successfully", file=sys.stderr)
+            log.debug("Header image added successfully")
         else:
-            print("Header image not found, skipping...", file=sys.stderr)
+            log.debug("Header image not found, skipping...")
     except Exception as e:
-        print(f"Error adding header image: {e}", file=sys.stderr)
-        print(f"   Header image path: {header_image_path}", file=sys.stderr)
-        print("Continuing without header image...", file=sys.stderr)
+        log.error("Error adding header image: %s", e)
+        log.debug("   Header image path: %s", header_image_path)
+        log.debug("Continuing without header image...")
+    
+    # Set font styling for single page optimization (Normal style covers the whole letter)
+    normal_style = doc.styles['Normal']
+    normal_style.font.name = 'Times New Roman'
+    normal_style.font.size = Pt(11)  # Reduced from 12 to 11
     
     # Add date
     from datetime import datetime
@@ -170,6 +123,16 @@ Email: phanikumarp@rvu.edu.in
 Phone: +91-9902005868
     """)
     
+    return doc
+
+def create_job_recommendation_document(name, letter):
+    """Build the job recommendation letter document (header, letterhead, body, signature)"""
+    from docx.shared import Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+    # Clone the cached skeleton instead of rebuilding margins/header/letterhead
+    doc = get_base_document("job_reco", build_job_recommendation_base_template, get_header_image_path())
+    
     subject_paragraph = doc.add_paragraph()
     subject_paragraph.add_run("Subject:").bold = True
     subject_paragraph.add_run(f" Job Recommendation Letter for {name}")
@@ -186,32 +149,103 @@ Professor & Associate Dean
 RV University""")
     p2.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
     
-    # Set font styling for single page optimization
-    p1.style.font.name = 'Times New Roman'
-    p1.style.font.size = Pt(11)  # Reduced from 12 to 11
-    p2.style.font.name = 'Times New Roman'
-    p2.style.font.size = Pt(11)  # Reduced from 12 to 11
-    
     # Set paragraph spacing for compact layout
     p1.paragraph_format.space_after = Pt(6)
     p2.paragraph_format.space_after = Pt(6)
     
+    return doc
+
+def generate_job_recommendation(name, title1, summary1):
+    """Generate, render and save a job recommendation letter; returns the path relative to backend/"""
+    client = get_openai_client()
+    header_image_path = get_header_image_path()
+    output_directory = get_output_directory()
+
+    # Debug: Print paths and working directory to stderr (not captured by Node.js)
+    log.debug("Current working directory: %s", os.getcwd())
+    log.debug("Script directory: %s", script_dir)
+    log.debug("Backend directory: %s", backend_dir)
+    log.debug("Uploads directory: %s", uploads_dir)
+    log.debug("Header image path: %s", header_image_path)
+    log.debug("Output directory: %s", output_directory)
+    
+    # Check if header image exists
+    if os.path.exists(header_image_path):
+        log.debug("OK: header.png found at: %s", header_image_path)
+    else:
+        log.warning("header.png NOT found at: %s", header_image_path)
+
+    # Check OpenAI client status
+    if client:
+        log.debug("OpenAI client ready for AI generation")
+    else:
+        log.warning("Warning: OpenAI client not available, will use fallback text")
+
+    ai_paragraph = generate_ai_paragraph(name, title1, summary1)
+    return render_job_recommendation(name, title1, ai_paragraph, output_directory)
+
+def render_job_recommendation(name, title1, ai_paragraph, output_directory):
+    """Render the letter around an already generated AI paragraph and save it; returns the path relative to backend/"""
+    from letter_index import index_letter, document_text
+
+    letter = generate_job_letter(name, title1, ai_paragraph)
+
+    # Save as docx
+    # Unique, sharded file name so two letters for the same student never overwrite each other
+    filename = letter_path(output_directory, f"Job_Recommendation_Letter_{safe_name_part(name)}")
+    
+    log.debug("Creating document: %s", filename)
+
+    with timed_stage("render_document"):
+        doc = create_job_recommendation_document(name, letter)
+    
     try:
-        doc.save(filename)
-        print(f"Document saved successfully: {filename}", file=sys.stderr)
+        with timed_stage("save"):
+            atomic_save(doc, filename)
+        log.debug("Document saved successfully: %s", filename)
+        with timed_stage("index"):
+            index_letter(filename, "job_reco", document_text(doc), subject=f"Job Recommendation Letter for {name}", student_name=name)
     except Exception as e:
-        print(f"Error saving document: {e}", file=sys.stderr)
-        print(f"   Output directory: {output_directory}", file=sys.stderr)
-        print(f"   Filename: {filename}", file=sys.stderr)
+        log.error("Error saving document: %s", e)
+        log.debug("   Output directory: %s", output_directory)
+        log.debug("   Filename: %s", filename)
         raise
 
-    # Print only the relative path for Node.js (not the full absolute path)
-    relative_path = os.path.relpath(filename, backend_dir)
-    print(relative_path)  # This will be: uploads/generated_letters/Job_Recommendation_Letter_*.docx
+    # Relative path for Node.js (not the full absolute path)
+    return os.path.relpath(filename, backend_dir)  # This will be: uploads/generated_letters/Job_Recommendation_Letter_*.docx
+
+def main():
+    # Check Python version
+    log.debug("Python version: %s", sys.version)
+    log.debug("Python executable: %s", sys.executable)
+
+    # --json prints {success, filePath, fileName, timings} instead of the bare path
+    as_json = "--json" in sys.argv
+    if as_json:
+        sys.argv.remove("--json")
+    timer = start_timer(include_startup=True)
+
+    # Read arguments from Node.js (form inputs)
+    name = sys.argv[1]
+    title1 = sys.argv[2]
+    summary1 = sys.argv[3]
+
+    file_path = generate_job_recommendation(name, title1, summary1)
+    if as_json:
+        print(json.dumps({
+            "success": True,
+            "filePath": file_path,
+            "fileName": os.path.basename(file_path),
+            "timings": timer.as_dict()
+        }))
+    else:
+        # Print only the relative path for Node.js
+        print(file_path)
 
 if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        print(f"Script failed with error: {e}", file=sys.stderr)
+        log.error("Script failed with error: %s", e)
+        dump_log_buffer("script failed")
         sys.exit(1)
@@ -1,65 +1,45 @@
 # backend/python/generate_nfa_automation.py
 import sys
 import os
-import re
 import json
-from openai import OpenAI
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from dotenv import load_dotenv
+import logging
 from datetime import datetime
+from letter_common import (
+    backend_dir, uploads_dir,
+    get_openai_client, resolve_output_directory, get_base_document,
+    start_timer, timed_stage, lap_stage, load_request_from_argv, check_table_rows,
+    get_logger, dump_log_buffer
+)
+from letter_storage import letter_path, url_path, safe_name_part, atomic_save
+from nfa_signatures import load_signature_layout, add_cached_signature_block, add_signature_image, signature_images_version
+from nfa_sections import (
+    SUBJECT, BULLETS, CONCLUSION, classify_sections, last_of_kind,
+    content_sections, is_subject, is_conclusion, strip_conclusion_lines
+)
+from nfa_prompts import COMPACT, resolve_prompt_profile, compact_generate_messages
 
-# Debug Python version
-print(f"Python version: {sys.version}", file=sys.stderr)
-print(f"Python executable: {sys.executable}", file=sys.stderr)
+log = get_logger("nfa")
 
-# ==========================
-# Load API Key & Init OpenAI
-# ==========================
-try:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("Warning: OPENAI_API_KEY not found", file=sys.stderr)
-    else:
-        print("OPENAI_API_KEY loaded successfully", file=sys.stderr)
-    client = OpenAI(api_key=api_key) if api_key else None
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}", file=sys.stderr)
-    client = None
+# openai, python-docx and dotenv are imported lazily by the code paths that
+# need them (--edit-mode never loads python-docx). See INSTALL.md for the
+# import-time budget of each mode.
 
 # ==========================
 # Paths
 # ==========================
-script_dir = os.path.dirname(os.path.abspath(__file__))
-backend_dir = os.path.dirname(script_dir)
-uploads_dir = os.path.join(backend_dir, "uploads")
-
 header_image_path = os.path.join(uploads_dir, "header.png")
-signatures_dir = os.path.join(uploads_dir, "signatures")
-
-# Output directory
-env_output_dir = os.getenv("OUTPUT_DIR")
-if env_output_dir:
-    if env_output_dir.startswith("./backend/"):
-        env_output_dir = env_output_dir.replace("./backend/", "./")
-    base_output_directory = os.path.abspath(os.path.join(backend_dir, env_output_dir.lstrip("./")))
-else:
-    base_output_directory = os.path.join(uploads_dir, "generated_letters")
 
-output_directory = os.path.join(base_output_directory, "nfa")
-os.makedirs(output_directory, exist_ok=True)
-
-print(f"Final output directory: {output_directory}", file=sys.stderr)
+def get_output_directory():
+    """Resolve (and create) the NFA output directory on first use"""
+    output_directory = resolve_output_directory("nfa")
+    log.debug("Final output directory: %s", output_directory)
+    return output_directory
 
 # ==========================
 # AI Helper
 # ==========================
-def generate_ai_nfa_from_summary(subject, summary, nfa_type="reimbursement", need_bullets=False, facts_only=False):
-    if not client:
-        return f"{subject}\n\nRequest for approval regarding {summary}. The above proposal is submitted for approval."
-
+def build_full_generate_messages(subject, summary, nfa_type, need_bullets):
+    """Chat messages for the full prompt profile (the long-form rules and style instructions)"""
     # Create ultra-concise prompt for single page following strict template
     prompt = f"""
 Create an EXCELLENT professional NFA document following this EXACT structure for SINGLE PAGE output:
@@ -140,18 +120,34 @@ GRAMMAR AND WRITING EXCELLENCE REQUIREMENTS:
 FINAL INSTRUCTION: Generate content that demonstrates the work of an EXCEPTIONAL English Professor with mastery of grammar, syntax, and sophisticated writing styles. Create content that is grammatically perfect, contextually sophisticated, and uniquely written. Every sentence must showcase linguistic excellence, perfect grammar, and professional writing artistry.
 """
 
+    return [
+        {"role": "system", "content": "You are a WORLD-CLASS English Professor and Professional Writer with exceptional expertise in creating superior NFA documents. Your writing surpasses standard business documents and demonstrates MASTERFUL command of language, sophisticated expression, and unparalleled grammatical precision.\n\nSUPERIOR WRITING EXCELLENCE:\n- ABSOLUTE grammatical perfection with flawless syntax, punctuation, and sentence construction\n- Advanced vocabulary with sophisticated word choices that demonstrate linguistic mastery\n- Unique, creative phrasing that elevates content beyond conventional business writing\n- Perfect subject-verb agreement, tense consistency, and advanced sentence structures\n- Seamless transitions and eloquent flow that creates compelling narratives\n- Professional tone that commands respect while maintaining accessibility\n\nCONTENT CREATION MASTERY:\n- Craft compelling opening paragraphs with maximum 3 sentences total that are sophisticated yet very concise\n- Generate EXCEPTIONAL bullet points that demonstrate deep understanding and superior articulation\n- Create content that is contextually perfect, professionally sophisticated, and grammatically impeccable\n- Use advanced sentence structures including complex-compound sentences, sophisticated clauses, and elegant modifiers\n- Demonstrate expertise through precise, articulate language that exceeds typical business communication\n\nADVANCED WRITING REQUIREMENTS:\n- Elevate professional tone to demonstrate institutional excellence and academic sophistication\n- Employ sophisticated vocabulary including advanced academic and professional terminology\n- Create unique expressions that avoid clichés and demonstrate creative linguistic mastery\n- Ensure every sentence showcases superior writing ability and professional expertise\n- Generate content that is more polished, articulate, and sophisticated than standard NFA documents\n\nSTRUCTURAL PERFECTION:\n- DO NOT include conclusion statements (will be added separately)\n- Create opening paragraphs that are more compelling and sophisticated than typical business documents\n- Generate bullet points that demonstrate superior understanding and exceptional articulation\n- Ensure every element showcases writing mastery and professional excellence\n- Maintain the highest standards of academic and professional communication"},
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_ai_nfa_from_summary(subject, summary, nfa_type="reimbursement", need_bullets=False, facts_only=False, prompt_profile=None):
+    """Generate NFA text with the AI using the full or compact prompt profile"""
+    client = get_openai_client()
+    if not client:
+        return f"{subject}\n\nRequest for approval regarding {summary}. The above proposal is submitted for approval."
+
+    if resolve_prompt_profile(prompt_profile) == COMPACT:
+        messages = compact_generate_messages(subject, summary, nfa_type, need_bullets, subject_prefix=True)
+    else:
+        messages = build_full_generate_messages(subject, summary, nfa_type, need_bullets)
+
     try:
-        response = client.chat.completions.create(
+        from llm_cache import cached_chat_completion
+        completion = cached_chat_completion(
+            client,
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a WORLD-CLASS English Professor and Professional Writer with exceptional expertise in creating superior NFA documents. Your writing surpasses standard business documents and demonstrates MASTERFUL command of language, sophisticated expression, and unparalleled grammatical precision.\n\nSUPERIOR WRITING EXCELLENCE:\n- ABSOLUTE grammatical perfection with flawless syntax, punctuation, and sentence construction\n- Advanced vocabulary with sophisticated word choices that demonstrate linguistic mastery\n- Unique, creative phrasing that elevates content beyond conventional business writing\n- Perfect subject-verb agreement, tense consistency, and advanced sentence structures\n- Seamless transitions and eloquent flow that creates compelling narratives\n- Professional tone that commands respect while maintaining accessibility\n\nCONTENT CREATION MASTERY:\n- Craft compelling opening paragraphs with maximum 3 sentences total that are sophisticated yet very concise\n- Generate EXCEPTIONAL bullet points that demonstrate deep understanding and superior articulation\n- Create content that is contextually perfect, professionally sophisticated, and grammatically impeccable\n- Use advanced sentence structures including complex-compound sentences, sophisticated clauses, and elegant modifiers\n- Demonstrate expertise through precise, articulate language that exceeds typical business communication\n\nADVANCED WRITING REQUIREMENTS:\n- Elevate professional tone to demonstrate institutional excellence and academic sophistication\n- Employ sophisticated vocabulary including advanced academic and professional terminology\n- Create unique expressions that avoid clichés and demonstrate creative linguistic mastery\n- Ensure every sentence showcases superior writing ability and professional expertise\n- Generate content that is more polished, articulate, and sophisticated than standard NFA documents\n\nSTRUCTURAL PERFECTION:\n- DO NOT include conclusion statements (will be added separately)\n- Create opening paragraphs that are more compelling and sophisticated than typical business documents\n- Generate bullet points that demonstrate superior understanding and exceptional articulation\n- Ensure every element showcases writing mastery and professional excellence\n- Maintain the highest standards of academic and professional communication"},
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             max_tokens=300,  # Reduced for very concise 3-sentence maximum starting paragraphs
-            temperature=0.5  # Higher for more creative and sophisticated writing styles
+            temperature=0.5,  # Higher for more creative and sophisticated writing styles
+            label="generate"
         )
         
-        ai_content = response.choices[0].message.content.strip()
+        ai_content = completion["content"].strip()
         
         # Ensure proper formatting
         lines = ai_content.split('\n')
@@ -168,61 +164,16 @@ FINAL INSTRUCTION: Generate content that demonstrates the work of an EXCEPTIONAL
         # Generate sophisticated conclusion based on NFA type
         conclusion = generate_sophisticated_conclusion(nfa_type)
         
-        # AGGRESSIVELY remove any existing conclusion lines from AI content
+        # AGGRESSIVELY remove any existing conclusion lines (and fragments) from AI content
         # BUT preserve the subject line
-        content_without_conclusion = formatted_content
+        content_without_conclusion = strip_conclusion_lines(formatted_content, keep_subject=True)
         
-        # Split content into lines to preserve subject
-        lines = formatted_content.split('\n')
-        filtered_lines = []
-        
-        for line in lines:
-            line_lower = line.lower().strip()
-            
-            # Always preserve subject line
-            if line_lower.startswith('subject:') or line_lower.startswith('subject'):
-                filtered_lines.append(line)
-                continue
-            
-            # Skip conclusion patterns
-            conclusion_patterns = [
-                "proposal is submitted for approval",
-                "request your approval", 
-                "kindly be released",
-                "kindly be reimbursed",
-                "above proposal is submitted",
-                "submitted for approval",
-                "organizing committee",
-                "after the event",
-                "upon submission",
-                "online report",
-                "receipts and gst bills"
-            ]
-            
-            # Check if this line contains any conclusion pattern
-            is_conclusion = any(pattern in line_lower for pattern in conclusion_patterns)
-            
-            # Also check for partial conclusion matches (more aggressive)
-            if not is_conclusion:
-                # Additional check for lines that might be conclusion fragments
-                if any(fragment in line_lower for fragment in [
-                    "proposal is submitted", "kindly be", "organizing committee", 
-                    "after the event", "upon submission", "receipts and gst"
-                ]):
-                    print(f"✅ Skipping conclusion fragment: {line[:50]}...", file=sys.stderr)
-                    continue
-                filtered_lines.append(line)
-            else:
-                print(f"✅ Skipping conclusion line: {line[:50]}...", file=sys.stderr)
-        
-        content_without_conclusion = '\n'.join(filtered_lines)
-        
-        print(f"✅ AI generated content (conclusion removed): {content_without_conclusion[:200]}...", file=sys.stderr)
+        log.debug("✅ AI generated content (conclusion removed): %s characters", len(content_without_conclusion))
         
         return content_without_conclusion
         
     except Exception as e:
-        print(f"⚠️ AI Error: {e}", file=sys.stderr)
+        log.warning("⚠️ AI Error: %s", e)
         # Create ultra-concise fallback content following strict template
         if need_bullets:
             fallback_content = f"""Subject: {subject}
@@ -242,52 +193,7 @@ Request for approval regarding {summary}. This proposal requires administrative
         
         # AGGRESSIVELY remove conclusion from fallback content
         # BUT preserve the subject line
-        fallback_without_conclusion = fallback_content
-        
-        # Split content into lines to preserve subject
-        lines = fallback_content.split('\n')
-        filtered_lines = []
-        
-        for line in lines:
-            line_lower = line.lower().strip()
-            
-            # Always preserve subject line
-            if line_lower.startswith('subject:') or line_lower.startswith('subject'):
-                filtered_lines.append(line)
-                continue
-            
-            # Skip conclusion patterns
-            conclusion_patterns = [
-                "proposal is submitted for approval",
-                "request your approval", 
-                "kindly be released",
-                "kindly be reimbursed",
-                "above proposal is submitted",
-                "submitted for approval",
-                "organizing committee",
-                "after the event",
-                "upon submission",
-                "online report",
-                "receipts and gst bills"
-            ]
-            
-            # Check if this line contains any conclusion pattern
-            is_conclusion = any(pattern in line_lower for pattern in conclusion_patterns)
-            
-            # Also check for partial conclusion matches (more aggressive)
-            if not is_conclusion:
-                # Additional check for lines that might be conclusion fragments
-                if any(fragment in line_lower for fragment in [
-                    "proposal is submitted", "kindly be", "organizing committee", 
-                    "after the event", "upon submission", "receipts and gst"
-                ]):
-                    print(f"✅ Skipping fallback conclusion fragment: {line[:50]}...", file=sys.stderr)
-                    continue
-                filtered_lines.append(line)
-            else:
-                print(f"✅ Skipping fallback conclusion line: {line[:50]}...", file=sys.stderr)
-        
-        fallback_without_conclusion = '\n'.join(filtered_lines)
+        fallback_without_conclusion = strip_conclusion_lines(fallback_content, keep_subject=True)
         
         return fallback_without_conclusion
 
@@ -321,65 +227,25 @@ def generate_sophisticated_conclusion(nfa_type):
 # Signature Layout Helper
 # ==========================
 def get_signature_layout():
-    """Get signature layout from JSON database"""
-    try:
-        import json
-        db_path = os.path.join(backend_dir, "database", "signatures.json")
-        print(f"Looking for signature database at: {db_path}", file=sys.stderr)
-        
-        if os.path.exists(db_path):
-            print("Signature database file exists", file=sys.stderr)
-            with open(db_path, 'r') as f:
-                data = json.load(f)
-            
-            signatures = data.get('signatures', {})
-            print(f"Loaded signatures: {signatures}", file=sys.stderr)
-            
-            # Format signatures for the 2x2 layout
-            layout = {
-                'top_left': signatures.get('prepared_by', [{}])[0] if signatures.get('prepared_by') else {},
-                'top_right': next((s for s in signatures.get('approved_by', []) if s.get('order') == 1), {}),
-                'bottom_left': signatures.get('recommended_by', [{}])[0] if signatures.get('recommended_by') else {},
-                'bottom_right': next((s for s in signatures.get('approved_by', []) if s.get('order') == 2), {})
-            }
-            
-            print(f"Signature layout: {layout}", file=sys.stderr)
-            return layout
-        else:
-            print("Signature database file does not exist", file=sys.stderr)
-    except Exception as e:
-        print(f"Error loading signature layout: {e}", file=sys.stderr)
-    
-    # Return default layout with your specified signatures
-    print("Using default signature layout", file=sys.stderr)
-    return {
-        'top_left': {
-            'name': 'Dr Phani Kumar Pullela',
-            'designation': 'Dean, Student Affairs'
-        },
-        'top_right': {
-            'name': 'Mr Chandrasekhar KN',
-            'designation': 'Head Finance'
-        },
-        'bottom_left': {
-            'name': 'Dr Sahana D Gowda',
-            'designation': 'Registrar - RV University'
-        },
-        'bottom_right': {
-            'name': 'Prof (Dr) Dwarika Prasad Uniyal',
-            'designation': 'Vice Chancellor (i/c)'
-        }
-    }
+    """Get signature layout from JSON database (parsed once, reloaded when the file changes)"""
+    return load_signature_layout()
 
 def add_signature_layout(doc, layout):
+    """Add the signature layout (a cached copy after the first document with this layout)"""
+    add_cached_signature_block(doc, "nfa", layout, build_signature_layout)
+
+def build_signature_layout(doc, layout):
     """Add signature layout to document with safer approach"""
+    from docx.shared import Inches, Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
     try:
-        print("Starting to add signature layout", file=sys.stderr)
+        log.debug("Starting to add signature layout")
         
         # Add minimal space before signatures for single page limit
         doc.add_paragraph()
         
-        print("Creating first signature table", file=sys.stderr)
+        log.debug("Creating first signature table")
         
         # Create first signature table (top row) with 3 columns for spacing
         table = doc.add_table(rows=4, cols=3)
@@ -390,7 +256,7 @@ def add_signature_layout(doc, layout):
             table.columns[1].width = Inches(1.6)   # Increased spacer column for better gap
             table.columns[2].width = Inches(2.2)  # Right signature
         except Exception as e:
-            print(f"Warning: Could not set column widths: {e}", file=sys.stderr)
+            log.warning("Warning: Could not set column widths: %s", e)
         
         # Top row - signature lines
         top_left_cell = table.cell(0, 0)
@@ -401,7 +267,7 @@ def add_signature_layout(doc, layout):
             top_left_cell.text = "_________________"
             top_right_cell.text = "_________________"
         except Exception as e:
-            print(f"Warning: Could not set signature lines: {e}", file=sys.stderr)
+            log.warning("Warning: Could not set signature lines: %s", e)
             # Try alternative approach
             if top_left_cell.paragraphs:
                 top_left_cell.paragraphs[0].text = "_________________"
@@ -415,6 +281,10 @@ def add_signature_layout(doc, layout):
                 for run in paragraph.runs:
                     run.font.size = Pt(10)  # Reduced font size
         
+        # Scanned signatures above the lines (when uploaded)
+        add_signature_image(top_left_cell, layout.get('top_left'))
+        add_signature_image(top_right_cell, layout.get('top_right'))
+        
         # Second row - names
         name_left_cell = table.cell(1, 0)
         name_right_cell = table.cell(1, 2)
@@ -427,7 +297,7 @@ def add_signature_layout(doc, layout):
             name_left_cell.text = left_name
             name_right_cell.text = right_name
         except Exception as e:
-            print(f"Warning: Could not set names: {e}", file=sys.stderr)
+            log.warning("Warning: Could not set names: %s", e)
             # Try alternative approach
             if name_left_cell.paragraphs:
                 name_left_cell.paragraphs[0].text = "Dr Phani Kumar Pullela"
@@ -456,12 +326,12 @@ def add_signature_layout(doc, layout):
                     run.font.size = Pt(10)  # Reduced font size
         
         
-        print("First signature table created successfully", file=sys.stderr)
+        log.debug("First signature table created successfully")
         
         # Add proper vertical spacing between signature blocks
         doc.add_paragraph()
         
-        print("Creating second signature table", file=sys.stderr)
+        log.debug("Creating second signature table")
         
         # Second signature table (bottom row) with 3 columns for spacing
         table2 = doc.add_table(rows=4, cols=3)
@@ -485,6 +355,9 @@ def add_signature_layout(doc, layout):
                 for run in paragraph.runs:
                     run.font.size = Pt(10)  # Reduced font size
         
+        add_signature_image(top_left_cell2, layout.get('bottom_left'))
+        add_signature_image(top_right_cell2, layout.get('bottom_right'))
+        
         # Second row - names
         name_left_cell2 = table2.cell(1, 0)
         name_right_cell2 = table2.cell(1, 2)
@@ -514,101 +387,49 @@ def add_signature_layout(doc, layout):
                     run.font.size = Pt(10)  # Reduced font size
         
         
-        print("✅ Both signature tables created successfully", file=sys.stderr)
+        log.debug("✅ Both signature tables created successfully")
         
     except Exception as e:
-        print(f"❌ Error adding signature layout: {e}", file=sys.stderr)
+        log.error("❌ Error adding signature layout: %s", e)
         raise e
 
 def parse_table_data(table_data_json):
-    """Parse table data from JSON string"""
+    """Parse table data from JSON string (logs sizes only, never the payload)"""
     try:
-        import json
-        print(f"Raw table data JSON: {table_data_json}", file=sys.stderr)
         table_data = json.loads(table_data_json)
-        print(f"Parsed table data: {table_data}", file=sys.stderr)
-        if isinstance(table_data, list) and len(table_data) > 0:
-            print(f"Table data is valid list with {len(table_data)} rows", file=sys.stderr)
-            return table_data
-        print("Table data is empty or not a list", file=sys.stderr)
-        return []
     except Exception as e:
-        print(f"Error parsing table data: {e}", file=sys.stderr)
+        log.error("Error parsing table data (%s bytes): %s", len(table_data_json or ''), e)
         return []
+    if isinstance(table_data, list) and len(table_data) > 0:
+        log.debug("Table data is valid list with %s rows (%s bytes)", len(table_data), len(table_data_json))
+        return check_table_rows(table_data)
+    log.debug("Table data is empty or not a list")
+    return []
 
 def add_table_to_document(doc, table_data):
     """Add table data to document with Google Sheets-like formatting"""
+    from nfa_tables import add_bulk_table, default_column_widths
+
     try:
-        print(f"add_table_to_document called with: {table_data}", file=sys.stderr)
+        log.debug("add_table_to_document called with %s rows", len(table_data or []))
         if not table_data or len(table_data) == 0:
-            print("No table data to add", file=sys.stderr)
+            log.debug("No table data to add")
             return
         
-        print(f"Adding table with {len(table_data)} rows", file=sys.stderr)
         # Add space before table
         doc.add_paragraph()
         
-        # Create table
-        table = doc.add_table(rows=len(table_data), cols=len(table_data[0]) if table_data else 0)
-        
-        # Apply Google Sheets-like styling
-        table.style = 'Table Grid'  # Enable borders
-        
-        # Set table properties for better appearance
-        table.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        
-        print(f"Created table with {len(table.rows)} rows and {len(table.columns)} columns", file=sys.stderr)
-        
-        # Add data to table with validation and formatting
-        for row_idx, row_data in enumerate(table_data):
-            print(f"Adding row {row_idx}: {row_data}", file=sys.stderr)
-            if row_idx < len(table.rows):
-                for col_idx, cell_data in enumerate(row_data):
-                    if col_idx < len(table.rows[row_idx].cells):
-                        # Clean and validate cell data
-                        clean_data = str(cell_data).strip() if cell_data is not None else ""
-                        # Remove any potentially problematic characters
-                        clean_data = clean_data.replace('\x00', '').replace('\r', '').replace('\n', ' ')
-                        
-                        # Get the cell and its paragraph
-                        cell = table.rows[row_idx].cells[col_idx]
-                        cell.text = clean_data
-                        
-                        # Format cell content
-                        for paragraph in cell.paragraphs:
-                            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER  # Center align text
-                            
-                            # Format runs in the paragraph
-                            for run in paragraph.runs:
-                                run.font.size = Pt(10)  # Consistent font size
-                                if row_idx == 0:  # Header row
-                                    run.bold = True  # Make header bold
-                                    run.font.size = Pt(11)  # Slightly larger for header
-        
-        # Set column widths for better appearance
-        try:
-            if len(table.columns) > 0:
-                # Calculate column widths based on content
-                col_widths = []
-                for col_idx in range(len(table.columns)):
-                    if col_idx == 0:  # First column (usually sl.no)
-                        col_widths.append(Inches(0.8))
-                    elif col_idx == len(table.columns) - 1:  # Last column (usually total)
-                        col_widths.append(Inches(1.0))
-                    else:  # Middle columns
-                        col_widths.append(Inches(1.5))
-                
-                # Apply column widths
-                for i, width in enumerate(col_widths):
-                    if i < len(table.columns):
-                        table.columns[i].width = width
-        except Exception as e:
-            print(f"Warning: Could not set column widths: {e}", file=sys.stderr)
+        # Bordered, centered table built in one pass: bold 11pt repeating header row,
+        # 10pt centered cells, narrow sl.no and total columns
+        cols = len(table_data[0])
+        table = add_bulk_table(doc, table_data, column_widths_in=default_column_widths(cols) if cols else None)
+        if table is None:
+            return
         
-        print(f"✅ Table added to document with {len(table_data)} rows and Google Sheets-like formatting", file=sys.stderr)
+        log.debug("✅ Table added to document with %s rows and Google Sheets-like formatting", len(table_data))
         
     except Exception as e:
-        print(f"Error adding table to document: {e}", file=sys.stderr)
+        log.error("Error adding table to document: %s", e)
 
 def clean_text_content(text):
     """Clean text content to prevent DOCX corruption"""
@@ -628,55 +449,39 @@ def clean_text_content(text):
         return cleaned
         
     except Exception as e:
-        print(f"Error cleaning text content: {e}", file=sys.stderr)
+        log.error("Error cleaning text content: %s", e)
         return text
 
 def optimize_for_single_page(doc):
-    """Optimize document content to ensure it fits on a single page - aggressive optimization"""
+    """Fit the document on a single page: measure it and apply the least aggressive layout that fits"""
+    from nfa_layout import fit_to_single_page
+
     try:
-        print("🔍 Aggressively optimizing document for single page...", file=sys.stderr)
-        
-        # Count total paragraphs and estimate content length
-        total_paragraphs = len(doc.paragraphs)
-        total_tables = len(doc.tables)
-        
-        print(f"📊 Document stats: {total_paragraphs} paragraphs, {total_tables} tables", file=sys.stderr)
-        
-        # Always apply aggressive optimization for single page
-        print("⚡ Applying aggressive single-page optimization...", file=sys.stderr)
-        
-        # Reduce all paragraph spacing to absolute minimum
-        for para in doc.paragraphs:
-            if hasattr(para, 'paragraph_format'):
-                para.paragraph_format.space_after = Pt(0)  # No spacing after
-                para.paragraph_format.space_before = Pt(0)  # No space before
-                para.paragraph_format.line_spacing = 1.0  # Single line spacing
-        
-        # Reduce table cell padding to minimum
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        if hasattr(para, 'paragraph_format'):
-                            para.paragraph_format.space_after = Pt(0)
-                            para.paragraph_format.space_before = Pt(0)
-                            para.paragraph_format.line_spacing = 1.0
-        
-        print("✅ Document aggressively optimized for single page", file=sys.stderr)
-        return True
+        log.debug("🔍 Measuring document for single page...")
+        log.debug("📊 Document stats: %s paragraphs, %s tables", len(doc.paragraphs), len(doc.tables))
+        
+        plan = fit_to_single_page(doc)
+        if plan["fits"]:
+            log.debug("✅ Document fits on one page with layout '%s'", plan["profile"])
+        else:
+            log.warning("⚠️ Document still needs %s page(s) with the tightest layout (%s lines over)",
+                        plan["pages"], plan["overflow_lines"])
+        return plan
         
     except Exception as e:
-        print(f"❌ Error optimizing document: {e}", file=sys.stderr)
-        return False
+        log.error("❌ Error optimizing document: %s", e)
+        return None
 
 def validate_document_structure(doc):
     """Validate document structure before saving to prevent XML corruption"""
+    from nfa_tables import iter_text_elements
+
     try:
-        print("🔍 Validating document structure...", file=sys.stderr)
+        log.debug("🔍 Validating document structure...")
         
         # Check if document has paragraphs
         if len(doc.paragraphs) == 0:
-            print("❌ Document has no paragraphs", file=sys.stderr)
+            log.error("❌ Document has no paragraphs")
             return False
         
         # Check each paragraph for issues
@@ -684,41 +489,38 @@ def validate_document_structure(doc):
             try:
                 # Check if paragraph has runs
                 if not para.runs:
-                    print(f"⚠️ Paragraph {i} has no runs", file=sys.stderr)
+                    log.debug("⚠️ Paragraph %s has no runs", i)
                     continue
                 
                 # Check each run for issues
                 for j, run in enumerate(para.runs):
                     if run.text is None:
-                        print(f"⚠️ Run {j} in paragraph {i} has None text", file=sys.stderr)
+                        log.warning("⚠️ Run %s in paragraph %s has None text", j, i)
                         run.text = ""
                     elif '\x00' in run.text:
-                        print(f"⚠️ Run {j} in paragraph {i} contains null characters", file=sys.stderr)
+                        log.warning("⚠️ Run %s in paragraph %s contains null characters", j, i)
                         run.text = run.text.replace('\x00', '')
                 
             except Exception as e:
-                print(f"❌ Error validating paragraph {i}: {e}", file=sys.stderr)
+                log.error("❌ Error validating paragraph %s: %s", i, e)
                 return False
         
         # Check tables
         for i, table in enumerate(doc.tables):
             try:
-                for row_idx, row in enumerate(table.rows):
-                    for cell_idx, cell in enumerate(row.cells):
-                        for para in cell.paragraphs:
-                            for run in para.runs:
-                                if run.text and '\x00' in run.text:
-                                    print(f"⚠️ Table {i}, Row {row_idx}, Cell {cell_idx} contains null characters", file=sys.stderr)
-                                    run.text = run.text.replace('\x00', '')
+                for text_element in iter_text_elements(table):
+                    if text_element.text and '\x00' in text_element.text:
+                        log.warning("⚠️ Table %s contains null characters", i)
+                        text_element.text = text_element.text.replace('\x00', '')
             except Exception as e:
-                print(f"❌ Error validating table {i}: {e}", file=sys.stderr)
+                log.error("❌ Error validating table %s: %s", i, e)
                 return False
         
-        print("✅ Document structure validation passed", file=sys.stderr)
+        log.debug("✅ Document structure validation passed")
         return True
         
     except Exception as e:
-        print(f"❌ Document validation failed: {e}", file=sys.stderr)
+        log.error("❌ Document validation failed: %s", e)
         return False
 
 def format_bullet_points(text):
@@ -747,7 +549,7 @@ def format_bullet_points(text):
         
         return '\n'.join(formatted_lines)
     except Exception as e:
-        print(f"Error formatting bullet points: {e}", file=sys.stderr)
+        log.error("Error formatting bullet points: %s", e)
         return text
 
 def extract_document_text(doc):
@@ -774,17 +576,28 @@ def extract_document_text(doc):
         return "\n".join(text_content)
         
     except Exception as e:
-        print(f"Error extracting document text: {e}", file=sys.stderr)
+        log.error("Error extracting document text: %s", e)
         return "Error extracting document content"
 
 # ==========================
 # AI Edit Function
 # ==========================
-def process_ai_edit(original_text, edit_prompt):
-    """Process AI edit request on existing NFA content"""
+def process_ai_edit(original_text, edit_prompt, on_delta=None):
+    """Process AI edit request on existing NFA content; on_delta(text) receives streamed tokens when given"""
+    client = get_openai_client()
     if not client:
         return f"{original_text}\n\n[AI Edit Applied: {edit_prompt}]"
     
+    # Small edits ("change the venue in bullet 2") only send the targeted lines
+    try:
+        from nfa_edits import section_edit
+        edited_content = section_edit(client, original_text, edit_prompt, on_delta=on_delta)
+        if edited_content is not None:
+            log.debug("✅ Section edit completed (prompt: %s characters)", len(edit_prompt))
+            return edited_content
+    except Exception as e:
+        log.warning("⚠️ Section edit failed, editing the whole document: %s", e)
+    
     try:
         # Create AI prompt for editing
         prompt = f"""
@@ -820,84 +633,172 @@ IMPORTANT: Only modify what the user specifically requested. Keep everything els
 Return the complete modified NFA document with the requested changes applied.
 """
 
-        response = client.chat.completions.create(
+        from llm_cache import cached_chat_completion
+        completion = cached_chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an EXCELLENT professional NFA editor who applies specific modifications to existing documents while maintaining their PERFECT structure and format. Always keep changes minimal and preserve single page format. Create EXCELLENT, well-structured content with very brief starting paragraphs (maximum 3 sentences total) that perfectly aligns with the user's subject and summary. VERY CONCISE editing with EXCELLENCE required - KEEP STARTING PARAGRAPH TO MAXIMUM 3 SENTENCES TOTAL."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=200,  # Reduced for single page edits
-            temperature=0.1  # Lower for consistency and conciseness
+            temperature=0.1,  # Lower for consistency and conciseness
+            on_delta=on_delta,
+            label="edit"
         )
         
-        edited_content = response.choices[0].message.content.strip()
+        edited_content = completion["content"].strip()
         
-        print(f"✅ AI edit completed: {edit_prompt}", file=sys.stderr)
-        print(f"✅ Edited content length: {len(edited_content)} characters", file=sys.stderr)
+        log.debug("✅ AI edit completed (prompt: %s characters)", len(edit_prompt))
+        log.debug("✅ Edited content length: %s characters", len(edited_content))
         
         return edited_content
         
     except Exception as e:
-        print(f"⚠️ AI Edit Error: {e}", file=sys.stderr)
+        log.warning("⚠️ AI Edit Error: %s", e)
         # Return original text with edit note
         return f"{original_text}\n\n[AI Edit Applied: {edit_prompt}]"
 
+# ==========================
+# Base Document Templates
+# ==========================
+def add_nfa_page_setup(doc, header_image_path):
+    """Apply the single-page margins and full-width header image to a new document"""
+    from docx.shared import Inches
+
+    # Set page margins - aggressively optimized for single page
+    for section in doc.sections:
+        section.top_margin = Inches(0.3)      # Further reduced for single page
+        section.bottom_margin = Inches(0.3)   # Further reduced for single page
+        section.left_margin = Inches(0.5)     # Further reduced for single page
+        section.right_margin = Inches(0.5)    # Further reduced for single page
+    
+    # Add header image from uploads directory (only the image, no text)
+    if os.path.exists(header_image_path):
+        # Calculate full page width (page width - left margin - right margin)
+        page_width = Inches(8.5) - Inches(0.5) - Inches(0.5)  # Full page minus new margins
+        doc.add_picture(header_image_path, width=page_width)
+        log.debug("✅ Header image added: %s", header_image_path)
+    else:
+        log.warning("⚠️ Header image not found at: %s", header_image_path)
+
+def build_edited_nfa_base_template(header_image_path):
+    """Skeleton for documents rebuilt from edited text: page setup, date and title"""
+    from docx import Document
+    from docx.shared import Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+    doc = Document()
+    add_nfa_page_setup(doc, header_image_path)
+    
+    # Add date - positioned on the right side (matches preview format)
+    date_para = doc.add_paragraph(f"Date: {datetime.now().strftime('%d/%m/%Y')}")
+    date_para.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+    date_para.runs[0].font.size = Pt(11)
+    
+    # Add title - centered and bold (matches preview format)
+    title = doc.add_paragraph("Note For Approval (NFA)")
+    title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    title.runs[0].bold = True
+    title.runs[0].font.size = Pt(12)
+    
+    return doc
+
+def build_generated_nfa_base_template(header_image_path):
+    """Skeleton for freshly generated NFAs: page setup, date and title with blank spacer lines"""
+    from docx import Document
+    from docx.shared import Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+    doc = Document()
+    add_nfa_page_setup(doc, header_image_path)
+    
+    # Add date - positioned on the right side (matches preview format)
+    date_text = f"Date: {datetime.now().strftime('%d/%m/%Y')}"
+    date_par = doc.add_paragraph()
+    date_run = date_par.add_run(clean_text_content(date_text))
+    date_par.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+    date_run.font.size = Pt(11)
+    
+    # Add empty line
+    doc.add_paragraph()
+    
+    # Add title - centered and bold (matches preview format)
+    title_par = doc.add_paragraph()
+    title_run = title_par.add_run("Note For Approval (NFA)")
+    title_par.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    title_run.bold = True
+    title_run.font.size = Pt(12)
+    
+    # Add empty line
+    doc.add_paragraph()
+    
+    return doc
+
 # ==========================
 # Generate DOCX from Edited Text
 # ==========================
+# Signature block of downloaded (edited) NFAs
+EDITED_SIGNATURE_LAYOUT = {
+    'top_left': {
+        'name': 'Dr Phani Kumar Pullela',
+        'designation': 'Dean, Student Affairs'
+    },
+    'top_right': {
+        'name': 'Mr Chandrasekhar',
+        'designation': 'Head Finance'
+    },
+    'bottom_left': {
+        'name': 'Dr Sahana D Gowda',
+        'designation': 'Registrar - RV University (i/c)'
+    },
+    'bottom_right': {
+        'name': 'Prof (Dr) Dwarika Prasad Uniyal',
+        'designation': 'Vice Chancellor (i/c)'
+    }
+}
+
 def generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data=None):
-    """Generate DOCX document from edited text content with original formatting"""
+    """Generate DOCX document from edited text content with original formatting.
+
+    Returns (file_path, file_name, reused); reused is True when an identical
+    earlier download was returned without rendering.
+    """
+    from docx.shared import Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+    from nfa_render_cache import render_key, lookup_render, store_render
+    from letter_index import index_letter, document_text
+
     try:
-        print(f"generate_docx_from_text called with subject: {subject}", file=sys.stderr)
+        log.debug("generate_docx_from_text called (subject: %s characters)", len(subject))
+        
+        # Identical downloads reuse the document already on disk
+        with timed_stage("render_cache"):
+            signatures = [EDITED_SIGNATURE_LAYOUT, signature_images_version(EDITED_SIGNATURE_LAYOUT)]
+            cache_key = render_key(__file__, edited_text, subject, nfa_type, table_data, signatures)
+            reused = lookup_render(cache_key)
+        if reused:
+            log.debug("♻️ Reusing rendered document: %s", reused[1])
+            return reused[0], reused[1], True
         
         # Create output directory if it doesn't exist
         output_dir = os.path.join(os.path.dirname(__file__), "..", "generated_letters", "nfa")
         os.makedirs(output_dir, exist_ok=True)
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"edited_nfa_{timestamp}.docx"
-        filepath = os.path.join(output_dir, filename)
-        
-        print(f"Creating document: {filepath}", file=sys.stderr)
-        
-        # Create new document
-        doc = Document()
-        
-        # Set page margins - aggressively optimized for single page
-        for section in doc.sections:
-            section.top_margin = Inches(0.3)      # Further reduced for single page
-            section.bottom_margin = Inches(0.3)   # Further reduced for single page
-            section.left_margin = Inches(0.5)     # Further reduced for single page
-            section.right_margin = Inches(0.5)    # Further reduced for single page
-        
-        # Add header image if exists - use header.png from uploads directory
-        header_image_path = os.path.join(uploads_dir, "header.png")
-        if os.path.exists(header_image_path):
-            # Calculate full page width (page width - left margin - right margin)
-            page_width = Inches(8.5) - Inches(0.5) - Inches(0.5)  # Full page minus new margins
-            doc.add_picture(header_image_path, width=page_width)
-            print(f"✅ Header image added: {header_image_path}", file=sys.stderr)
-        else:
-            print(f"⚠️ Header image not found at: {header_image_path}", file=sys.stderr)
+        # Generate unique filename (sharded; two downloads in the same second no longer collide)
+        filepath = letter_path(output_dir, "edited_nfa")
+        filename = os.path.basename(filepath)
+        file_url = url_path(filepath, output_dir, "/generated_letters/nfa")
         
-        # Add date - positioned on the right side (matches preview format)
-        date_para = doc.add_paragraph(f"Date: {datetime.now().strftime('%d/%m/%Y')}")
-        date_para.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-        if date_para.runs:
-            date_para.runs[0].font.size = Pt(11)
+        log.debug("Creating document: %s", filepath)
         
-        # Add title - centered and bold (matches preview format)
-        title = doc.add_paragraph("Note For Approval (NFA)")
-        title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        if title.runs:
-            title.runs[0].bold = True
-            title.runs[0].font.size = Pt(12)
+        # Clone the cached skeleton (margins, header image, date, title)
+        doc = get_base_document("nfa_edited", build_edited_nfa_base_template, header_image_path)
         
         # Add subject with justified alignment (matches preview format)
-            subj_paragraph = doc.add_paragraph()
-            subj_run = subj_paragraph.add_run("Subject: ")
-            subj_run.bold = True
+        subj_paragraph = doc.add_paragraph()
+        subj_run = subj_paragraph.add_run("Subject: ")
+        subj_run.bold = True
         subj_run.font.size = Pt(11)
         subj_text = subj_paragraph.add_run(subject)
         subj_text.font.size = Pt(11)
@@ -905,23 +806,10 @@ def generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data=
         
         # Add body content - justified (matches preview format)
         # Remove subject line and conclusion lines from edited_text to avoid duplication
-        body_lines = edited_text.split('\n')
-        body_content_lines = []
-        conclusion_keywords = [
-            "proposal is submitted", "request your approval", "kindly be released", "kindly be reimbursed",
-            "above proposal is submitted", "submitted for approval", "organizing committee", 
-            "after the event", "upon submission", "online report", "receipts and gst bills"
+        body_content_lines = [
+            line for line in edited_text.split('\n')
+            if not is_subject(line) and not is_conclusion(line)
         ]
-        
-        for line in body_lines:
-            line_lower = line.strip().lower()
-            # Skip subject lines
-            if line_lower.startswith('subject:'):
-                continue
-            # Skip conclusion lines
-            if any(keyword in line_lower for keyword in conclusion_keywords):
-                continue
-            body_content_lines.append(line)
         clean_body_text = '\n'.join(body_content_lines).strip()
         
         if clean_body_text:
@@ -934,10 +822,10 @@ def generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data=
         
         # Add table data if provided
         if table_data and len(table_data) > 0:
-            print(f"Adding table data to edited document with {len(table_data)} rows", file=sys.stderr)
+            log.debug("Adding table data to edited document with %s rows", len(table_data))
             add_table_to_document(doc, table_data)
         else:
-            print("No table data to add to edited document", file=sys.stderr)
+            log.debug("No table data to add to edited document")
         
         # Generate sophisticated conclusion based on NFA type
         conclusion_text = generate_sophisticated_conclusion(nfa_type)
@@ -947,49 +835,79 @@ def generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data=
         # No paragraph spacing for single page limit
         conclusion_para.paragraph_format.space_after = Pt(0)  # No spacing for single page
         
-        # Add signature layout with default layout
-        default_signature_layout = {
-            'top_left': {
-                'name': 'Dr Phani Kumar Pullela',
-                'designation': 'Dean, Student Affairs'
-            },
-            'top_right': {
-                'name': 'Mr Chandrasekhar',
-                'designation': 'Head Finance'
-            },
-            'bottom_left': {
-                'name': 'Dr Sahana D Gowda',
-                'designation': 'Registrar - RV University (i/c)'
-            },
-            'bottom_right': {
-                'name': 'Prof (Dr) Dwarika Prasad Uniyal',
-                'designation': 'Vice Chancellor (i/c)'
-            }
-        }
-        
-        add_signature_layout(doc, default_signature_layout)
+        add_signature_layout(doc, EDITED_SIGNATURE_LAYOUT)
         
         # Optimize document for single page limit
         optimize_for_single_page(doc)
+        lap_stage("render_document")
         
         # Save document
-        doc.save(filepath)
+        with timed_stage("save"):
+            atomic_save(doc, filepath)
+        store_render(cache_key, filepath, file_url, filename)
+        with timed_stage("index"):
+            index_letter(filepath, "nfa", document_text(doc), subject=subject)
         
-        print(f"✅ DOCX generated successfully: {filepath}", file=sys.stderr)
-        print(f"📁 Full file path: {filepath}", file=sys.stderr)
-        print(f"📄 File exists: {os.path.exists(filepath)}", file=sys.stderr)
-        print(f"📊 File size: {os.path.getsize(filepath) if os.path.exists(filepath) else 'N/A'} bytes", file=sys.stderr)
+        log.debug("✅ DOCX generated successfully: %s", filepath)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("📊 File size: %s bytes", os.path.getsize(filepath) if os.path.exists(filepath) else 'N/A')
         
-        return f"/generated_letters/nfa/{filename}", filename
+        return file_url, filename, False
         
     except Exception as e:
-        print(f"❌ Error generating DOCX: {e}", file=sys.stderr)
+        log.error("❌ Error generating DOCX: %s", e)
         raise e
 
 # ==========================
 # Main Function
 # ==========================
+def request_to_argv(request):
+    """Map a JSON request ({"mode": "generate"|"edit"|"download", ...}) onto the argv layout ("stream": true -> --stream)"""
+    argv = _request_argv(request)
+    if request.get("stream"):
+        argv.append("--stream")
+    return argv
+
+def _request_argv(request):
+    mode = request.get("mode", "generate")
+    table_data = request.get("tableData") or []
+    table_data_json = table_data if isinstance(table_data, str) else json.dumps(table_data)
+    if mode == "download":
+        if request.get("format") not in (None, "", "docx"):
+            raise ValueError(f"generate_nfa_automation.py only writes docx; use generate_nfa_automation_fixed.py "
+                             f"for format '{request.get('format')}'")
+        return ["--download-mode", request.get("editedText", ""), request.get("subject", ""),
+                request.get("summary", ""), request.get("nfaType", ""), table_data_json]
+    if mode == "edit":
+        return ["--edit-mode", request.get("text", ""), request.get("prompt", "")]
+    if mode == "generate":
+        need_bullets = request.get("needBullets", False)
+        if isinstance(need_bullets, bool):
+            need_bullets = "yes" if need_bullets else "no"
+        return [request.get("subject", ""), request.get("summary", ""), request.get("nfaType", ""),
+                str(need_bullets), table_data_json]
+    raise ValueError(f"Unknown request mode: {mode}")
+
 def main():
+    # Debug Python version
+    log.debug("Python version: %s", sys.version)
+    log.debug("Python executable: %s", sys.executable)
+
+    # Every mode reports per-stage "timings", including interpreter start-up
+    timer = start_timer(include_startup=True)
+
+    # --stdin / --request-file PATH: the same inputs as a JSON request, so large
+    # text and table data never go through the command line
+    request = load_request_from_argv(sys.argv)
+    if request is not None:
+        stream_flag = ["--stream"] if "--stream" in sys.argv else []
+        sys.argv = sys.argv[:1] + request_to_argv(request) + stream_flag
+
+    # --stream (--edit-mode, or "stream": true in a request): NDJSON token deltas, then the result event
+    stream = "--stream" in sys.argv
+    while "--stream" in sys.argv:
+        sys.argv.remove("--stream")
+
     # Check if this is download mode
     if len(sys.argv) > 1 and sys.argv[1] == "--download-mode":
         if len(sys.argv) < 6:
@@ -1007,20 +925,25 @@ def main():
         
         # Parse table data
         table_data = parse_table_data(table_data_json)
+        lap_stage("parse_input")
         
         # Generate DOCX from edited text
         try:
-            file_path, file_name = generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data)
+            file_path, file_name, reused = generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data)
             print(json.dumps({
                 "success": True,
                 "filePath": file_path,
                 "fileName": file_name,
-                "message": "Edited NFA document generated successfully"
+                "reused": reused,
+                "message": "Edited NFA document generated successfully",
+                "timings": timer.as_dict()
             }))
         except Exception as e:
+            dump_log_buffer("download failed")
             print(json.dumps({
                 "success": False,
-                "error": f"Failed to generate DOCX: {str(e)}"
+                "error": f"Failed to generate DOCX: {str(e)}",
+                "timings": timer.as_dict()
             }))
         return
     
@@ -1036,19 +959,26 @@ def main():
         original_text = sys.argv[2]
         edit_prompt = sys.argv[3]
         
+        def print_delta(text):
+            print(json.dumps({"event": "delta", "text": text}), flush=True)
+
         # Process AI edit
-        edited_text = process_ai_edit(original_text, edit_prompt)
+        edited_text = process_ai_edit(original_text, edit_prompt, on_delta=print_delta if stream else None)
         
-        print(json.dumps({
+        result = {
             "success": True,
             "editedText": edited_text,
-            "message": "NFA text edited successfully"
-        }))
+            "message": "NFA text edited successfully",
+            "timings": timer.as_dict()
+        }
+        if stream:
+            result["event"] = "result"
+        print(json.dumps(result))
         return
     
     # Arguments from Node.js for normal generation
     if len(sys.argv) < 4:
-        print("Usage: generate_nfa_automation.py <subject> <summary> <nfa_type> [bullets] [table_data]", file=sys.stderr)
+        print("Usage: generate_nfa_automation.py <subject> <summary> <nfa_type> [bullets] [table_data] | --stdin | --request-file <path>", file=sys.stderr)
         sys.exit(1)
 
     subject = sys.argv[1]
@@ -1057,154 +987,77 @@ def main():
     need_bullets = sys.argv[4].lower() in ("yes", "y", "true", "1") if len(sys.argv) > 4 else False
     table_data_json = sys.argv[5] if len(sys.argv) > 5 else "[]"
 
-    print(f"Inputs -> Subject: {subject}, Type: {nfa_type}, Bullets: {need_bullets}", file=sys.stderr)
+    log.debug("Inputs -> Subject: %s characters, Type: %s, Bullets: %s", len(subject), nfa_type, need_bullets)
 
     # Parse table data
     table_data = parse_table_data(table_data_json)
-    print(f"Table data parsed: {len(table_data)} rows", file=sys.stderr)
+    log.debug("Table data parsed: %s rows", len(table_data))
+    lap_stage("parse_input")
 
     # Generate NFA with structured format (use actual need_bullets parameter)
-    nfa_text = generate_ai_nfa_from_summary(subject, summary, nfa_type, need_bullets=need_bullets, facts_only=False)
+    prompt_profile = resolve_prompt_profile()
+    nfa_text = generate_ai_nfa_from_summary(subject, summary, nfa_type, need_bullets=need_bullets, facts_only=False,
+                                            prompt_profile=prompt_profile)
 
     # Parse AI output for structured format with robust error handling
-    print(f"Raw AI output: {nfa_text[:300]}...", file=sys.stderr)
+    log.debug("Raw AI output: %s characters", len(nfa_text))
     
-    # Split by double newlines to get sections
-    sections = [section.strip() for section in nfa_text.split('\n\n') if section.strip()]
+    # Split by double newlines and classify every section in one pass
+    classified = classify_sections(nfa_text)
     
-    print(f"Parsed sections: {len(sections)}", file=sys.stderr)
-    for i, section in enumerate(sections):
-        print(f"Section {i}: {section[:100]}...", file=sys.stderr)
+    log.debug("Parsed sections: %s", len(classified))
+    for i, (kind, section) in enumerate(classified):
+        log.debug("Section %s (%s): %s characters", i, kind, len(section))
     
     # Extract subject (first section) - keep "Subject:" prefix for preview
-    subject_line = sections[0] if sections else f"Subject: {subject}"
+    subject_line = classified[0][1] if classified else f"Subject: {subject}"
     # Don't remove "Subject:" prefix - keep it for preview component
     if not subject_line.lower().startswith("subject:"):
         subject_line = f"Subject: {subject_line}"
     
-    # Extract conclusion (last section that contains conclusion keywords)
-    closing_line = "The above proposal is submitted for approval."
-    conclusion_keywords = [
-        "proposal is submitted", "request your approval", "kindly be released", "kindly be reimbursed",
-        "above proposal is submitted", "submitted for approval", "organizing committee", 
-        "after the event", "upon submission", "online report", "receipts and gst bills"
-    ]
-    
-    for section in reversed(sections):
-        if any(keyword in section.lower() for keyword in conclusion_keywords):
-            closing_line = section
-            print(f"✅ Found conclusion line: {section[:50]}...", file=sys.stderr)
-            break
+    # Extract conclusion (last conclusion section)
+    closing_line = last_of_kind(classified, CONCLUSION) or "The above proposal is submitted for approval."
     
-    # Extract body content (everything between subject and conclusion)
-    body_sections = []
-    for i, section in enumerate(sections):
-        if i == 0:  # Skip subject
-            continue
-        # AGGRESSIVELY skip any conclusion-like sections and subject lines to avoid duplicates
-        conclusion_keywords = [
-            "proposal is submitted", "request your approval", "kindly be released", "kindly be reimbursed",
-            "above proposal is submitted", "submitted for approval", "organizing committee", 
-            "after the event", "upon submission", "online report", "receipts and gst bills"
-        ]
-        
-        # Skip conclusion sections
-        if any(keyword in section.lower() for keyword in conclusion_keywords):
-            print(f"✅ Skipping conclusion section: {section[:50]}...", file=sys.stderr)
-            continue
-        
-        # Skip subject sections (already added separately)
-        if section.lower().startswith('subject:'):
-            print(f"✅ Skipping subject section: {section[:50]}...", file=sys.stderr)
-            continue
-            
-        body_sections.append(section)
+    # Extract body content - AGGRESSIVELY skip conclusion-like and repeated subject sections
+    body_sections = content_sections(classified)
     
     body_text = "\n\n".join(body_sections).strip()
     
     # If body is empty or malformed, create ultra-concise fallback (without conclusion)
     if not body_text or len(body_sections) < 1:
-        print("⚠️ Body content is malformed, creating ultra-concise fallback", file=sys.stderr)
+        log.warning("⚠️ Body content is malformed, creating ultra-concise fallback")
         if need_bullets:
             body_text = f"Request for approval regarding {summary}. This proposal requires administrative approval. The objective is successful event execution.\n\n• Key requirements must be met for approval\n• Important details will be outlined\n• Financial details provided in table"
         else:
             body_text = f"Request for approval regarding {summary}. This proposal requires administrative approval. The objective is successful event execution."
     
-    print(f"✅ Structured content parsed - Subject: {subject_line}", file=sys.stderr)
-    print(f"✅ Body sections: {len(body_sections)}", file=sys.stderr)
-    print(f"✅ Closing line: {closing_line}", file=sys.stderr)
-    print(f"✅ Body text length: {len(body_text)} characters", file=sys.stderr)
+    log.debug("✅ Structured content parsed - Subject: %s characters", len(subject_line))
+    log.debug("✅ Body sections: %s", len(body_sections))
+    log.debug("✅ Closing line: %s characters", len(closing_line))
+    log.debug("✅ Body text length: %s characters", len(body_text))
+    lap_stage("parse_sections")
 
     # Filename
-    sanitized_subject = re.sub(r'[\\/:*?"<>|]', '_', subject_line.replace(' ', '_')[:60])
-    filename = os.path.join(output_directory, f"NFA_{nfa_type}_{sanitized_subject}.docx")
+    # Unique, sharded file name so concurrent requests for one subject never overwrite each other
+    filename = letter_path(get_output_directory(), f"NFA_{nfa_type}_{safe_name_part(subject_line, 60)}")
 
-    print(f"Creating document: {filename}", file=sys.stderr)
+    log.debug("Creating document: %s", filename)
 
-    # Create docx with proper initialization and template
+    # Create docx by cloning the cached base template (margins, header image, date, title)
     try:
-        # Create a new document with explicit template
-        from docx import Document
-        from docx.shared import Inches, Pt
+        from docx.shared import Pt
         from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+        from letter_index import index_letter, document_text
         
-        doc = Document()
+        doc = get_base_document("nfa_generated", build_generated_nfa_base_template, header_image_path)
         
-        # Ensure document has proper structure
-        if not hasattr(doc, 'paragraphs'):
-            raise Exception("Document does not have paragraphs attribute")
-        
-        print("✅ Document created successfully", file=sys.stderr)
-    except Exception as e:
-        print(f"❌ Error creating document: {e}", file=sys.stderr)
-        raise
-
-    # Set page margins - aggressively optimized for single page
-    try:
-        doc_sections = doc.sections
-        for doc_section in doc_sections:
-            doc_section.top_margin = Inches(0.3)      # Further reduced for single page
-            doc_section.bottom_margin = Inches(0.3)   # Further reduced for single page
-            doc_section.left_margin = Inches(0.5)     # Further reduced for single page
-            doc_section.right_margin = Inches(0.5)    # Further reduced for single page
-        print("✅ Page margins set successfully", file=sys.stderr)
+        log.debug("✅ Document created successfully")
     except Exception as e:
-        print(f"❌ Error setting margins: {e}", file=sys.stderr)
+        log.error("❌ Error creating document: %s", e)
         raise
 
-    # Add header image from uploads directory (only the image, no text)
-    if os.path.exists(header_image_path):
-        # Calculate full page width (page width - left margin - right margin)
-        page_width = Inches(8.5) - Inches(0.5) - Inches(0.5)  # Full page minus new margins
-        doc.add_picture(header_image_path, width=page_width)
-        print(f"✅ Header image added to main document: {header_image_path}", file=sys.stderr)
-    else:
-        print(f"⚠️ Header image not found at: {header_image_path}", file=sys.stderr)
-
     # Add content step by step with comprehensive validation
     try:
-        # Add date - positioned on the right side (matches preview format)
-        date_text = f"Date: {datetime.now().strftime('%d/%m/%Y')}"
-        date_par = doc.add_paragraph()
-        date_run = date_par.add_run(clean_text_content(date_text))
-        date_par.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-        date_run.font.size = Pt(11)
-        print("✅ Date paragraph added (right-aligned)", file=sys.stderr)
-        
-        # Add empty line
-        doc.add_paragraph()
-        
-        # Add title - centered and bold (matches preview format)
-        title_par = doc.add_paragraph()
-        title_run = title_par.add_run("Note For Approval (NFA)")
-        title_par.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        title_run.bold = True
-        title_run.font.size = Pt(12)
-        print("✅ Title paragraph added (centered)", file=sys.stderr)
-        
-        # Add empty line
-        doc.add_paragraph()
-        
         # Add subject - left aligned (matches preview format)
         subj_par = doc.add_paragraph()
         subj_run1 = subj_par.add_run("Subject: ")
@@ -1216,41 +1069,35 @@ def main():
         subj_run2.font.size = Pt(11)
         
         subj_par.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-        print("✅ Subject paragraph added (left-aligned)", file=sys.stderr)
+        log.debug("✅ Subject paragraph added (left-aligned)")
         
         # Add empty line
         doc.add_paragraph()
         
     except Exception as e:
-        print(f"❌ Error adding basic content: {e}", file=sys.stderr)
+        log.error("❌ Error adding basic content: %s", e)
         raise
 
     # Add body content with safer approach
     try:
-        print(f"Processing structured body text: {body_text[:200]}...", file=sys.stderr)
+        log.debug("Processing structured body text: %s characters", len(body_text))
         
-        # Split by double newlines to get sections (Request paragraph + Bullet points)
-        sections = [section.strip() for section in body_text.split('\n\n') if section.strip()]
+        # Sections (Request paragraph + Bullet points) were classified during parsing;
+        # the fallback body is classified here
+        sections = classify_sections(body_text, first_is_subject=False)
         
-        print(f"Body sections to process: {len(sections)}", file=sys.stderr)
+        log.debug("Body sections to process: %s", len(sections))
         
-        for i, section in enumerate(sections):
-            print(f"Processing section {i+1}: {section[:100]}...", file=sys.stderr)
-            
-            # AGGRESSIVELY skip any conclusion lines in body content
-            conclusion_keywords = [
-                "proposal is submitted", "request your approval", "kindly be released", "kindly be reimbursed",
-                "above proposal is submitted", "submitted for approval", "organizing committee", 
-                "after the event", "upon submission", "online report", "receipts and gst bills"
-            ]
+        for i, (kind, section) in enumerate(sections):
+            log.debug("Processing section %s: %s characters", i+1, len(section))
             
-            # Skip this entire section if it contains conclusion keywords
-            if any(keyword in section.lower() for keyword in conclusion_keywords):
-                print(f"✅ Skipping conclusion section in body: {section[:50]}...", file=sys.stderr)
+            # AGGRESSIVELY skip any conclusion (or stray subject) sections in body content
+            if kind in (CONCLUSION, SUBJECT):
+                log.debug("✅ Skipping %s section in body", kind)
                 continue
             
             # Check if this section contains bullet points
-            if '•' in section:
+            if kind == BULLETS:
                 # This is the bullet points section
                 lines = [line.strip() for line in section.split('\n') if line.strip()]
                 bullet_count = 0
@@ -1277,7 +1124,7 @@ def main():
                             text_run.font.size = Pt(11)
                             
                             bullet_count += 1
-                            print(f"Added bullet point {bullet_count}: {clean_bullet_text[:50]}...", file=sys.stderr)
+                            log.debug("Added bullet point %s (%s characters)", bullet_count, len(clean_bullet_text))
                     else:
                         # Regular text line (shouldn't happen in bullet section)
                         if line and not line.startswith('•'):
@@ -1285,9 +1132,9 @@ def main():
                             para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
                             run = para.add_run(clean_text_content(line))
                             run.font.size = Pt(11)
-                            print(f"Added regular line in bullet section: {line[:50]}...", file=sys.stderr)
+                            log.debug("Added regular line in bullet section: %s characters", len(line))
                 
-                print(f"✅ Added {bullet_count} bullet points", file=sys.stderr)
+                log.debug("✅ Added %s bullet points", bullet_count)
             else:
                 # This is the "Request for approval" paragraph
                 if section:
@@ -1301,25 +1148,25 @@ def main():
                     run = para.add_run(clean_section)
                     run.font.size = Pt(11)
                     
-                    print(f"Added request paragraph: {clean_section[:50]}...", file=sys.stderr)
+                    log.debug("Added request paragraph: %s characters", len(clean_section))
         
-        print("✅ Body content added successfully", file=sys.stderr)
+        log.debug("✅ Body content added successfully")
         
     except Exception as e:
-        print(f"❌ Error adding body content: {e}", file=sys.stderr)
+        log.error("❌ Error adding body content: %s", e)
         # Add fallback content
         fallback_para = doc.add_paragraph()
         fallback_para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
         fallback_run = fallback_para.add_run(f"Request for approval regarding {clean_text_content(summary)}. This proposal requires administrative approval.")
         fallback_run.font.size = Pt(11)
-        print("✅ Fallback content added", file=sys.stderr)
+        log.debug("✅ Fallback content added")
     
     # Add table data if provided
     if table_data and len(table_data) > 0:
-        print(f"Adding table data with {len(table_data)} rows", file=sys.stderr)
+        log.debug("Adding table data with %s rows", len(table_data))
         add_table_to_document(doc, table_data)
     else:
-        print("No table data to add", file=sys.stderr)
+        log.debug("No table data to add")
     
     # Add conclusion line after table based on NFA type
     try:
@@ -1333,9 +1180,9 @@ def main():
         conclusion_run = conclusion_para.add_run(clean_text_content(conclusion_text))
         conclusion_run.font.size = Pt(11)
         
-        print(f"✅ Conclusion added successfully for NFA type: {nfa_type}", file=sys.stderr)
+        log.debug("✅ Conclusion added successfully for NFA type: %s", nfa_type)
     except Exception as e:
-        print(f"❌ Error adding conclusion: {e}", file=sys.stderr)
+        log.error("❌ Error adding conclusion: %s", e)
         # Add fallback conclusion
         fallback_conclusion = doc.add_paragraph()
         fallback_conclusion.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
@@ -1343,10 +1190,10 @@ def main():
         fallback_run.font.size = Pt(11)
 
     # Add signature layout - ALWAYS add signatures
-    print("Getting signature layout", file=sys.stderr)
+    log.debug("Getting signature layout")
     signature_layout = get_signature_layout()
-    print(f"Signature layout retrieved: {signature_layout}", file=sys.stderr)
-    print("Adding signature layout to document", file=sys.stderr)
+    log.debug("Signature layout retrieved: %s roles", len(signature_layout or {}))
+    log.debug("Adding signature layout to document")
     
     # Force add signatures - try structured layout first, then fallback
     signatures_added = False
@@ -1354,14 +1201,14 @@ def main():
     try:
         if signature_layout and len(signature_layout) > 0:
             add_signature_layout(doc, signature_layout)
-            print("✅ Structured signature layout added successfully", file=sys.stderr)
+            log.debug("✅ Structured signature layout added successfully")
             signatures_added = True
         else:
-            print("⚠️ No signature layout data, using fallback", file=sys.stderr)
+            log.warning("⚠️ No signature layout data, using fallback")
             raise Exception("No signature data")
     except Exception as e:
-        print(f"❌ Error adding structured signature layout: {e}", file=sys.stderr)
-        print("Using fallback signature section", file=sys.stderr)
+        log.error("❌ Error adding structured signature layout: %s", e)
+        log.debug("Using fallback signature section")
     
     # If structured layout failed, add simple fallback with justified alignment
     if not signatures_added:
@@ -1413,47 +1260,53 @@ def main():
             for run in role2_para.runs:
                 run.font.size = Pt(10)
             
-            print("✅ Fallback signatures added successfully with justified alignment", file=sys.stderr)
+            log.debug("✅ Fallback signatures added successfully with justified alignment")
         except Exception as fallback_error:
-            print(f"❌ Even fallback signatures failed: {fallback_error}", file=sys.stderr)
+            log.error("❌ Even fallback signatures failed: %s", fallback_error)
 
     # Initialize nfa_text_content
     nfa_text_content = ""
     
     try:
         # Optimize document for single page limit
-        optimize_for_single_page(doc)
+        layout_plan = optimize_for_single_page(doc)
         
         # Validate document structure before saving
         if not validate_document_structure(doc):
-            print("❌ Document validation failed, attempting to fix...", file=sys.stderr)
+            log.error("❌ Document validation failed, attempting to fix...")
             # Try to fix common issues
             for para in doc.paragraphs:
                 for run in para.runs:
                     if run.text and '\x00' in run.text:
                         run.text = run.text.replace('\x00', '')
         
+        lap_stage("render_document")
+        
         # Save document with error handling
-        doc.save(filename)
-        print(f"Document saved successfully: {filename}", file=sys.stderr)
+        with timed_stage("save"):
+            atomic_save(doc, filename)
+        log.debug("Document saved successfully: %s", filename)
+        with timed_stage("index"):
+            index_letter(filename, "nfa", document_text(doc), subject=subject_line)
         
         # Verify file was created and is readable
         if os.path.exists(filename):
             file_size = os.path.getsize(filename)
-            print(f"File created successfully, size: {file_size} bytes", file=sys.stderr)
+            log.debug("File created successfully, size: %s bytes", file_size)
             if file_size == 0:
-                print("Warning: File is empty!", file=sys.stderr)
+                log.warning("Warning: File is empty!")
         else:
-            print("Error: File was not created!", file=sys.stderr)
+            log.error("Error: File was not created!")
             raise Exception("Document file was not created")
         
         # Extract text content for preview
-        nfa_text_content = extract_document_text(doc)
-        print(f"NFA text content extracted: {len(nfa_text_content)} characters", file=sys.stderr)
+        with timed_stage("extract_text"):
+            nfa_text_content = extract_document_text(doc)
+        log.debug("NFA text content extracted: %s characters", len(nfa_text_content))
         
     except Exception as e:
-        print(f"Error saving document: {e}", file=sys.stderr)
-        print(f"Document validation failed for file: {filename}", file=sys.stderr)
+        log.error("Error saving document: %s", e)
+        log.debug("Document validation failed for file: %s", filename)
         raise
 
     # Print relative path and text content for Node.js
@@ -1464,7 +1317,10 @@ def main():
         "success": True,
         "file_path": relative_path,
         "nfa_text": nfa_text_content,
-        "file_name": os.path.basename(filename)
+        "file_name": os.path.basename(filename),
+        "layout": layout_plan,
+        "prompt_profile": prompt_profile,
+        "timings": timer.as_dict()
     }
     print(json.dumps(result))
 
@@ -1477,6 +1333,7 @@ if __name__ == "__main__":
             "error": str(e),
             "error_type": type(e).__name__
         }
+        log.error("Script failed: %s", e)
+        dump_log_buffer("script failed")
         print(json.dumps(error_result))
-        print(f"Script failed: {e}", file=sys.stderr)
         sys.exit(1)
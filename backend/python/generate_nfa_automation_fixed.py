@@ -1,84 +1,47 @@
 import sys
 import os
-import re
 import json
-from openai import OpenAI
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from dotenv import load_dotenv
 from datetime import datetime
+from letter_common import (
+    backend_dir, get_openai_client,
+    resolve_output_directory, get_base_document,
+    start_timer, timed_stage, load_request_from_argv, check_table_rows,
+    get_logger, set_log_request_id, reset_log_buffer, dump_log_buffer
+)
+from letter_storage import (
+    PERSIST_SYNC, PERSIST_NONE, letter_path, url_path, safe_name_part,
+    resolve_persist_mode, deliver_document, deliver_bytes, document_fields
+)
+from nfa_signatures import DEFAULT_SIGNATURE_LAYOUT, add_cached_signature_block, add_signature_image, signature_images_version
+from nfa_sections import CONCLUSION, CLOSING_RE, split_sections, classify_sections, last_of_kind
+from nfa_layout import fit_to_single_page, words_to_cut, shorten_enabled
+from nfa_prompts import COMPACT, resolve_prompt_profile, compact_generate_messages
+from nfa_pdf import FORMAT_DOCX, FORMAT_PDF, FORMAT_BOTH, resolve_output_format
 
-# Debug Python version
-print(f"Python version: {sys.version}", file=sys.stderr)
-print(f"Python executable: {sys.executable}", file=sys.stderr)
+log = get_logger("nfa_fixed")
 
-# ==========================
-# Load API Key & Init OpenAI
-# ==========================
-try:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("Warning: OPENAI_API_KEY not found", file=sys.stderr)
-    else:
-        print("OPENAI_API_KEY loaded successfully", file=sys.stderr)
-    client = OpenAI(api_key=api_key) if api_key else None
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}", file=sys.stderr)
-    client = None
+# 2x2 signature grid: who signs every NFA
+SIGNATURE_LAYOUT = DEFAULT_SIGNATURE_LAYOUT
 
-# ==========================
-# Paths
-# ==========================
-script_dir = os.path.dirname(os.path.abspath(__file__))
-backend_dir = os.path.dirname(script_dir)
-uploads_dir = os.path.join(backend_dir, "uploads")
-
-# Fix header image path - look in multiple locations
-header_image_path = None
-possible_header_paths = [
-    os.path.join(uploads_dir, "header.png"),
-    os.path.join(backend_dir, "assets", "header.png"),
-    os.path.join(backend_dir, "header.png"),
-    os.path.join(script_dir, "header.png"),
-    os.path.join(backend_dir, "..", "public", "header.png")  # Add public directory
-]
-
-for path in possible_header_paths:
-    if os.path.exists(path):
-        header_image_path = path
-        print(f"✅ Found header image at: {path}", file=sys.stderr)
-        break
-
-if not header_image_path:
-    print("⚠️ Header image not found in any expected location", file=sys.stderr)
-    print(f"Searched paths: {possible_header_paths}", file=sys.stderr)
-
-signatures_dir = os.path.join(uploads_dir, "signatures")
-
-# Output directory - FIXED to match server static file serving
-env_output_dir = os.getenv("OUTPUT_DIR")
-if env_output_dir:
-    if env_output_dir.startswith("./backend/"):
-        env_output_dir = env_output_dir.replace("./backend/", "./")
-    base_output_directory = os.path.abspath(os.path.join(backend_dir, env_output_dir.lstrip("./")))
-else:
-    # FIXED: Create files directly in backend/generated_letters to match server static serving
-    base_output_directory = os.path.join(backend_dir, "generated_letters")
-
-output_directory = os.path.join(base_output_directory, "nfa")
-os.makedirs(output_directory, exist_ok=True)
-
-print(f"Final output directory: {output_directory}", file=sys.stderr)
+NFA_TYPES = ("advance", "reimbursement")
+
+# Heavy dependencies (openai, python-docx, dotenv) and filesystem side effects
+# are deferred to the code paths that need them so that --edit-mode and
+# --serve start-up stay cheap. See INSTALL.md for the import-time budget.
+
+def get_output_directory():
+    """Resolve (and create) the NFA output directory on first use"""
+    # FIXED to match server static file serving: files go directly in
+    # backend/generated_letters unless OUTPUT_DIR is set
+    output_directory = resolve_output_directory("nfa", os.path.join(backend_dir, "generated_letters"))
+    log.debug("Final output directory: %s", output_directory)
+    return output_directory
 
 # ==========================
 # AI Helper
 # ==========================
-def generate_ai_nfa_from_summary(subject, summary, nfa_type="reimbursement", need_bullets=False, facts_only=False):
-    if not client:
-        return f"{subject}\n\nRequest for approval regarding {summary}. The above proposal is submitted for approval."
-
+def build_full_generate_messages(subject, summary, nfa_type, need_bullets):
+    """Chat messages for the full prompt profile (the long-form rules and style instructions)"""
     # Create ultra-concise prompt for single page following strict template
     prompt = f"""
 Create an EXCELLENT professional NFA document following this EXACT structure for SINGLE PAGE output:
@@ -138,18 +101,35 @@ CRITICAL REQUIREMENTS FOR EXCELLENT CONTENT:
 Generate ULTRA-CONCISE, EXCELLENT, specific content based ONLY on the user's summary. No generic content. Single page limit is MANDATORY. Make it EXCELLENT.
 """
 
+    return [
+        {"role": "system", "content": "You are an EXCELLENT professional NFA writer who creates very concise, single-page documents with PERFECT structure. Always generate EXCELLENT, specific content based ONLY on user inputs with VERY SHORT starting paragraphs (maximum 3 sentences total). For bullet points, extract specific details from the summary like names, dates, locations, objectives, participants, or unique aspects of the request. Make bullet points actionable and informative, not generic. Create well-structured content with very brief starting paragraphs, bullet points, and conclusions that perfectly align with the user's subject and summary. MAXIMUM conciseness required - KEEP STARTING PARAGRAPH TO MAXIMUM 3 SENTENCES TOTAL."},
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_ai_nfa_from_summary(subject, summary, nfa_type="reimbursement", need_bullets=False, facts_only=False, on_delta=None, prompt_profile=None):
+    """Generate NFA text with the AI; on_delta(text) receives streamed tokens when given"""
+    client = get_openai_client()
+    if not client:
+        return f"{subject}\n\nRequest for approval regarding {summary}. The above proposal is submitted for approval."
+
+    if resolve_prompt_profile(prompt_profile) == COMPACT:
+        messages = compact_generate_messages(subject, summary, nfa_type, need_bullets, subject_prefix=False)
+    else:
+        messages = build_full_generate_messages(subject, summary, nfa_type, need_bullets)
+
     try:
-        response = client.chat.completions.create(
+        from llm_cache import cached_chat_completion
+        completion = cached_chat_completion(
+            client,
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an EXCELLENT professional NFA writer who creates very concise, single-page documents with PERFECT structure. Always generate EXCELLENT, specific content based ONLY on user inputs with VERY SHORT starting paragraphs (maximum 3 sentences total). For bullet points, extract specific details from the summary like names, dates, locations, objectives, participants, or unique aspects of the request. Make bullet points actionable and informative, not generic. Create well-structured content with very brief starting paragraphs, bullet points, and conclusions that perfectly align with the user's subject and summary. MAXIMUM conciseness required - KEEP STARTING PARAGRAPH TO MAXIMUM 3 SENTENCES TOTAL."},
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             max_tokens=150,  # Increased slightly for better bullet point generation
-            temperature=0.1  # Lower for consistency and conciseness
+            temperature=0.1,  # Lower for consistency and conciseness
+            on_delta=on_delta,
+            label="generate"
         )
         
-        ai_content = response.choices[0].message.content.strip()
+        ai_content = completion["content"].strip()
         
         # Ensure proper formatting
         lines = ai_content.split('\n')
@@ -172,12 +152,12 @@ Generate ULTRA-CONCISE, EXCELLENT, specific content based ONLY on the user's sum
         # Add the conclusion at the end
         final_content = f"{formatted_content}\n\n{conclusion}"
         
-        print(f"✅ AI generated content following strict template: {final_content[:200]}...", file=sys.stderr)
+        log.debug("✅ AI generated content following strict template: %s characters", len(final_content))
         
         return final_content
         
     except Exception as e:
-        print(f"⚠️ AI Error: {e}", file=sys.stderr)
+        log.warning("⚠️ AI Error: %s", e)
         # Create ultra-concise fallback content following strict template
         if need_bullets:
             fallback_content = f"""{subject}
@@ -222,81 +202,89 @@ def clean_text_content(text):
         return cleaned
         
     except Exception as e:
-        print(f"Error cleaning text content: {e}", file=sys.stderr)
+        log.error("Error cleaning text content: %s", e)
         return text
 
+def build_nfa_base_template(header_image_path):
+    """Build the fixed NFA skeleton (margins, header image, date, title, named styles) once per process"""
+    from docx import Document
+    from docx.shared import Inches, Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+    doc = Document()
+    
+    # Set page margins - optimized for single page
+    for section in doc.sections:
+        section.top_margin = Inches(0.5)
+        section.bottom_margin = Inches(0.5)
+        section.left_margin = Inches(0.75)
+        section.right_margin = Inches(0.75)
+    
+    # Body text style: Arial 11pt justified (EXACTLY as in reference). Set on
+    # Normal so body paragraphs need no per-run formatting or style lookups;
+    # date, title, table and signature paragraphs set their own alignment.
+    body_style = doc.styles['Normal']
+    body_style.font.name = 'Arial'
+    body_style.font.size = Pt(11)
+    body_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+    
+    # Add header image if it exists - CRITICAL for proper document structure
+    if header_image_path and os.path.exists(header_image_path):
+        try:
+            page_width = Inches(8.5) - Inches(0.75) - Inches(0.75)
+            doc.add_picture(header_image_path, width=page_width)
+            log.debug("✅ Header image added: %s", header_image_path)
+            
+            # Add spacing after header
+            doc.add_paragraph()
+            doc.add_paragraph()
+        except Exception as e:
+            log.warning("⚠️ Could not add header image: %s", e)
+    else:
+        log.warning("⚠️ Header image not found, creating document without header")
+    
+    # Add date - right aligned (as shown in the image)
+    date_para = doc.add_paragraph()
+    date_run = date_para.add_run(f"Date: {datetime.now().strftime('%d-%m-%Y')}")
+    date_para.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+    date_run.font.size = Pt(11)
+    date_run.font.name = 'Arial'
+    
+    # Add empty line
+    doc.add_paragraph()
+    
+    # Add title - centered (EXACTLY as in reference)
+    title_para = doc.add_paragraph()
+    title_run = title_para.add_run("Note For Approval (NFA)")
+    title_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    title_run.bold = True
+    title_run.font.size = Pt(12)
+    title_run.font.name = 'Arial'
+    
+    # Add empty line
+    doc.add_paragraph()
+    
+    return doc
+
 def create_proper_nfa_document(subject_line, body_text, closing_line, table_data, nfa_type):
     """Create a properly structured NFA document that matches the reference image exactly"""
     try:
-        print("📝 Creating properly structured NFA document...", file=sys.stderr)
-        
-        # Create new document
-        doc = Document()
-        
-        # Set page margins - optimized for single page
-        for section in doc.sections:
-            section.top_margin = Inches(0.5)
-            section.bottom_margin = Inches(0.5)
-            section.left_margin = Inches(0.75)
-            section.right_margin = Inches(0.75)
-        
-        # Add header image if it exists - CRITICAL for proper document structure
-        if header_image_path and os.path.exists(header_image_path):
-            try:
-                page_width = Inches(8.5) - Inches(0.75) - Inches(0.75)
-                doc.add_picture(header_image_path, width=page_width)
-                print(f"✅ Header image added: {header_image_path}", file=sys.stderr)
-                
-                # Add spacing after header
-                doc.add_paragraph()
-                doc.add_paragraph()
-            except Exception as e:
-                print(f"⚠️ Could not add header image: {e}", file=sys.stderr)
-        else:
-            print("⚠️ Header image not found, creating document without header", file=sys.stderr)
-        
-        # Add date - right aligned (as shown in the image)
-        date_para = doc.add_paragraph()
-        date_run = date_para.add_run(f"Date: {datetime.now().strftime('%d-%m-%Y')}")
-        date_para.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-        date_run.font.size = Pt(11)
-        date_run.font.name = 'Arial'
-        
-        # Add empty line
-        doc.add_paragraph()
-        
-        # Add title - centered (EXACTLY as in reference)
-        title_para = doc.add_paragraph()
-        title_run = title_para.add_run("Note For Approval (NFA)")
-        title_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        title_run.bold = True
-        title_run.font.size = Pt(12)
-        title_run.font.name = 'Arial'
+        log.debug("📝 Creating properly structured NFA document...")
         
-        # Add empty line
-        doc.add_paragraph()
+        # Clone the cached skeleton (margins, header image, date, title, styles)
+        doc = get_base_document("nfa_fixed", build_nfa_base_template)
         
         # Add subject - justified (EXACTLY as in reference)
         subject_para = doc.add_paragraph()
-        subject_label = subject_para.add_run("Subject: ")
-        subject_label.bold = True
-        subject_label.font.size = Pt(11)
-        subject_label.font.name = 'Arial'
-        
-        subject_text = subject_para.add_run(clean_text_content(subject_line))
-        subject_text.font.size = Pt(11)
-        subject_text.font.name = 'Arial'
-        
-        subject_para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+        subject_para.add_run("Subject: ").bold = True
+        subject_para.add_run(clean_text_content(subject_line))
         
         # Add empty line
         doc.add_paragraph()
         
         # Add body content - process each section (EXACTLY as in reference)
         if body_text:
-            sections = [section.strip() for section in body_text.split('\n\n') if section.strip()]
-            
-            for section in sections:
+            for section in split_sections(body_text):
                 if '•' in section:
                     # This is bullet points section
                     lines = [line.strip() for line in section.split('\n') if line.strip()]
@@ -304,19 +292,11 @@ def create_proper_nfa_document(subject_line, body_text, closing_line, table_data
                         if line.startswith('•'):
                             bullet_text = line[1:].strip()
                             if bullet_text:
-                                bullet_para = doc.add_paragraph()
-                                bullet_run = bullet_para.add_run(f"• {clean_text_content(bullet_text)}")
-                                bullet_para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                                bullet_run.font.size = Pt(11)
-                                bullet_run.font.name = 'Arial'
+                                doc.add_paragraph(f"• {clean_text_content(bullet_text)}")
                 else:
                     # Regular paragraph
                     if section:
-                        para = doc.add_paragraph()
-                        run = para.add_run(clean_text_content(section))
-                        para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                        run.font.size = Pt(11)
-                        run.font.name = 'Arial'
+                        doc.add_paragraph(clean_text_content(section))
         
         # Add empty line
         doc.add_paragraph()
@@ -327,20 +307,9 @@ def create_proper_nfa_document(subject_line, body_text, closing_line, table_data
             
             # Add empty line after table
             doc.add_paragraph()
-            
-            # Add conclusion after table - justified (EXACTLY as in reference)
-            conclusion_para = doc.add_paragraph()
-            conclusion_run = conclusion_para.add_run(clean_text_content(closing_line))
-            conclusion_para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            conclusion_run.font.size = Pt(11)
-            conclusion_run.font.name = 'Arial'
-        else:
-            # No table - add conclusion directly after body content
-            conclusion_para = doc.add_paragraph()
-            conclusion_run = conclusion_para.add_run(clean_text_content(closing_line))
-            conclusion_para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            conclusion_run.font.size = Pt(11)
-            conclusion_run.font.name = 'Arial'
+        
+        # Add conclusion (after the table when there is one) - justified (EXACTLY as in reference)
+        doc.add_paragraph(clean_text_content(closing_line))
         
         # Add empty line before signatures
         doc.add_paragraph()
@@ -348,74 +317,49 @@ def create_proper_nfa_document(subject_line, body_text, closing_line, table_data
         # Add signature layout (EXACTLY as in reference - 2x2 grid)
         add_proper_signature_layout(doc)
         
-        print("✅ Properly structured NFA document created", file=sys.stderr)
+        log.debug("✅ Properly structured NFA document created")
         return doc
         
     except Exception as e:
-        print(f"❌ Error creating proper NFA document: {e}", file=sys.stderr)
+        log.error("❌ Error creating proper NFA document: %s", e)
         raise e
 
 def add_proper_table_to_document(doc, table_data):
     """Add table data to document with proper formatting matching reference image"""
+    from nfa_tables import add_bulk_table
+
     try:
-        print(f"add_proper_table_to_document called with: {table_data}", file=sys.stderr)
+        log.debug("add_proper_table_to_document called with %s rows", len(table_data or []))
         if not table_data or len(table_data) == 0:
-            print("No table data to add", file=sys.stderr)
+            log.debug("No table data to add")
+            return
+        
+        # Bordered, centered Arial table built in one pass (EXACTLY as in reference):
+        # bold 11pt header (repeated on every page) and total row, 10pt body rows
+        table = add_bulk_table(doc, table_data, font_name='Arial', bold_last_row=True)
+        if table is None:
             return
         
-        print(f"Adding table with {len(table_data)} rows", file=sys.stderr)
-        
-        # Create table
-        table = doc.add_table(rows=len(table_data), cols=len(table_data[0]) if table_data else 0)
-        
-        # Apply styling with borders (EXACTLY as in reference)
-        table.style = 'Table Grid'
-        table.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        
-        print(f"Created table with {len(table.rows)} rows and {len(table.columns)} columns", file=sys.stderr)
-        
-        # Add data to table
-        for row_idx, row_data in enumerate(table_data):
-            print(f"Adding row {row_idx}: {row_data}", file=sys.stderr)
-            if row_idx < len(table.rows):
-                for col_idx, cell_data in enumerate(row_data):
-                    if col_idx < len(table.rows[row_idx].cells):
-                        # Clean and validate cell data
-                        clean_data = str(cell_data).strip() if cell_data is not None else ""
-                        clean_data = clean_data.replace('\x00', '').replace('\r', '').replace('\n', ' ')
-                        
-                        # Get the cell and its paragraph
-                        cell = table.rows[row_idx].cells[col_idx]
-                        cell.text = clean_data
-                        
-                        # Format cell content (EXACTLY as in reference)
-                        for paragraph in cell.paragraphs:
-                            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-                            
-                            # Format runs in the paragraph
-                            for run in paragraph.runs:
-                                run.font.size = Pt(10)
-                                run.font.name = 'Arial'
-                                if row_idx == 0:  # Header row - bold
-                                    run.bold = True
-                                    run.font.size = Pt(11)
-                                elif row_idx == len(table_data) - 1:  # Total row - bold
-                                    run.bold = True
-                                    run.font.size = Pt(11)
-        
-        print(f"✅ Proper table added to document with {len(table_data)} rows", file=sys.stderr)
+        log.debug("✅ Proper table added to document with %s rows", len(table_data))
         
     except Exception as e:
-        print(f"Error adding proper table to document: {e}", file=sys.stderr)
+        log.error("Error adding proper table to document: %s", e)
 
 def add_table_to_document(doc, table_data):
     """Legacy function - redirects to proper table function"""
     add_proper_table_to_document(doc, table_data)
 
 def add_proper_signature_layout(doc):
+    """Add the 2x2 signature grid (a cached copy after the first document)"""
+    add_cached_signature_block(doc, "nfa_fixed", SIGNATURE_LAYOUT, build_proper_signature_layout)
+
+def build_proper_signature_layout(doc, layout):
     """Add signature layout to document with proper 2x2 grid matching reference image exactly"""
+    from docx.shared import Inches, Pt
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
     try:
-        print("Starting to add proper signature layout", file=sys.stderr)
+        log.debug("Starting to add proper signature layout")
         
         # Add minimal space before signatures
         doc.add_paragraph()
@@ -429,7 +373,7 @@ def add_proper_signature_layout(doc):
             table.columns[1].width = Inches(1.6)   # Spacer column
             table.columns[2].width = Inches(2.2)  # Right signature
         except Exception as e:
-            print(f"Warning: Could not set column widths: {e}", file=sys.stderr)
+            log.warning("Warning: Could not set column widths: %s", e)
         
         # Top row - signature lines
         top_left_cell = table.cell(0, 0)
@@ -442,15 +386,15 @@ def add_proper_signature_layout(doc):
         name_left_cell = table.cell(1, 0)
         name_right_cell = table.cell(1, 2)
         
-        name_left_cell.text = "Dr Phani Kumar Pullela"
-        name_right_cell.text = "Mr Chandrasekhar KN"
+        name_left_cell.text = layout["top_left"]["name"]
+        name_right_cell.text = layout["top_right"]["name"]
         
         # Third row - designations
         desig_left_cell = table.cell(2, 0)
         desig_right_cell = table.cell(2, 2)
         
-        desig_left_cell.text = "Dean, Student Affairs"
-        desig_right_cell.text = "Head Finance"
+        desig_left_cell.text = layout["top_left"]["designation"]
+        desig_right_cell.text = layout["top_right"]["designation"]
         
         
         # Apply formatting to all cells (EXACTLY as in reference)
@@ -462,7 +406,11 @@ def add_proper_signature_layout(doc):
                     run.font.size = Pt(10)
                     run.font.name = 'Arial'
         
-        print("First signature table created successfully", file=sys.stderr)
+        # Scanned signatures above the lines (when uploaded)
+        add_signature_image(top_left_cell, layout["top_left"])
+        add_signature_image(top_right_cell, layout["top_right"])
+        
+        log.debug("First signature table created successfully")
         
         # Add proper vertical spacing between signature blocks
         doc.add_paragraph()
@@ -486,15 +434,15 @@ def add_proper_signature_layout(doc):
         name_left_cell2 = table2.cell(1, 0)
         name_right_cell2 = table2.cell(1, 2)
         
-        name_left_cell2.text = "Dr Sahana D Gowda"
-        name_right_cell2.text = "Prof (Dr) Dwarika Prasad Uniyal"
+        name_left_cell2.text = layout["bottom_left"]["name"]
+        name_right_cell2.text = layout["bottom_right"]["name"]
         
         # Third row - designations
         desig_left_cell2 = table2.cell(2, 0)
         desig_right_cell2 = table2.cell(2, 2)
         
-        desig_left_cell2.text = "Registrar - RV University"
-        desig_right_cell2.text = "Vice Chancellor (i/c)"
+        desig_left_cell2.text = layout["bottom_left"]["designation"]
+        desig_right_cell2.text = layout["bottom_right"]["designation"]
         
         # Apply formatting to all cells (EXACTLY as in reference)
         for cell in [top_left_cell2, top_right_cell2, name_left_cell2, name_right_cell2, 
@@ -505,10 +453,13 @@ def add_proper_signature_layout(doc):
                     run.font.size = Pt(10)
                     run.font.name = 'Arial'
         
-        print("✅ Both proper signature tables created successfully", file=sys.stderr)
+        add_signature_image(top_left_cell2, layout["bottom_left"])
+        add_signature_image(top_right_cell2, layout["bottom_right"])
+        
+        log.debug("✅ Both proper signature tables created successfully")
         
     except Exception as e:
-        print(f"❌ Error adding proper signature layout: {e}", file=sys.stderr)
+        log.error("❌ Error adding proper signature layout: %s", e)
         raise e
 
 def add_signature_layout(doc):
@@ -516,23 +467,22 @@ def add_signature_layout(doc):
     add_proper_signature_layout(doc)
 
 def parse_table_data(table_data_json):
-    """Parse table data from JSON string"""
+    """Parse table data from JSON string (logs sizes only, never the payload)"""
     try:
-        import json
-        print(f"Raw table data JSON: {table_data_json}", file=sys.stderr)
         table_data = json.loads(table_data_json)
-        print(f"Parsed table data: {table_data}", file=sys.stderr)
-        if isinstance(table_data, list) and len(table_data) > 0:
-            print(f"Table data is valid list with {len(table_data)} rows", file=sys.stderr)
-            return table_data
-        print("Table data is empty or not a list", file=sys.stderr)
-        return []
     except Exception as e:
-        print(f"Error parsing table data: {e}", file=sys.stderr)
+        log.error("Error parsing table data (%s bytes): %s", len(table_data_json or ''), e)
         return []
+    if isinstance(table_data, list) and len(table_data) > 0:
+        log.debug("Table data is valid list with %s rows (%s bytes)", len(table_data), len(table_data_json))
+        return check_table_rows(table_data)
+    log.debug("Table data is empty or not a list")
+    return []
 
 def extract_document_text(doc):
     """Extract text content from document for preview"""
+    from nfa_tables import iter_row_texts
+
     try:
         text_content = []
         
@@ -560,11 +510,8 @@ def extract_document_text(doc):
             text_content.append("Financial/Resource Implications Table:")
             text_content.append("")  # Add spacing before table content
             
-            for row_idx, row in enumerate(table.rows):
-                row_text = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_text.append(cell.text.strip())
+            for row_idx, cell_texts in enumerate(iter_row_texts(table)):
+                row_text = [text.strip() for text in cell_texts if text.strip()]
                 if row_text:
                     # Format table rows with proper spacing and borders
                     if row_idx == 0:  # Header row
@@ -580,17 +527,28 @@ def extract_document_text(doc):
         return "\n".join(text_content)
         
     except Exception as e:
-        print(f"Error extracting document text: {e}", file=sys.stderr)
+        log.error("Error extracting document text: %s", e)
         return "Error extracting document content"
 
 # ==========================
 # AI Edit Function
 # ==========================
-def process_ai_edit(original_text, edit_prompt):
-    """Process AI edit request on existing NFA content"""
+def process_ai_edit(original_text, edit_prompt, on_delta=None):
+    """Process AI edit request on existing NFA content; on_delta(text) receives streamed tokens when given"""
+    client = get_openai_client()
     if not client:
         return f"{original_text}\n\n[AI Edit Applied: {edit_prompt}]"
     
+    # Small edits ("change the venue in bullet 2") only send the targeted lines
+    try:
+        from nfa_edits import section_edit
+        edited_content = section_edit(client, original_text, edit_prompt, on_delta=on_delta)
+        if edited_content is not None:
+            log.debug("✅ Section edit completed (prompt: %s characters)", len(edit_prompt))
+            return edited_content
+    except Exception as e:
+        log.warning("⚠️ Section edit failed, editing the whole document: %s", e)
+    
     try:
         # Create AI prompt for editing
         prompt = f"""
@@ -626,259 +584,462 @@ IMPORTANT: Only modify what the user specifically requested. Keep everything els
 Return the complete modified NFA document with the requested changes applied.
 """
 
-        response = client.chat.completions.create(
+        from llm_cache import cached_chat_completion
+        completion = cached_chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an EXCELLENT professional NFA editor who applies specific modifications to existing documents while maintaining their PERFECT structure and format. Always keep changes minimal and preserve single page format. Create EXCELLENT, well-structured content that perfectly aligns with the user's subject and summary. ULTRA-CONCISE editing with EXCELLENCE required."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=200,  # Reduced for single page edits
-            temperature=0.1  # Lower for consistency and conciseness
+            temperature=0.1,  # Lower for consistency and conciseness
+            on_delta=on_delta,
+            label="edit"
         )
         
-        edited_content = response.choices[0].message.content.strip()
+        edited_content = completion["content"].strip()
         
-        print(f"✅ AI edit completed: {edit_prompt}", file=sys.stderr)
-        print(f"✅ Edited content length: {len(edited_content)} characters", file=sys.stderr)
+        log.debug("✅ AI edit completed (prompt: %s characters)", len(edit_prompt))
+        log.debug("✅ Edited content length: %s characters", len(edited_content))
         
         return edited_content
         
     except Exception as e:
-        print(f"⚠️ AI Edit Error: {e}", file=sys.stderr)
+        log.warning("⚠️ AI Edit Error: %s", e)
         # Return original text with edit note
         return f"{original_text}\n\n[AI Edit Applied: {edit_prompt}]"
 
+def shorten_nfa_body(body_text, max_words):
+    """Ask the AI to trim the NFA body to max_words so the document fits on one page (returns body_text on failure)"""
+    client = get_openai_client()
+    if not client:
+        return body_text
+    
+    try:
+        prompt = f"""
+Shorten the body of this NFA (Note For Approval) to at most {max_words} words so it fits on a single page.
+
+BODY:
+{body_text}
+
+RULES:
+1. Keep every fact, figure, date and name
+2. Keep the opening "Request for approval regarding" sentence
+3. Keep bullet points (if present) as lines starting with the • symbol, one per line
+4. Do not add a subject line, conclusion or signatures
+
+Return only the shortened body.
+"""
+
+        from llm_cache import cached_chat_completion
+        completion = cached_chat_completion(
+            client,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a professional NFA editor who shortens approval notes without losing any facts."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=min(400, max_words * 2 + 20),
+            temperature=0.1,
+            label="shorten"
+        )
+        
+        # Drop any closing line the model added; the conclusion is placed after the table
+        shortened = "\n\n".join(section for section in split_sections(completion["content"])
+                                 if not CLOSING_RE.search(section))
+        if not shortened or len(shortened.split()) >= len(body_text.split()):
+            log.warning("⚠️ Shortened body was not shorter, keeping the original")
+            return body_text
+        
+        log.debug("✅ Body shortened from %s to %s words", len(body_text.split()), len(shortened.split()))
+        return shortened
+        
+    except Exception as e:
+        log.warning("⚠️ AI Shorten Error: %s", e)
+        return body_text
+
+# ==========================
+# Section Parsing
+# ==========================
+def split_nfa_sections(nfa_text, default_subject):
+    """Split NFA text on blank lines into (subject_line, body_sections, closing_line)"""
+    # One classification pass with the closing-line matcher
+    classified = classify_sections(nfa_text, matcher=CLOSING_RE)
+    
+    log.debug("Parsed sections: %s", len(classified))
+    for i, (kind, section) in enumerate(classified):
+        log.debug("Section %s (%s): %s characters", i, kind, len(section))
+    
+    # Extract subject (first section)
+    subject_line = classified[0][1] if classified else default_subject
+    if subject_line.lower().startswith("subject:"):
+        subject_line = subject_line.split(":", 1)[1].strip()
+    
+    # Extract conclusion (last closing section)
+    closing_line = last_of_kind(classified, CONCLUSION) or "The above proposal is submitted for approval."
+    
+    # Extract body content (everything between subject and conclusion)
+    body_sections = [section for _, section in classified[1:] if section != closing_line]
+    
+    return subject_line, body_sections, closing_line
+
+# ==========================
+# PDF Output
+# ==========================
+def pdf_path_for(docx_path):
+    """The PDF of a letter sits next to its docx under the same name"""
+    return os.path.splitext(docx_path)[0] + ".pdf"
+
+def pdf_inline(inline):
+    """Inline mode for the PDF of a "both" result: base64 only, raw bytes are for the single document"""
+    return inline if inline != "bytes" else False
+
+def deliver_pdf(subject_line, body_text, closing_line, table_data, pdf_path, persist=PERSIST_SYNC, inline=False,
+                on_saved=None):
+    """Render the NFA content as PDF and persist/return it like deliver_document (plus pdf_layout)"""
+    from nfa_pdf import render_nfa_pdf
+
+    with timed_stage("render_pdf"):
+        data, pdf_layout = render_nfa_pdf(subject_line, body_text, closing_line, table_data, SIGNATURE_LAYOUT)
+    with timed_stage("save_pdf"):
+        delivery = deliver_bytes(data, pdf_path, persist, inline, on_saved)
+    delivery["pdf_layout"] = pdf_layout
+    return delivery
+
+def companion_pdf_fields(pdf_name, delivery):
+    """Result fields for the PDF written next to the docx (format "both")"""
+    fields = {"pdf_name": pdf_name, "pdf_size": delivery["document_size"], "pdf_layout": delivery["pdf_layout"]}
+    if "document_base64" in delivery:
+        fields["pdf_base64"] = delivery["document_base64"]
+    return fields
+
 # ==========================
 # Generate DOCX from Edited Text
 # ==========================
-def generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data=None):
-    """Generate DOCX document from edited text content with original formatting"""
+def generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data=None,
+                            persist=PERSIST_SYNC, inline=False, output_format=FORMAT_DOCX):
+    """Generate DOCX document from edited text content with original formatting.
+
+    Returns the download result fields: filePath, fileName, reused (True when
+    an identical earlier download was returned without rendering) and the
+    deliver_document fields (persisted, document_size, document_base64).
+    output_format "pdf" returns the PDF in their place, "both" adds pdfPath.
+    """
+    from nfa_render_cache import render_key, lookup_render, store_render
+    from letter_index import index_letter, document_text, table_text
+
     try:
-        print(f"generate_docx_from_text called with subject: {subject}", file=sys.stderr)
+        log.debug("generate_docx_from_text called (subject: %s characters)", len(subject))
+        
+        # Identical downloads reuse the document already on disk (summary only matters for empty bodies)
+        with timed_stage("render_cache"):
+            signatures = [SIGNATURE_LAYOUT, signature_images_version(SIGNATURE_LAYOUT)]
+            cache_key = render_key(__file__, edited_text, subject, nfa_type, table_data, signatures,
+                                   extra=[summary, output_format])
+            # A "both" download is two files; only single-file downloads are reused
+            reused = lookup_render(cache_key) if output_format != FORMAT_BOTH else None
+        if reused:
+            log.debug("♻️ Reusing rendered document: %s", reused[1])
+            fields = {"filePath": reused[0], "fileName": reused[1], "format": output_format, "reused": True}
+            if inline:
+                with open(reused[2], "rb") as stream:
+                    fields.update(document_fields(stream.read(), PERSIST_SYNC, inline))
+            return fields
         
         # Create output directory if it doesn't exist - FIXED to match server static serving
         output_dir = os.path.join(os.path.dirname(__file__), "..", "generated_letters", "nfa")
         os.makedirs(output_dir, exist_ok=True)
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"edited_nfa_{timestamp}.docx"
-        filepath = os.path.join(output_dir, filename)
+        # Generate unique filename (sharded; two downloads in the same second no longer collide)
+        filepath = letter_path(output_dir, "edited_nfa")
+        filename = os.path.basename(filepath)
+        file_url = url_path(filepath, output_dir, "/generated_letters/nfa")
         
-        print(f"Creating document: {filepath}", file=sys.stderr)
+        log.debug("Creating document: %s", filepath)
         
         # Parse the edited text to extract components
-        sections = [section.strip() for section in edited_text.split('\n\n') if section.strip()]
-        
-        # Extract subject (first section)
-        subject_line = sections[0] if sections else subject
-        if subject_line.lower().startswith("subject:"):
-            subject_line = subject_line.split(":", 1)[1].strip()
-        
-        # Extract conclusion (last section that contains conclusion keywords)
-        closing_line = "The above proposal is submitted for approval."
-        for section in reversed(sections):
-            if any(keyword in section.lower() for keyword in ["proposal is submitted", "request your approval", "kindly be released", "kindly be reimbursed"]):
-                closing_line = section
-                break
-        
-        # Extract body content (everything between subject and conclusion)
-        body_sections = []
-        for i, section in enumerate(sections):
-            if i == 0:  # Skip subject
-                continue
-            if section == closing_line:  # Skip conclusion
-                continue
-            body_sections.append(section)
-        
+        with timed_stage("parse_sections"):
+            subject_line, body_sections, closing_line = split_nfa_sections(edited_text, subject)
         body_text = "\n\n".join(body_sections).strip()
         
         # If body is empty or malformed, create fallback
         if not body_text or len(body_sections) < 1:
-            print("⚠️ Body content is malformed, creating fallback", file=sys.stderr)
+            log.warning("⚠️ Body content is malformed, creating fallback")
             body_text = f"Request for approval regarding {summary}. This proposal requires administrative approval."
         
-        # Create properly structured document
-        doc = create_proper_nfa_document(subject_line, body_text, closing_line, table_data, nfa_type)
-        
-        # Save document
-        doc.save(filepath)
-        
-        print(f"✅ DOCX generated successfully: {filepath}", file=sys.stderr)
-        print(f"📁 Full file path: {filepath}", file=sys.stderr)
-        print(f"📄 File exists: {os.path.exists(filepath)}", file=sys.stderr)
-        print(f"📊 File size: {os.path.getsize(filepath) if os.path.exists(filepath) else 'N/A'} bytes", file=sys.stderr)
+        pdf_path = pdf_path_for(filepath)
+        pdf_name = os.path.basename(pdf_path)
+        pdf_url = url_path(pdf_path, output_dir, "/generated_letters/nfa")
+        if output_format == FORMAT_PDF:
+            # Straight from the text to the PDF; no docx is built at all
+            delivery = deliver_pdf(subject_line, body_text, closing_line, table_data, pdf_path, persist, inline,
+                                   on_saved=lambda path: store_render(cache_key, path, pdf_url, pdf_name))
+            if persist != PERSIST_NONE:
+                with timed_stage("index"):
+                    index_letter(pdf_path, "nfa", "\n".join([edited_text, table_text(table_data)]), subject=subject_line)
+            log.debug("✅ PDF generated (%s): %s, %s bytes", persist, pdf_path, delivery["document_size"])
+            return {
+                "filePath": pdf_url if persist != PERSIST_NONE else None,
+                "fileName": pdf_name,
+                "format": output_format,
+                "reused": False,
+                **delivery
+            }
         
-        return f"/generated_letters/nfa/{filename}", filename
+        # Create properly structured document
+        with timed_stage("render_document"):
+            doc = create_proper_nfa_document(subject_line, body_text, closing_line, table_data, nfa_type)
+        
+        # Fit on one page by layout only; edited text is the user's and is never shortened
+        with timed_stage("fit_layout"):
+            fit_to_single_page(doc)
+        
+        # Save document (or hand it back in memory); reusable once it is on disk
+        with timed_stage("save"):
+            delivery = deliver_document(doc, filepath, persist, inline,
+                                        on_saved=lambda path: store_render(cache_key, path, file_url, filename))
+        
+        log.debug("✅ DOCX generated (%s): %s, %s bytes", persist, filepath, delivery["document_size"])
+        if persist != PERSIST_NONE:
+            with timed_stage("index"):
+                index_letter(filepath, "nfa", document_text(doc), subject=subject_line)
+        
+        fields = {
+            "filePath": file_url if persist != PERSIST_NONE else None,
+            "fileName": filename,
+            "format": output_format,
+            "reused": False,
+            **delivery
+        }
+        if output_format == FORMAT_BOTH:
+            pdf_delivery = deliver_pdf(subject_line, body_text, closing_line, table_data, pdf_path, persist,
+                                       pdf_inline(inline))
+            fields["pdfPath"] = pdf_url if persist != PERSIST_NONE else None
+            fields.update(companion_pdf_fields(pdf_name, pdf_delivery))
+        return fields
         
     except Exception as e:
-        print(f"❌ Error generating DOCX: {e}", file=sys.stderr)
+        log.error("❌ Error generating DOCX: %s", e)
         raise e
 
 # ==========================
-# Main Function
+# Request Handlers
 # ==========================
-def main():
-    # Check if this is download mode
-    if len(sys.argv) > 1 and sys.argv[1] == "--download-mode":
-        if len(sys.argv) < 6:
-            print(json.dumps({
-                "success": False,
-                "error": "Download mode requires: --download-mode, editedText, subject, summary, nfaType"
-            }))
-            sys.exit(1)
-        
-        edited_text = sys.argv[2]
-        subject = sys.argv[3]
-        summary = sys.argv[4]
-        nfa_type = sys.argv[5]
-        table_data_json = sys.argv[6] if len(sys.argv) > 6 else "[]"
-        
-        # Parse table data
-        table_data = parse_table_data(table_data_json)
-        
-        # Generate DOCX from edited text
-        try:
-            file_path, file_name = generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data)
-            print(json.dumps({
-                "success": True,
-                "filePath": file_path,
-                "fileName": file_name,
-                "message": "Edited NFA document generated successfully"
-            }))
-        except Exception as e:
-            print(json.dumps({
-                "success": False,
-                "error": f"Failed to generate DOCX: {str(e)}"
-            }))
-        return
+def delta_emitter(emit):
+    """Adapt an event emitter to the on_delta(text) callback of the AI helpers"""
+    if not emit:
+        return None
+    return lambda text: emit({"event": "delta", "text": text})
+
+def ndjson_emitter(output_stream, request_id=None):
+    """Return emit(event) that writes each event as one JSON line and flushes"""
+    def emit(event):
+        if request_id is not None:
+            event["id"] = request_id
+        output_stream.write(json.dumps(event) + "\n")
+        output_stream.flush()
+    return emit
+
+def coerce_table_data(table_data):
+    """Accept table data either as a JSON string (argv) or an already-parsed list (serve mode)"""
+    if table_data is None:
+        return []
+    if isinstance(table_data, str):
+        return parse_table_data(table_data)
+    if isinstance(table_data, list):
+        return check_table_rows(table_data)
+    log.warning("Unsupported table data type: %s", type(table_data).__name__)
+    return []
+
+def handle_download_request(request):
+    """Build the edited NFA docx for a download request and return the JSON result"""
+    edited_text = request.get("editedText") or ""
+    subject = request.get("subject") or "NFA Request"
+    summary = request.get("summary") or "NFA Request Summary"
+    nfa_type = request.get("nfaType") or "reimbursement"
+    table_data = coerce_table_data(request.get("tableData"))
+    persist = resolve_persist_mode(request.get("persist"))
+    output_format = resolve_output_format(request.get("format"))
     
-    # Check if this is edit mode
-    if len(sys.argv) > 1 and sys.argv[1] == "--edit-mode":
-        if len(sys.argv) < 4:
-            print(json.dumps({
-                "success": False,
-                "error": "Edit mode requires: --edit-mode, text, prompt"
-            }))
-            sys.exit(1)
-        
-        original_text = sys.argv[2]
-        edit_prompt = sys.argv[3]
-        
-        # Process AI edit
-        edited_text = process_ai_edit(original_text, edit_prompt)
-        
-        print(json.dumps({
+    # Generate DOCX from edited text
+    try:
+        fields = generate_docx_from_text(edited_text, subject, summary, nfa_type, table_data,
+                                         persist=persist, inline=request.get("inline") or False,
+                                         output_format=output_format)
+        return {
             "success": True,
-            "editedText": edited_text,
-            "message": "NFA text edited successfully"
-        }))
-        return
+            **fields,
+            "message": "Edited NFA document generated successfully"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to generate DOCX: {str(e)}"
+        }
+
+def handle_edit_request(request, emit=None):
+    """Apply an AI edit to existing NFA text and return the JSON result.
+
+    With emit, token deltas are sent as {"event": "delta"} events while the
+    model is writing and the result also carries the parsed sections.
+    """
+    original_text = request.get("text") or ""
+    edit_prompt = request.get("prompt") or ""
     
-    # Arguments from Node.js for normal generation
-    if len(sys.argv) < 4:
-        print("Usage: generate_nfa_automation.py <subject> <summary> <nfa_type> [bullets] [table_data]", file=sys.stderr)
-        sys.exit(1)
+    # Process AI edit
+    edited_text = process_ai_edit(original_text, edit_prompt, on_delta=delta_emitter(emit))
+    
+    result = {
+        "success": True,
+        "editedText": edited_text,
+        "message": "NFA text edited successfully"
+    }
+    if emit:
+        with timed_stage("parse_sections"):
+            subject_line, body_sections, closing_line = split_nfa_sections(edited_text, "")
+        result["sections"] = {"subject": subject_line, "body": body_sections, "closing": closing_line}
+    return result
+
+def handle_generate_request(request, emit=None):
+    """Generate a new NFA document from subject/summary inputs and return the JSON result.
 
-    subject = sys.argv[1]
-    summary = sys.argv[2]
-    nfa_type = sys.argv[3].lower()
-    need_bullets = sys.argv[4].lower() in ("yes", "y", "true", "1") if len(sys.argv) > 4 else False
-    table_data_json = sys.argv[5] if len(sys.argv) > 5 else "[]"
+    With emit, token deltas are sent as {"event": "delta"} events before the
+    docx is written and the result also carries the parsed sections.
+    """
+    subject = str(request.get("subject") or "").strip()
+    summary = str(request.get("summary") or "").strip()
+    nfa_type = str(request.get("nfaType") or "reimbursement").lower()
+    if not subject or not summary:
+        return {"success": False, "error": "subject and summary are required"}
+    if nfa_type not in NFA_TYPES:
+        return {"success": False, "error": f"Unknown NFA type: {nfa_type} (expected {' or '.join(NFA_TYPES)})"}
+    need_bullets = request.get("needBullets", False)
+    if isinstance(need_bullets, str):
+        need_bullets = need_bullets.lower() in ("yes", "y", "true", "1")
+    need_bullets = bool(need_bullets)
+    prompt_profile = resolve_prompt_profile(request.get("promptProfile"))
+    persist = resolve_persist_mode(request.get("persist"))
+    inline = request.get("inline") or False
+    output_format = resolve_output_format(request.get("format"))
 
-    print(f"Inputs -> Subject: {subject}, Type: {nfa_type}, Bullets: {need_bullets}", file=sys.stderr)
+    log.debug("Inputs -> Subject: %s characters, Type: %s, Bullets: %s, Prompt: %s", len(subject), nfa_type, need_bullets, prompt_profile)
 
     # Parse table data
-    table_data = parse_table_data(table_data_json)
-    print(f"Table data parsed: {len(table_data)} rows", file=sys.stderr)
+    table_data = coerce_table_data(request.get("tableData"))
+    log.debug("Table data parsed: %s rows", len(table_data))
 
     # Generate NFA with structured format
-    nfa_text = generate_ai_nfa_from_summary(subject, summary, nfa_type, need_bullets=need_bullets, facts_only=False)
+    nfa_text = generate_ai_nfa_from_summary(subject, summary, nfa_type, need_bullets=need_bullets, facts_only=False,
+                                            on_delta=delta_emitter(emit), prompt_profile=prompt_profile)
+
+    result = render_generated_nfa(nfa_text, subject, summary, nfa_type, need_bullets, table_data, persist, inline,
+                                  output_format)
+    result["prompt_profile"] = prompt_profile
+    sections = result.pop("sections")
+    if emit:
+        result["sections"] = sections
+    return result
+
+def render_generated_nfa(nfa_text, subject, summary, nfa_type, need_bullets=False, table_data=None,
+                         persist=PERSIST_SYNC, inline=False, output_format=FORMAT_DOCX):
+    """Turn generated NFA text into the docx and its JSON result (also used by generate_nfa_batch).
+
+    The result carries the parsed "sections" (subject/body/closing); callers
+    drop them when they are not streaming. With output_format "pdf" the PDF
+    is saved instead of the docx and "both" adds it as pdf_path; the docx is
+    still laid out either way, so the one-page fit (and any shortening) and
+    the preview text are the same for every format.
+    """
+    from letter_index import index_letter, document_text
+
+    table_data = table_data or []
 
     # Parse AI output for structured format
-    print(f"Raw AI output: {nfa_text[:300]}...", file=sys.stderr)
-    
-    # Split by double newlines to get sections
-    sections = [section.strip() for section in nfa_text.split('\n\n') if section.strip()]
-    
-    print(f"Parsed sections: {len(sections)}", file=sys.stderr)
-    for i, section in enumerate(sections):
-        print(f"Section {i}: {section[:100]}...", file=sys.stderr)
-    
-    # Extract subject (first section)
-    subject_line = sections[0] if sections else subject
-    if subject_line.lower().startswith("subject:"):
-        subject_line = subject_line.split(":", 1)[1].strip()
-    
-    # Extract conclusion (last section that contains conclusion keywords)
-    closing_line = "The above proposal is submitted for approval."
-    for section in reversed(sections):
-        if any(keyword in section.lower() for keyword in ["proposal is submitted", "request your approval", "kindly be released", "kindly be reimbursed"]):
-            closing_line = section
-            break
-    
-    # Extract body content (everything between subject and conclusion)
-    body_sections = []
-    for i, section in enumerate(sections):
-        if i == 0:  # Skip subject
-            continue
-        if section == closing_line:  # Skip conclusion
-            continue
-        body_sections.append(section)
+    log.debug("Raw AI output: %s characters", len(nfa_text))
     
+    # Split into subject / body / conclusion sections
+    with timed_stage("parse_sections"):
+        subject_line, body_sections, closing_line = split_nfa_sections(nfa_text, subject)
     body_text = "\n\n".join(body_sections).strip()
     
     # If body is empty or malformed, create fallback
     if not body_text or len(body_sections) < 1:
-        print("⚠️ Body content is malformed, creating fallback", file=sys.stderr)
+        log.warning("⚠️ Body content is malformed, creating fallback")
         if need_bullets:
             body_text = f"Request for approval regarding {summary}. This proposal requires administrative approval.\n\n• Key requirements must be met for approval\n• Important details will be outlined\n• Financial details provided in table"
         else:
             body_text = f"Request for approval regarding {summary}. This proposal requires administrative approval."
     
-    print(f"✅ Structured content parsed - Subject: {subject_line}", file=sys.stderr)
-    print(f"✅ Body sections: {len(body_sections)}", file=sys.stderr)
-    print(f"✅ Closing line: {closing_line}", file=sys.stderr)
-    print(f"✅ Body text length: {len(body_text)} characters", file=sys.stderr)
+    log.debug("✅ Structured content parsed - Subject: %s characters", len(subject_line))
+    log.debug("✅ Body sections: %s", len(body_sections))
+    log.debug("✅ Closing line: %s characters", len(closing_line))
+    log.debug("✅ Body text length: %s characters", len(body_text))
 
     # Filename
-    sanitized_subject = re.sub(r'[\\/:*?"<>|]', '_', subject_line.replace(' ', '_')[:60])
-    filename = os.path.join(output_directory, f"NFA_{nfa_type}_{sanitized_subject}.docx")
+    # Unique, sharded file name so concurrent requests for one subject never overwrite each other
+    filename = letter_path(get_output_directory(), f"NFA_{nfa_type}_{safe_name_part(subject_line, 60)}")
 
-    print(f"Creating document: {filename}", file=sys.stderr)
+    log.debug("Creating document: %s", filename)
 
     # Create properly structured document using the new function
     try:
-        print("📝 Creating properly structured NFA document...", file=sys.stderr)
-        doc = create_proper_nfa_document(subject_line, body_text, closing_line, table_data, nfa_type)
-        print("✅ Properly structured document created successfully", file=sys.stderr)
+        log.debug("📝 Creating properly structured NFA document...")
+        with timed_stage("render_document"):
+            doc = create_proper_nfa_document(subject_line, body_text, closing_line, table_data, nfa_type)
+        log.debug("✅ Properly structured document created successfully")
+        
+        # Pick the least aggressive layout that fits one page; if even the tightest
+        # one overflows because of the body text, ask once for a shorter body
+        with timed_stage("fit_layout"):
+            layout_plan = fit_to_single_page(doc)
+        cut = words_to_cut(layout_plan, body_text) if shorten_enabled() else 0
+        if cut:
+            log.debug("Body overflows by %s lines, asking for %s fewer words", layout_plan["overflow_lines"], cut)
+            shortened = shorten_nfa_body(body_text, len(body_text.split()) - cut)
+            if shortened != body_text:
+                body_text = shortened
+                body_sections = split_sections(body_text)
+                with timed_stage("render_document"):
+                    doc = create_proper_nfa_document(subject_line, body_text, closing_line, table_data, nfa_type)
+                with timed_stage("fit_layout"):
+                    layout_plan = fit_to_single_page(doc)
+                layout_plan["shortened"] = True
+        if not layout_plan["fits"]:
+            log.warning("⚠️ Document still needs %s page(s) with the tightest layout", layout_plan["pages"])
     except Exception as e:
-        print(f"❌ Error creating properly structured document: {e}", file=sys.stderr)
+        log.error("❌ Error creating properly structured document: %s", e)
         raise
 
-    # Save the properly structured document
+    # Save the properly structured document (or hand it back in memory)
     try:
-        # Save document with error handling
-        doc.save(filename)
-        print(f"Document saved successfully: {filename}", file=sys.stderr)
-        
-        # Verify file was created and is readable
-        if os.path.exists(filename):
-            file_size = os.path.getsize(filename)
-            print(f"File created successfully, size: {file_size} bytes", file=sys.stderr)
-            if file_size == 0:
-                print("Warning: File is empty!", file=sys.stderr)
+        pdf_path = pdf_path_for(filename)
+        if output_format == FORMAT_PDF:
+            delivery = deliver_pdf(subject_line, body_text, closing_line, table_data, pdf_path, persist, inline)
+            filename = pdf_path
         else:
-            print("Error: File was not created!", file=sys.stderr)
-            raise Exception("Document file was not created")
+            with timed_stage("save"):
+                delivery = deliver_document(doc, filename, persist, inline)
+        if output_format == FORMAT_BOTH:
+            pdf_delivery = deliver_pdf(subject_line, body_text, closing_line, table_data, pdf_path, persist,
+                                       pdf_inline(inline))
+        log.debug("Document delivered (%s): %s, %s bytes", persist, filename, delivery["document_size"])
+        if not delivery["document_size"]:
+            log.warning("Warning: Document is empty!")
         
         # Extract text content for preview
-        nfa_text_content = extract_document_text(doc)
-        print(f"NFA text content extracted: {len(nfa_text_content)} characters", file=sys.stderr)
+        with timed_stage("extract_text"):
+            nfa_text_content = extract_document_text(doc)
+        log.debug("NFA text content extracted: %s characters", len(nfa_text_content))
+
+        # Searchable from now on (letter_index.py); unsaved letters have no file to find
+        if persist != PERSIST_NONE:
+            with timed_stage("index"):
+                index_letter(filename, "nfa", document_text(doc), subject=subject_line)
         
     except Exception as e:
-        print(f"Error saving document: {e}", file=sys.stderr)
-        print(f"Document validation failed for file: {filename}", file=sys.stderr)
+        log.error("Error saving document: %s", e)
+        log.debug("Document validation failed for file: %s", filename)
         raise
 
     # Print relative path and text content for Node.js
@@ -887,12 +1048,243 @@ def main():
     # Output structured JSON result
     result = {
         "success": True,
-        "file_path": relative_path,
+        "file_path": relative_path if persist != PERSIST_NONE else None,
         "nfa_text": nfa_text_content,
-        "file_name": os.path.basename(filename)
+        "file_name": os.path.basename(filename),
+        "format": output_format,
+        "layout": layout_plan,
+        **delivery,
+        "sections": {"subject": subject_line, "body": body_sections, "closing": closing_line},
     }
+    if output_format == FORMAT_BOTH:
+        result["pdf_path"] = os.path.relpath(pdf_path, backend_dir) if persist != PERSIST_NONE else None
+        result.update(companion_pdf_fields(os.path.basename(pdf_path), pdf_delivery))
+    return result
+
+REQUEST_HANDLERS = {
+    "generate": handle_generate_request,
+    "edit": handle_edit_request,
+    "download": handle_download_request,
+}
+
+# Modes whose handler accepts emit= for streamed token deltas
+STREAMING_MODES = {"generate", "edit"}
+
+# ==========================
+# Persistent Worker Mode
+# ==========================
+def handle_request(request, emit=None):
+    """Dispatch a single request dict to its handler, never raising.
+
+    emit is only passed to handlers in STREAMING_MODES; other modes ignore it.
+    The result carries per-stage "timings" for this request.
+    """
+    if not isinstance(request, dict):
+        return {"success": False, "error": "Request must be a JSON object"}
+
+    timer = start_timer()
+    reset_log_buffer()
+    set_log_request_id(request.get("id"))
+    mode = request.get("mode", "generate")
+    handler = REQUEST_HANDLERS.get(mode)
+    if not handler:
+        result = {
+            "success": False,
+            "error": f"Unknown mode: {mode}. Expected one of: {', '.join(REQUEST_HANDLERS)}"
+        }
+    else:
+        try:
+            if emit and mode in STREAMING_MODES:
+                result = handler(request, emit=emit)
+            else:
+                result = handler(request)
+        except Exception as e:
+            log.error("Request failed (%s): %s", mode, e)
+            result = {
+                "success": False,
+                "error": str(e),
+                "error_type": type(e).__name__
+            }
+
+    result["timings"] = timer.as_dict()
+    if not result.get("success"):
+        dump_log_buffer(f"{mode} request failed")
+    set_log_request_id(None)
+
+    # Echo the request id so the caller can match responses to requests
+    if "id" in request:
+        result["id"] = request["id"]
+    return result
+
+def print_result(result):
+    """Print a one-shot JSON result; a failed result first replays the buffered debug log"""
+    if not result.get("success"):
+        dump_log_buffer("request failed")
     print(json.dumps(result))
 
+def serve(input_stream=None, output_stream=None):
+    """Stay alive and answer one JSON request per line with one JSON result per line.
+
+    Each input line is an object with a "mode" of "generate", "edit" or "download"
+    and the same fields the backend sends for the matching argv mode
+    (subject, summary, nfaType, needBullets, tableData / text, prompt /
+    editedText, subject, summary, nfaType, tableData). An optional "id" is echoed
+    back. The worker exits cleanly when stdin is closed.
+
+    Requests with "stream": true (generate/edit) first get {"event": "delta"}
+    lines as tokens arrive, then the result line tagged "event": "result".
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+
+    log.debug("🔁 NFA worker ready, waiting for JSON requests on stdin")
+
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            result = {"success": False, "error": f"Invalid JSON request: {e}"}
+        else:
+            if isinstance(request, dict) and request.get("stream"):
+                emit = ndjson_emitter(output_stream, request.get("id"))
+                result = handle_request(request, emit=emit)
+                result["event"] = "result"
+            else:
+                result = handle_request(request)
+
+        output_stream.write(json.dumps(result) + "\n")
+        output_stream.flush()
+
+    log.debug("🔁 NFA worker input closed, exiting")
+
+# ==========================
+# Main Function
+# ==========================
+def main():
+    # Debug Python version
+    log.debug("Python version: %s", sys.version)
+    log.debug("Python executable: %s", sys.executable)
+
+    # --stream (generate / --edit-mode): NDJSON token deltas, then the result event
+    stream = "--stream" in sys.argv
+    if stream:
+        sys.argv.remove("--stream")
+    emit = ndjson_emitter(sys.stdout) if stream else None
+
+    # --inline (generate / --download-mode): the result also carries the docx as document_base64
+    inline = "--inline" in sys.argv
+    if inline:
+        sys.argv.remove("--inline")
+
+    # --format docx|pdf|both (generate / --download-mode): which files to write
+    output_format = None
+    if "--format" in sys.argv:
+        index = sys.argv.index("--format")
+        if index + 1 >= len(sys.argv):
+            raise ValueError("--format needs a value: docx, pdf or both")
+        output_format = sys.argv[index + 1]
+        del sys.argv[index:index + 2]
+
+    # Check if this is persistent worker mode
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve()
+        return
+
+    # One-shot modes time the whole process, including interpreter start-up
+    timer = start_timer(include_startup=True)
+
+    # --stdin / --request-file PATH: the whole request arrives as one JSON
+    # object ({"mode": "generate"|"edit"|"download", ...same fields as --serve})
+    request = load_request_from_argv(sys.argv)
+    if request is not None:
+        if inline:
+            request["inline"] = True
+        if output_format:
+            request["format"] = output_format
+        mode = request.get("mode", "generate")
+        handler = REQUEST_HANDLERS.get(mode)
+        if not handler:
+            raise ValueError(f"Unknown mode: {mode}. Expected one of: {', '.join(REQUEST_HANDLERS)}")
+        stream = stream or bool(request.get("stream"))
+        if stream and mode in STREAMING_MODES:
+            result = handler(request, emit=ndjson_emitter(sys.stdout))
+        else:
+            result = handler(request)
+        result["timings"] = timer.as_dict()
+        if stream:
+            result["event"] = "result"
+        print_result(result)
+        return
+
+    # Check if this is download mode
+    if len(sys.argv) > 1 and sys.argv[1] == "--download-mode":
+        if len(sys.argv) < 6:
+            print(json.dumps({
+                "success": False,
+                "error": "Download mode requires: --download-mode, editedText, subject, summary, nfaType"
+            }))
+            sys.exit(1)
+        
+        result = handle_download_request({
+            "editedText": sys.argv[2],
+            "subject": sys.argv[3],
+            "summary": sys.argv[4],
+            "nfaType": sys.argv[5],
+            "tableData": sys.argv[6] if len(sys.argv) > 6 else "[]",
+            "inline": inline,
+            "format": output_format
+        })
+        result["timings"] = timer.as_dict()
+        print_result(result)
+        return
+    
+    # Check if this is edit mode
+    if len(sys.argv) > 1 and sys.argv[1] == "--edit-mode":
+        if len(sys.argv) < 4:
+            print(json.dumps({
+                "success": False,
+                "error": "Edit mode requires: --edit-mode, text, prompt"
+            }))
+            sys.exit(1)
+        
+        result = handle_edit_request({
+            "text": sys.argv[2],
+            "prompt": sys.argv[3]
+        }, emit=emit)
+        result["timings"] = timer.as_dict()
+        if stream:
+            result["event"] = "result"
+        print_result(result)
+        return
+    
+    # Arguments from Node.js for normal generation
+    if len(sys.argv) < 4:
+        print("Usage: generate_nfa_automation.py <subject> <summary> <nfa_type> [bullets] [table_data]", file=sys.stderr)
+        print("       generate_nfa_automation_fixed.py --serve   (JSON-lines worker on stdin/stdout)", file=sys.stderr)
+        print("       add --stream to generate / --edit-mode for NDJSON token deltas", file=sys.stderr)
+        print("       add --inline to generate / --download-mode to get the docx bytes in the result", file=sys.stderr)
+        print("       add --format pdf|both to generate / --download-mode for a PDF instead of / next to the docx", file=sys.stderr)
+        print("       generate_nfa_automation_fixed.py --stdin | --request-file <path>   (JSON request)", file=sys.stderr)
+        sys.exit(1)
+
+    result = handle_generate_request({
+        "subject": sys.argv[1],
+        "summary": sys.argv[2],
+        "nfaType": sys.argv[3],
+        "needBullets": sys.argv[4] if len(sys.argv) > 4 else "no",
+        "tableData": sys.argv[5] if len(sys.argv) > 5 else "[]",
+        "inline": inline,
+        "format": output_format
+    }, emit=emit)
+    result["timings"] = timer.as_dict()
+    if stream:
+        result["event"] = "result"
+    print_result(result)
+
 if __name__ == "__main__":
     try:
         main()
@@ -902,6 +1294,7 @@ if __name__ == "__main__":
             "error": str(e),
             "error_type": type(e).__name__
         }
+        log.error("Script failed: %s", e)
+        dump_log_buffer("script failed")
         print(json.dumps(error_result))
-        print(f"Script failed: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,447 @@
+# backend/python/generate_nfa_batch.py
+"""Generate one NFA per event from a spreadsheet in one run.
+
+NFA texts are requested from the AI on a pool of threads (bounded by
+--concurrency) and every text is rendered as soon as it arrives, in a pool
+of worker processes (--workers, default one per CPU), so AI calls and
+python-docx rendering overlap. Every finished row is appended to a JSONL
+manifest; running the same command again after a crash or a partial
+failure skips the rows that already have a document and only redoes the
+rest.
+
+Usage:
+    python generate_nfa_batch.py events.csv
+    python generate_nfa_batch.py events.xlsx --concurrency 8 --workers 4
+    python generate_nfa_batch.py events.csv --manifest run1.jsonl --no-resume
+    python generate_nfa_batch.py events.csv --format both
+    cat events.json | python generate_nfa_batch.py -
+
+Input is a CSV, an XLSX (first sheet, needs openpyxl) or a JSON list. The
+columns subject, summary, type (advance/reimbursement) and bullets (yes/no)
+describe an event. Every other column is a line-item column: the event's
+row and the rows below it with an empty subject and summary become the
+rows of its table, with the column names as the header. JSON rows can give
+the table directly as "table" (a list of rows, header first).
+
+--format pdf writes PDFs instead of docx files, --format both writes both
+(the PDF path is reported as pdfPath); see nfa_pdf.py.
+
+The manifest defaults to <input>.manifest.jsonl next to the input. The
+JSON report (per-row status plus total wall time) is printed on stdout.
+"""
+import sys
+import os
+import csv
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from letter_common import backend_dir, load_environment, check_table_rows, get_logger
+from nfa_pdf import FORMAT_DOCX, FORMAT_BOTH, resolve_output_format
+
+import generate_nfa_automation_fixed as nfa
+
+log = get_logger("nfa_batch")
+
+DEFAULT_CONCURRENCY = 8
+NFA_TYPES = ("advance", "reimbursement")
+
+# Columns that describe the event; everything else is a line-item column
+EVENT_COLUMNS = {
+    "subject": "subject",
+    "summary": "summary",
+    "type": "type",
+    "nfatype": "type",
+    "nfa_type": "type",
+    "bullets": "bullets",
+    "needbullets": "bullets",
+    "need_bullets": "bullets",
+    "table": "table",
+    "tabledata": "table",
+}
+
+# ==========================
+# Input Loading
+# ==========================
+def cell_text(value):
+    """Spreadsheet cell as table text (1500.0 -> "1500")"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def read_xlsx_rows(source):
+    """Rows of the first sheet as dicts keyed by the header row"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Reading .xlsx files needs openpyxl (pip install openpyxl); or save the sheet as CSV")
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        values = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [cell_text(name) for name in next(values, [])]
+        return [dict(zip(header, row)) for row in values]
+    finally:
+        workbook.close()
+
+def read_rows(source):
+    """Raw rows from a CSV/XLSX/JSON file or '-' for JSON on stdin"""
+    extension = os.path.splitext(source)[1].lower()
+    if source == "-":
+        rows = json.load(sys.stdin)
+    elif extension == ".json":
+        with open(source, encoding="utf-8") as f:
+            rows = json.load(f)
+    elif extension in (".xlsx", ".xlsm"):
+        rows = read_xlsx_rows(source)
+    else:
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+
+    if not isinstance(rows, list):
+        raise ValueError("Batch input must be a list of {subject, summary, type, bullets} rows")
+    return rows
+
+def parse_bullets(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("yes", "y", "true", "1")
+    return bool(value)
+
+def load_events(source, default_type="reimbursement"):
+    """Group input rows into events: {index, row, subject, summary, type, bullets, table}"""
+    events = []
+    for row_number, row in enumerate(read_rows(source), start=2):
+        fields = {}
+        item_columns, item_values = [], []
+        for column, value in row.items():
+            if column is None or str(column).strip() == "":
+                continue
+            field = EVENT_COLUMNS.get(str(column).strip().lower())
+            if field:
+                fields[field] = value.strip() if isinstance(value, str) else value
+            else:
+                item_columns.append(str(column).strip())
+                item_values.append(cell_text(value))
+        has_items = any(item_values)
+
+        if not fields.get("subject") and not fields.get("summary"):
+            # A line item continuing the event above
+            if has_items and events:
+                events[-1]["items"].append(item_values)
+            elif has_items:
+                log.warning("⚠️ Row %s has line items but no event above it, skipped", row_number)
+            continue
+
+        table = fields.get("table")
+        if isinstance(table, str):
+            table = json.loads(table) if table else None
+        events.append({
+            "index": len(events),
+            "row": row_number,
+            "subject": cell_text(fields.get("subject")),
+            "summary": cell_text(fields.get("summary")),
+            "type": (cell_text(fields.get("type")) or default_type).lower(),
+            "bullets": parse_bullets(fields.get("bullets")),
+            "table": table,
+            "item_columns": item_columns,
+            "items": [item_values] if has_items else [],
+        })
+
+    for event in events:
+        item_columns, items = event.pop("item_columns"), event.pop("items")
+        if not event["table"] and items:
+            event["table"] = [item_columns] + items
+        event["table"] = event["table"] or []
+    assign_keys(events)
+    return events
+
+def assign_keys(events):
+    """Content key per event, so a resumed run recognises rows even if others were inserted or edited"""
+    seen = {}
+    for event in events:
+        payload = json.dumps([event["subject"], event["summary"], event["type"], event["bullets"], event["table"]],
+                             ensure_ascii=False, default=str)
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+        # Identical rows are separate NFAs
+        seen[digest] = seen.get(digest, 0) + 1
+        event["key"] = f"{digest}-{seen[digest]}"
+
+def validate_event(event):
+    """Error message for an event that cannot be generated, or None"""
+    if not event["subject"] or not event["summary"]:
+        return "subject and summary are required"
+    if event["type"] not in NFA_TYPES:
+        return f"Unknown NFA type: {event['type']} (expected {' or '.join(NFA_TYPES)})"
+    if not isinstance(event["table"], list):
+        return "table must be a list of rows"
+    try:
+        check_table_rows(event["table"])
+    except ValueError as e:
+        return str(e)
+    return None
+
+# ==========================
+# Manifest
+# ==========================
+class BatchManifest:
+    """Append-only JSONL record of finished rows; the last entry per key wins"""
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if resume and os.path.exists(path):
+            self._load()
+        elif not resume and os.path.exists(path):
+            os.replace(path, path + ".previous")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if isinstance(entry, dict) and entry.get("key"):
+                    self._entries[entry["key"]] = entry
+
+    def completed(self, key, output_format=FORMAT_DOCX):
+        """The manifest entry of a row whose documents (in output_format) were written and are still there, or None"""
+        entry = self._entries.get(key)
+        if not entry or entry.get("status") != "success" or not entry.get("filePath"):
+            return None
+        if entry.get("format", FORMAT_DOCX) != output_format:
+            return None
+        paths = [entry["filePath"], entry.get("pdfPath")] if output_format == FORMAT_BOTH else [entry["filePath"]]
+        if not all(path and os.path.exists(os.path.join(backend_dir, path)) for path in paths):
+            return None
+        return entry
+
+    def record(self, entry):
+        """Append one finished row and make it durable before the next one"""
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def default_manifest_path(source):
+    if source == "-":
+        return os.path.join(os.getcwd(), "nfa_batch.manifest.jsonl")
+    return os.path.splitext(os.path.abspath(source))[0] + ".manifest.jsonl"
+
+# ==========================
+# Workers
+# ==========================
+def generate_text(event):
+    """AI text for one event (runs on the AI thread pool); returns (text, ms)"""
+    started = time.perf_counter()
+    text = nfa.generate_ai_nfa_from_summary(event["subject"], event["summary"], event["type"],
+                                            need_bullets=event["bullets"])
+    return text, round((time.perf_counter() - started) * 1000, 1)
+
+def init_render_worker():
+    """Build the cached base template once per worker process instead of on its first row"""
+    load_environment()
+    nfa.get_base_document("nfa_fixed", nfa.build_nfa_base_template)
+
+def render_event(event, nfa_text, output_format=FORMAT_DOCX):
+    """Render one event's docx and/or PDF (runs in a worker process); returns the result fields"""
+    started = time.perf_counter()
+    result = nfa.render_generated_nfa(nfa_text, event["subject"], event["summary"], event["type"],
+                                      event["bullets"], event["table"], output_format=output_format)
+    fields = {
+        "filePath": result["file_path"],
+        "fileName": result["file_name"],
+        "format": output_format,
+        "fits": result["layout"]["fits"],
+        "render_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if output_format == FORMAT_BOTH:
+        fields["pdfPath"] = result["pdf_path"]
+    return fields
+
+class InlineRenderer:
+    """Stand-in for the process pool when --workers 0 (render on one thread in this process)"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nfa-render")
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+def start_render_pool(workers):
+    if workers <= 0:
+        return InlineRenderer()
+    # spawn: the AI threads are already running, and forking a threaded process is unsafe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_render_worker)
+
+# ==========================
+# Batch Runner
+# ==========================
+def row_result(event, status, **fields):
+    result = {"key": event["key"], "index": event["index"], "row": event["row"],
+              "subject": event["subject"], "status": status}
+    result.update(fields)
+    return result
+
+def run_batch(events, manifest, concurrency=DEFAULT_CONCURRENCY, workers=None, output_format=FORMAT_DOCX):
+    """Generate every event not already in the manifest; returns the batch report"""
+    started = time.perf_counter()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = []
+
+    def finish(result, record=True):
+        results.append(result)
+        if record:
+            manifest.record(result)
+        marker = {"success": "✅", "skipped": "⏭️"}.get(result["status"], "❌")
+        print(f"{marker} [{len(results)}/{len(events)}] {result['subject'] or 'row ' + str(result['row'])}: "
+              f"{result['status']}", file=sys.stderr)
+
+    pending_events = []
+    for event in events:
+        done = manifest.completed(event["key"], output_format)
+        if done:
+            finish(row_result(event, "skipped", filePath=done["filePath"], fileName=done.get("fileName"),
+                              pdfPath=done.get("pdfPath")), record=False)
+            continue
+        error = validate_event(event)
+        if error:
+            finish(row_result(event, "failed", error=error))
+            continue
+        pending_events.append(event)
+
+    if pending_events:
+        # Make sure the client exists before the threads race to create it
+        nfa.get_openai_client()
+        ai_pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="nfa-ai")
+        render_pool = start_render_pool(min(workers, len(pending_events)))
+        owners = {ai_pool.submit(generate_text, event): ("ai", event, None) for event in pending_events}
+        pending = set(owners)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, event, ai_ms = owners.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        label = "AI generation" if stage == "ai" else "Render"
+                        finish(row_result(event, "failed", error=f"{label} failed: {e}"))
+                        continue
+                    if stage == "ai":
+                        nfa_text, ai_ms = value
+                        render = render_pool.submit(render_event, event, nfa_text, output_format)
+                        owners[render] = ("render", event, ai_ms)
+                        pending.add(render)
+                    else:
+                        finish(row_result(event, "success", ai_ms=ai_ms, **value))
+        except BaseException:
+            ai_pool.shutdown(wait=False, cancel_futures=True)
+            render_pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        ai_pool.shutdown(wait=True)
+        render_pool.shutdown(wait=True)
+
+    results.sort(key=lambda r: r["index"])
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("success", "skipped", "failed")}
+    return {
+        "success": counts["failed"] == 0,
+        "total": len(results),
+        "succeeded": counts["success"],
+        "skipped": counts["skipped"],
+        "failed": counts["failed"],
+        "concurrency": concurrency,
+        "workers": workers,
+        "format": output_format,
+        "manifest": manifest.path,
+        "wall_time_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results,
+    }
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    """Parse --type/--format/--concurrency/--workers/--manifest/--no-resume and the input path"""
+    workers = os.getenv("NFA_BATCH_WORKERS")
+    options = {
+        "type": "reimbursement",
+        "format": None,
+        "concurrency": int(os.getenv("NFA_BATCH_CONCURRENCY", DEFAULT_CONCURRENCY)),
+        "workers": int(workers) if workers else None,
+        "manifest": None,
+        "resume": True,
+        "source": None,
+    }
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--type" and args:
+            options["type"] = args.pop(0).lower()
+        elif flag == "--format" and args:
+            options["format"] = args.pop(0)
+        elif flag == "--concurrency" and args:
+            options["concurrency"] = int(args.pop(0))
+        elif flag == "--workers" and args:
+            options["workers"] = int(args.pop(0))
+        elif flag == "--manifest" and args:
+            options["manifest"] = args.pop(0)
+        elif flag == "--no-resume":
+            options["resume"] = False
+        elif options["source"] is None and (flag == "-" or not flag.startswith("--")):
+            options["source"] = flag
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+
+    if options["source"] is None:
+        raise ValueError("Usage: generate_nfa_batch.py [--type advance|reimbursement] [--format docx|pdf|both] [--concurrency N] [--workers N] "
+                         "[--manifest PATH] [--no-resume] <events.csv|events.xlsx|events.json|->")
+    if options["type"] not in NFA_TYPES:
+        raise ValueError(f"Unknown NFA type: {options['type']}")
+    options["format"] = resolve_output_format(options["format"])
+    return options
+
+def main():
+    log.debug("Python version: %s", sys.version)
+    load_environment()
+    options = parse_args(sys.argv[1:])
+    events = load_events(options["source"], options["type"])
+    manifest = BatchManifest(options["manifest"] or default_manifest_path(options["source"]), resume=options["resume"])
+    print(f"Generating {len(events)} NFAs (concurrency {options['concurrency']}, "
+          f"workers {options['workers'] if options['workers'] is not None else os.cpu_count()})", file=sys.stderr)
+
+    try:
+        report = run_batch(events, manifest, options["concurrency"], options["workers"], options["format"])
+    finally:
+        manifest.close()
+    print(f"✅ Batch finished in {report['wall_time_ms'] / 1000:.1f}s: {report['succeeded']} ok, "
+          f"{report['skipped']} already done, {report['failed']} failed", file=sys.stderr)
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
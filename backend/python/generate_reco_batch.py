@@ -0,0 +1,239 @@
+# backend/python/generate_reco_batch.py
+"""Generate many job or MS recommendation letters in one run.
+
+AI paragraphs are requested concurrently through AsyncOpenAI (bounded by
+--concurrency, each item retried with backoff) and every letter is rendered
+as soon as its paragraph arrives.
+
+Usage:
+    python generate_reco_batch.py --type job students.csv
+    python generate_reco_batch.py --type ms students.json --concurrency 16 --retries 3
+    cat students.json | python generate_reco_batch.py --type job -
+
+Input is a CSV with name,title,summary columns or a JSON list of
+{"name", "title", "summary"} objects. A per-row "type" (job/ms) overrides
+--type. The JSON report (per-item status plus total wall time) is printed
+on stdout.
+"""
+import sys
+import os
+import csv
+import json
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from letter_common import get_async_openai_client, load_environment, get_logger
+
+import generate_job_reco as job_reco
+import generate_ms_reco as ms_reco
+
+log = get_logger("reco_batch")
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+
+# Client errors that will fail the same way on every attempt
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+LETTER_TYPES = {
+    "job": job_reco,
+    "ms": ms_reco,
+}
+
+RENDERERS = {
+    "job": job_reco.render_job_recommendation,
+    "ms": ms_reco.render_ms_recommendation,
+}
+
+# ==========================
+# Input Loading
+# ==========================
+def load_items(source, default_type):
+    """Read (name, title, summary[, type]) rows from a CSV/JSON file or '-' for JSON on stdin"""
+    if source == "-":
+        rows = json.load(sys.stdin)
+    elif source.lower().endswith(".json"):
+        with open(source, encoding="utf-8") as f:
+            rows = json.load(f)
+    else:
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+
+    if not isinstance(rows, list):
+        raise ValueError("Batch input must be a list of {name, title, summary} rows")
+
+    items = []
+    for index, row in enumerate(rows):
+        row = {str(k).strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        items.append({
+            "index": index,
+            "name": row.get("name") or "",
+            "title": row.get("title") or "",
+            "summary": row.get("summary") or "",
+            "type": (row.get("type") or default_type).lower(),
+        })
+    return items
+
+# ==========================
+# AI Paragraphs
+# ==========================
+def is_retryable(error):
+    return getattr(error, "status_code", None) not in NON_RETRYABLE_STATUS
+
+async def fetch_ai_paragraph(client, item, semaphore, retries):
+    """Return (paragraph, attempts, cached, error) for one item; falls back to the template paragraph"""
+    from llm_cache import cached_chat_completion_async
+
+    module = LETTER_TYPES[item["type"]]
+    if not client:
+        return module.fallback_ai_paragraph(item["name"], item["title"], item["summary"]), 0, False, "OpenAI client not available"
+
+    request = module.build_ai_paragraph_request(item["name"], item["title"], item["summary"])
+    last_error = None
+    retries = max(0, retries)
+    for attempt in range(1, retries + 2):
+        try:
+            async with semaphore:
+                completion = await cached_chat_completion_async(client, **request)
+            return completion["content"].strip(), attempt, completion["cached"], None
+        except Exception as e:
+            last_error = e
+            if attempt > retries or not is_retryable(e):
+                break
+            delay = RETRY_BASE_DELAY * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
+            log.warning("⚠️ Item %s attempt %s failed: %s; retrying in %.1fs", item['index'], attempt, e, delay)
+            await asyncio.sleep(delay)
+
+    log.warning("Warning: AI generation failed for item %s, using fallback text: %s", item['index'], last_error)
+    return module.fallback_ai_paragraph(item["name"], item["title"], item["summary"]), attempt, False, str(last_error)
+
+# ==========================
+# Batch Runner
+# ==========================
+async def process_item(client, item, semaphore, retries, output_directories, render_executor):
+    """Fetch the paragraph for one item, then render its docx off the event loop"""
+    started = time.perf_counter()
+    result = {"index": item["index"], "name": item["name"], "type": item["type"]}
+
+    if item["type"] not in LETTER_TYPES:
+        result.update(status="failed", error=f"Unknown letter type: {item['type']}")
+        return result
+    if not item["name"] or not item["title"] or not item["summary"]:
+        result.update(status="failed", error="name, title and summary are required")
+        return result
+
+    paragraph, attempts, cached, ai_error = await fetch_ai_paragraph(client, item, semaphore, retries)
+    result.update(attempts=attempts, cached=cached)
+
+    try:
+        file_path = await asyncio.get_running_loop().run_in_executor(
+            render_executor, RENDERERS[item["type"]], item["name"], item["title"], paragraph, output_directories[item["type"]]
+        )
+    except Exception as e:
+        result.update(status="failed", error=f"Render failed: {e}")
+        return result
+
+    result.update(
+        status="fallback" if ai_error else "success",
+        filePath=file_path,
+        fileName=os.path.basename(file_path),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    if ai_error:
+        result["error"] = ai_error
+    return result
+
+async def run_batch(items, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """Process every item with at most `concurrency` AI calls in flight; returns the batch report"""
+    started = time.perf_counter()
+    client = get_async_openai_client()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    # Resolve output folders once up front instead of per letter
+    used_types = {item["type"] for item in items if item["type"] in LETTER_TYPES}
+    output_directories = {letter_type: LETTER_TYPES[letter_type].get_output_directory() for letter_type in used_types}
+
+    # python-docx rendering is CPU-bound, so a single render thread is as fast as
+    # several and keeps lazy imports and the base-template cache single-threaded
+    render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reco-render")
+    tasks = [
+        asyncio.create_task(process_item(client, item, semaphore, retries, output_directories, render_executor))
+        for item in items
+    ]
+    results = []
+    try:
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            results.append(result)
+            marker = "✅" if result["status"] == "success" else ("⚠️" if result["status"] == "fallback" else "❌")
+            print(f"{marker} [{len(results)}/{len(items)}] {result['name'] or '#' + str(result['index'])}: {result['status']}", file=sys.stderr)
+    finally:
+        render_executor.shutdown(wait=True)
+
+    if client:
+        await client.close()
+
+    results.sort(key=lambda r: r["index"])
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("success", "fallback", "failed")}
+    return {
+        "success": counts["failed"] == 0,
+        "total": len(results),
+        "succeeded": counts["success"],
+        "fallback": counts["fallback"],
+        "failed": counts["failed"],
+        "concurrency": concurrency,
+        "wall_time_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results,
+    }
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    """Parse --type/--concurrency/--retries and the input path"""
+    options = {
+        "type": "job",
+        "concurrency": int(os.getenv("RECO_BATCH_CONCURRENCY", DEFAULT_CONCURRENCY)),
+        "retries": int(os.getenv("RECO_BATCH_RETRIES", DEFAULT_RETRIES)),
+        "source": None,
+    }
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--type" and args:
+            options["type"] = args.pop(0).lower()
+        elif flag == "--concurrency" and args:
+            options["concurrency"] = int(args.pop(0))
+        elif flag == "--retries" and args:
+            options["retries"] = int(args.pop(0))
+        elif options["source"] is None and (flag == "-" or not flag.startswith("--")):
+            options["source"] = flag
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+
+    if options["source"] is None:
+        raise ValueError("Usage: generate_reco_batch.py --type job|ms [--concurrency N] [--retries N] <input.csv|input.json|->")
+    if options["type"] not in LETTER_TYPES:
+        raise ValueError(f"Unknown letter type: {options['type']}")
+    return options
+
+def main():
+    log.debug("Python version: %s", sys.version)
+    load_environment()
+    options = parse_args(sys.argv[1:])
+    items = load_items(options["source"], options["type"])
+    print(f"Generating {len(items)} letters (concurrency {options['concurrency']}, retries {options['retries']})", file=sys.stderr)
+
+    report = asyncio.run(run_batch(items, options["concurrency"], options["retries"]))
+    print(f"✅ Batch finished in {report['wall_time_ms'] / 1000:.1f}s: "
+          f"{report['succeeded']} ok, {report['fallback']} fallback, {report['failed']} failed", file=sys.stderr)
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
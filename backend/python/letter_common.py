@@ -0,0 +1,487 @@
+# backend/python/letter_common.py
+"""Shared setup for the letter generators: env, OpenAI client, paths and header image"""
+import sys
+import os
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# ==========================
+# Paths
+# ==========================
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(script_dir)
+uploads_dir = os.path.join(backend_dir, "uploads")
+signatures_dir = os.path.join(uploads_dir, "signatures")
+
+# Header image - look in multiple locations
+possible_header_paths = [
+    os.path.join(uploads_dir, "header.png"),
+    os.path.join(backend_dir, "assets", "header.png"),
+    os.path.join(backend_dir, "header.png"),
+    os.path.join(script_dir, "header.png"),
+    os.path.join(backend_dir, "..", "public", "header.png")  # Add public directory
+]
+
+_environment_loaded = False
+_client = None
+_client_initialized = False
+_async_client = None
+_async_client_initialized = False
+# Threaded callers (letter service, batch AI pool) must never see a half-built client
+_client_lock = threading.Lock()
+_header_image_path = None
+_header_image_probed = False
+
+# ==========================
+# Logging
+# ==========================
+# Leveled logging for every generator. Messages use %-style arguments so a
+# disabled level never formats anything. Records below LETTER_LOG_LEVEL are
+# kept (unformatted) in a small ring buffer and written out only when a
+# request fails.
+DEFAULT_LOG_LEVEL = "WARNING"
+DEFAULT_LOG_RING_SIZE = 200
+
+_logging_configured = False
+_stderr_handler = None
+_ring_handler = None
+_log_context = threading.local()
+
+def _log_json(record, formatted_exception=None, replayed=False):
+    import json
+
+    payload = {
+        "ts": round(record.created, 3),
+        "level": record.levelname,
+        "logger": record.name,
+        "msg": record.getMessage(),
+    }
+    request_id = getattr(record, "request_id", None)
+    if request_id is not None:
+        payload["request_id"] = request_id
+    if formatted_exception:
+        payload["exc"] = formatted_exception
+    if replayed:
+        payload["replayed"] = True
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+def _make_formatter(log_format):
+    import logging
+
+    class JsonFormatter(logging.Formatter):
+        def format(self, record):
+            exception = self.formatException(record.exc_info) if record.exc_info else None
+            return _log_json(record, exception, getattr(record, "replayed", False))
+
+    if log_format == "text":
+        return logging.Formatter("%(levelname)s %(name)s: %(message)s")
+    return JsonFormatter()
+
+def _make_ring_handler(capacity):
+    import logging
+    from collections import deque
+
+    class RingBufferHandler(logging.Handler):
+        """Keeps the most recent records without formatting them"""
+
+        def __init__(self):
+            super().__init__(logging.DEBUG)
+            self.records = deque(maxlen=capacity)
+
+        def emit(self, record):
+            self.records.append(record)
+
+    return RingBufferHandler()
+
+class _ContextFilter:
+    """Stamp records with the current request id (set by the --serve / service loops)"""
+
+    def filter(self, record):
+        record.request_id = getattr(_log_context, "request_id", None)
+        return True
+
+_context_filter = _ContextFilter()
+
+def configure_logging():
+    """Set up the "letters" logger from LETTER_LOG_LEVEL / LETTER_LOG_FORMAT / LETTER_LOG_RING_SIZE (once)"""
+    global _logging_configured, _stderr_handler, _ring_handler
+    import logging
+
+    root = logging.getLogger("letters")
+    if _logging_configured:
+        return root
+    _logging_configured = True
+
+    level_name = os.getenv("LETTER_LOG_LEVEL", DEFAULT_LOG_LEVEL).upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        level = logging.WARNING
+    ring_size = int(os.getenv("LETTER_LOG_RING_SIZE", DEFAULT_LOG_RING_SIZE))
+
+    _stderr_handler = logging.StreamHandler(sys.stderr)
+    _stderr_handler.setLevel(level)
+    _stderr_handler.setFormatter(_make_formatter(os.getenv("LETTER_LOG_FORMAT", "json").lower()))
+    root.addHandler(_stderr_handler)
+
+    # Without a ring buffer the logger itself drops disabled levels up front
+    if ring_size > 0 and level > logging.DEBUG:
+        _ring_handler = _make_ring_handler(ring_size)
+        root.addHandler(_ring_handler)
+        root.setLevel(logging.DEBUG)
+    else:
+        root.setLevel(level)
+    root.propagate = False
+    return root
+
+def get_logger(name):
+    """Logger for one generator module (a child of "letters")"""
+    import logging
+
+    configure_logging()
+    logger = logging.getLogger(f"letters.{name}")
+    if _context_filter not in logger.filters:
+        logger.addFilter(_context_filter)
+    return logger
+
+def set_log_request_id(request_id):
+    """Attach a request id to every record logged on this thread (None clears it)"""
+    _log_context.request_id = request_id
+
+def reset_log_buffer():
+    """Forget buffered records; called at the start of each request in long-lived workers"""
+    if _ring_handler is not None:
+        _ring_handler.records.clear()
+
+def dump_log_buffer(reason=None):
+    """Write the buffered records that were below the stderr level (request failed).
+
+    With a request id set on this thread only that request's records are written.
+    """
+    if _ring_handler is None or _stderr_handler is None:
+        return 0
+    request_id = getattr(_log_context, "request_id", None)
+    buffered = _ring_handler.records
+    mine = [record for record in buffered if request_id is None or record.request_id == request_id]
+    if request_id is None:
+        buffered.clear()
+    else:
+        for record in mine:
+            buffered.remove(record)
+    records = [record for record in mine if record.levelno < _stderr_handler.level]
+    if not records:
+        return 0
+    if reason:
+        sys.stderr.write(f"--- {len(records)} buffered log records ({reason}) ---\n")
+    for record in records:
+        record.replayed = True
+        sys.stderr.write(_stderr_handler.format(record) + "\n")
+    sys.stderr.flush()
+    return len(records)
+
+log = get_logger("common")
+
+# ==========================
+# Load API Key & Init OpenAI
+# ==========================
+def load_environment():
+    """Load the .env file once per process"""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    _environment_loaded = True
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception as e:
+        log.error("Error loading environment variables: %s", e)
+
+def get_openai_client():
+    """Return the process-wide OpenAI client, or None when no API key is configured"""
+    global _client, _client_initialized
+    if _client_initialized:
+        return _client
+    with _client_lock:
+        if _client_initialized:
+            return _client
+
+        load_environment()
+        try:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                log.warning("Warning: OPENAI_API_KEY not found")
+            else:
+                log.debug("OPENAI_API_KEY loaded successfully")
+                with timed_stage("client_init"):
+                    from openai import OpenAI
+                    _client = OpenAI(api_key=api_key)
+        except Exception as e:
+            log.error("Error initializing OpenAI client: %s", e)
+            _client = None
+        # Only now: readers that skip the lock must find _client already set
+        _client_initialized = True
+    return _client
+
+def get_async_openai_client(max_retries=0):
+    """Return the process-wide AsyncOpenAI client, or None when no API key is configured.
+
+    SDK retries default to off so batch callers own the retry policy.
+    """
+    global _async_client, _async_client_initialized
+    if _async_client_initialized:
+        return _async_client
+    with _client_lock:
+        if _async_client_initialized:
+            return _async_client
+
+        load_environment()
+        try:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                log.warning("Warning: OPENAI_API_KEY not found")
+            else:
+                with timed_stage("client_init"):
+                    from openai import AsyncOpenAI
+                    _async_client = AsyncOpenAI(api_key=api_key, max_retries=max_retries)
+        except Exception as e:
+            log.error("Error initializing async OpenAI client: %s", e)
+            _async_client = None
+        _async_client_initialized = True
+    return _async_client
+
+# ==========================
+# Output Directories
+# ==========================
+def resolve_output_directory(subfolder, default_base=None):
+    """Resolve OUTPUT_DIR (relative to backend/) plus a letter-type subfolder and create it"""
+    load_environment()
+    env_output_dir = os.getenv("OUTPUT_DIR")
+    if env_output_dir:
+        # Remove the "./backend/" prefix since we're already in the backend directory
+        if env_output_dir.startswith("./backend/"):
+            env_output_dir = env_output_dir.replace("./backend/", "./")
+        base_output_directory = os.path.abspath(os.path.join(backend_dir, env_output_dir.lstrip("./")))
+    else:
+        base_output_directory = default_base or os.path.join(uploads_dir, "generated_letters")
+
+    output_directory = os.path.join(base_output_directory, subfolder)
+    os.makedirs(output_directory, exist_ok=True)
+    return output_directory
+
+# ==========================
+# Header Image
+# ==========================
+def find_header_image():
+    """Return the first existing header.png location, probing the filesystem once per process"""
+    global _header_image_path, _header_image_probed
+    if _header_image_probed:
+        return _header_image_path
+    _header_image_probed = True
+
+    for path in possible_header_paths:
+        if os.path.exists(path):
+            _header_image_path = path
+            log.debug("✅ Found header image at: %s", path)
+            break
+
+    if not _header_image_path:
+        log.warning("⚠️ Header image not found in any expected location")
+        log.debug("Searched paths: %s", possible_header_paths)
+    return _header_image_path
+
+# ==========================
+# Base Document Templates
+# ==========================
+_base_templates = {}
+
+def get_base_document(template_name, builder, header_image_path=None):
+    """Return a new Document cloned in memory from a cached base template.
+
+    builder(header_image_path) lays out the fixed skeleton (margins, header
+    image, date, title, named styles) and runs once per process. The cached
+    copy is rebuilt when header.png changes (mtime) or the date rolls over.
+    """
+    from io import BytesIO
+    from docx import Document
+
+    if header_image_path is None:
+        header_image_path = find_header_image()
+    try:
+        header_mtime = os.path.getmtime(header_image_path) if header_image_path else None
+    except OSError:
+        header_mtime = None
+    cache_key = (header_image_path, header_mtime, datetime.now().strftime("%Y-%m-%d"))
+
+    cached = _base_templates.get(template_name)
+    if not cached or cached[0] != cache_key:
+        log.debug("Building base template '%s'", template_name)
+        template = builder(header_image_path)
+        buffer = BytesIO()
+        template.save(buffer)
+        cached = (cache_key, buffer.getvalue())
+        _base_templates[template_name] = cached
+
+    return Document(BytesIO(cached[1]))
+
+# ==========================
+# Stage Timings
+# ==========================
+_timer_state = threading.local()
+
+def process_age_ms():
+    """Milliseconds since this process was created (interpreter start-up + imports), None if unknown"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return round((uptime - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class StageTimer:
+    """Monotonic per-stage milliseconds plus token usage for one request"""
+
+    def __init__(self, include_startup=False):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.llm_cached = 0
+        self.llm_usage = []
+        if include_startup:
+            startup_ms = process_age_ms()
+            if startup_ms is not None:
+                self.stages["startup"] = startup_ms
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last_mark = time.perf_counter()
+            elapsed = (self._last_mark - started) * 1000
+            self.stages[name] = round(self.stages.get(name, 0) + elapsed, 1)
+
+    def lap(self, name):
+        """Record the time since the previous lap or stage under name"""
+        now = time.perf_counter()
+        elapsed = (now - self._last_mark) * 1000
+        self.stages[name] = round(self.stages.get(name, 0) + elapsed, 1)
+        self._last_mark = now
+
+    def add_usage(self, usage, cached=False, label=None):
+        self.llm_calls += 1
+        if cached:
+            self.llm_cached += 1
+        usage = usage or {}
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens") or 0
+        self.llm_usage.append({
+            "label": label,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "cached_prompt_tokens": usage.get("cached_prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "cached": cached,
+        })
+
+    def as_dict(self):
+        return {
+            "stages_ms": dict(self.stages),
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "llm_calls": self.llm_calls,
+            "llm_cached": self.llm_cached,
+            "llm_usage": list(self.llm_usage),
+        }
+
+def start_timer(include_startup=False):
+    """Start a StageTimer and make it current for this thread"""
+    timer = StageTimer(include_startup=include_startup)
+    _timer_state.timer = timer
+    return timer
+
+def current_timer():
+    return getattr(_timer_state, "timer", None)
+
+@contextmanager
+def timed_stage(name):
+    """Time a block into the current thread's StageTimer (no-op without one)"""
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+def lap_stage(name):
+    """Lap the current thread's StageTimer (no-op without one); for long inline blocks"""
+    timer = current_timer()
+    if timer is not None:
+        timer.lap(name)
+
+def record_llm_usage(usage, cached=False, label=None):
+    timer = current_timer()
+    if timer is not None:
+        timer.add_usage(usage, cached=cached, label=label)
+
+# ==========================
+# Request Payloads
+# ==========================
+DEFAULT_MAX_REQUEST_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_TABLE_ROWS = 1000
+
+def max_request_bytes():
+    return int(os.getenv("LETTER_MAX_REQUEST_BYTES", DEFAULT_MAX_REQUEST_BYTES))
+
+def max_table_rows():
+    return int(os.getenv("LETTER_MAX_TABLE_ROWS", DEFAULT_MAX_TABLE_ROWS))
+
+def read_request_payload(path=None, stream=None):
+    """Read one JSON request object from a file (or stdin when path is None/'-'), enforcing the size limit.
+
+    Only the payload size is logged, never its contents.
+    """
+    import json
+
+    limit = max_request_bytes()
+    if path and path != "-":
+        if os.path.getsize(path) > limit:
+            raise ValueError(f"Request file is larger than the {limit} byte limit")
+        with open(path, "rb") as f:
+            raw = f.read(limit + 1)
+    else:
+        stream = stream or sys.stdin.buffer
+        raw = stream.read(limit + 1)
+
+    if len(raw) > limit:
+        raise ValueError(f"Request payload is larger than the {limit} byte limit")
+    log.debug("Request payload: %s bytes", len(raw))
+
+    request = json.loads(raw.decode("utf-8-sig") or "{}")
+    if not isinstance(request, dict):
+        raise ValueError("Request payload must be a JSON object")
+    return request
+
+def load_request_from_argv(argv):
+    """Return the JSON request named by --stdin or --request-file PATH in argv, or None for positional mode"""
+    if "--stdin" in argv:
+        return read_request_payload()
+    if "--request-file" in argv:
+        index = argv.index("--request-file")
+        if index + 1 >= len(argv):
+            raise ValueError("--request-file requires a path")
+        return read_request_payload(argv[index + 1])
+    return None
+
+def check_table_rows(table_data):
+    """Reject tables over LETTER_MAX_TABLE_ROWS rows before any document work starts"""
+    limit = max_table_rows()
+    if len(table_data) > limit:
+        raise ValueError(f"Table has {len(table_data)} rows; the limit is {limit}")
+    return table_data
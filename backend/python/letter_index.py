@@ -0,0 +1,435 @@
+# backend/python/letter_index.py
+"""Full-text search over generated letters (SQLite FTS5).
+
+Every generator adds the letter it saves to the index: its extracted text
+plus type, subject, student name, amount and date. search() answers a
+free-text query ("hackathon last March") with ranked hits and highlighted
+snippets straight from the index, without opening any document. Letters
+written before the index existed are added with the backfill command.
+
+Queries are split into words; common words are dropped and the rest are
+OR-ed as prefix terms, so hits that match more (and rarer) words rank
+first (bm25, with subject and student name weighted above the body). A
+letter's month and year are indexed as words too, so "march 2026" finds
+letters dated March 2026. --raw passes an FTS5 query through unchanged.
+
+Indexing is best effort: a missing or locked index never fails a letter.
+
+Environment:
+    LETTER_INDEX_PATH   SQLite file (default backend/cache/letter_index.sqlite3)
+    LETTER_INDEX=0      do not index new letters
+
+Usage:
+    python letter_index.py search "hackathon march" [--type nfa] [--since 2026-03-01] [--until 2026-03-31] [--limit 20] [--raw]
+    python letter_index.py backfill [directory ...]
+    python letter_index.py stats
+"""
+import sys
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from letter_common import backend_dir, get_logger
+
+log = get_logger("letter_index")
+
+DEFAULT_INDEX_PATH = os.path.join(backend_dir, "cache", "letter_index.sqlite3")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+BACKFILL_BATCH = 200
+
+# bm25 weights in column order: subject, student_name, period, body (fixed when the index is created)
+COLUMN_WEIGHTS = (8.0, 6.0, 2.0, 1.0)
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "at", "by", "with", "from", "about",
+    "is", "was", "this", "that", "last", "next", "letter", "letters", "find", "me", "my",
+}
+
+# ₹ 1,20,000 / Rs. 5000 / INR 2,500.50 / 12,000 rupees
+_CURRENCY_AMOUNT = re.compile(
+    r"(?:₹|\bRs\.?|\bINR)\s*([0-9][0-9,]*(?:\.[0-9]+)?)|\b([0-9][0-9,]*(?:\.[0-9]+)?)\s*(?:/-|rupees\b)",
+    re.IGNORECASE,
+)
+_NUMBER = re.compile(r"[0-9][0-9,]*(?:\.[0-9]+)?")
+_LETTER_ID_DATE = re.compile(r"_(\d{8})T\d{6}Z-[0-9a-f]{8}\.")
+_SUBJECT_LINE = re.compile(r"^\s*Subject:\s*(.+)$", re.MULTILINE)
+_SUBJECT_PREFIX = re.compile(r"^\s*Subject:\s*", re.IGNORECASE)
+_STUDENT_NAME = re.compile(r"Recommendation Letter for (.+)$", re.MULTILINE)
+
+_index = None
+_index_lock = threading.Lock()
+
+# ==========================
+# Text and Metadata
+# ==========================
+def document_text(doc):
+    """Searchable text of a python-docx document: paragraphs, then table rows as 'a | b | c'"""
+    from nfa_tables import iter_row_texts
+
+    lines = [paragraph.text.strip() for paragraph in doc.paragraphs if paragraph.text.strip()]
+    for table in doc.tables:
+        for cell_texts in iter_row_texts(table):
+            row = [text.strip() for text in cell_texts if text.strip()]
+            if row:
+                lines.append(" | ".join(row))
+    return "\n".join(lines)
+
+def table_text(table_data):
+    """Annexure rows in the same 'a | b | c' form as document_text"""
+    return "\n".join(" | ".join(str(value).strip() for value in row if str(value).strip())
+                     for row in table_data or [] if isinstance(row, (list, tuple)))
+
+def _number(text):
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+def extract_amount(text):
+    """Largest rupee amount in the text, else the last number on a 'Total' row, else None"""
+    amounts = [_number(a or b) for a, b in _CURRENCY_AMOUNT.findall(text or "")]
+    amounts = [amount for amount in amounts if amount is not None]
+    if amounts:
+        return max(amounts)
+    for line in reversed((text or "").split("\n")):
+        if line.strip().lower().startswith("total") or "| total" in line.lower():
+            numbers = [_number(n) for n in _NUMBER.findall(line)]
+            numbers = [n for n in numbers if n is not None]
+            if numbers:
+                return numbers[-1]
+    return None
+
+def letter_date(path):
+    """ISO date of a letter: from the id in its file name, else its modification time"""
+    match = _LETTER_ID_DATE.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d").date().isoformat()
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(path)).date().isoformat()
+    except OSError:
+        return datetime.now().date().isoformat()
+
+def period_words(iso_date):
+    """'2026-03-14' -> 'march mar 2026 2026-03', so month and year words match"""
+    date = datetime.strptime(iso_date, "%Y-%m-%d")
+    return f"{date:%B} {date:%b} {date:%Y} {date:%Y-%m}".lower()
+
+def guess_letter_type(path):
+    """nfa / job_reco / ms_reco from the directory or the file name (flat layouts)"""
+    parts = os.path.normpath(path).split(os.sep)
+    for letter_type in ("nfa", "job_reco", "ms_reco"):
+        if letter_type in parts:
+            return letter_type
+    name = os.path.basename(path).lower()
+    if name.startswith(("nfa_", "edited_nfa")):
+        return "nfa"
+    if name.startswith("job_recommendation"):
+        return "job_reco"
+    if name.startswith("ms_recommendation"):
+        return "ms_reco"
+    return "other"
+
+def relative_path(path):
+    """Path relative to backend/, the form the generators return as file_path"""
+    return os.path.relpath(os.path.abspath(path), backend_dir).replace(os.sep, "/")
+
+# ==========================
+# Index
+# ==========================
+class LetterIndex:
+    """SQLite metadata table plus an FTS5 table over subject, student name, period and body"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS letters (
+                id INTEGER PRIMARY KEY,
+                file_path TEXT NOT NULL UNIQUE,
+                file_name TEXT NOT NULL,
+                letter_type TEXT NOT NULL,
+                subject TEXT NOT NULL DEFAULT '',
+                student_name TEXT NOT NULL DEFAULT '',
+                amount REAL,
+                letter_date TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                indexed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS letters_type_date ON letters (letter_type, letter_date)")
+        created = not self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'letters_fts'").fetchone()
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS letters_fts USING fts5(
+                subject, student_name, period, body,
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """)
+        if created:
+            # Stored in the index: ORDER BY rank then only builds snippets for the rows it returns
+            weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+            self._conn.execute(f"INSERT INTO letters_fts (letters_fts, rank) VALUES ('rank', 'bm25({weights})')")
+
+    def _upsert(self, entry):
+        row = self._conn.execute("SELECT id FROM letters WHERE file_path = ?", (entry["file_path"],)).fetchone()
+        values = (entry["file_name"], entry["letter_type"], entry["subject"], entry["student_name"], entry["amount"],
+                  entry["letter_date"], entry["size"], entry["mtime_ns"], time.time())
+        if row:
+            letter_id = row[0]
+            self._conn.execute(
+                "UPDATE letters SET file_name = ?, letter_type = ?, subject = ?, student_name = ?, amount = ?, "
+                "letter_date = ?, size = ?, mtime_ns = ?, indexed_at = ? WHERE id = ?", values + (letter_id,)
+            )
+            self._conn.execute("DELETE FROM letters_fts WHERE rowid = ?", (letter_id,))
+        else:
+            letter_id = self._conn.execute(
+                "INSERT INTO letters (file_name, letter_type, subject, student_name, amount, letter_date, size, "
+                "mtime_ns, indexed_at, file_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values + (entry["file_path"],)
+            ).lastrowid
+        self._conn.execute(
+            "INSERT INTO letters_fts (rowid, subject, student_name, period, body) VALUES (?, ?, ?, ?, ?)",
+            (letter_id, entry["subject"], entry["student_name"], period_words(entry["letter_date"]), entry["body"])
+        )
+
+    def add(self, entries):
+        """Insert or replace letters (dicts from letter_entry) in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry in entries:
+                    self._upsert(entry)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stamps(self):
+        """file_path -> (size, mtime_ns) of every indexed letter"""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_path, size, mtime_ns FROM letters").fetchall()
+        return {file_path: (size, mtime_ns) for file_path, size, mtime_ns in rows}
+
+    def search(self, match, letter_type=None, since=None, until=None, limit=DEFAULT_LIMIT):
+        """Ranked hits (best first) for an FTS5 match expression"""
+        sql = (
+            "SELECT l.file_path, l.file_name, l.letter_type, l.subject, l.student_name, l.amount, l.letter_date, "
+            "snippet(letters_fts, -1, '[', ']', ' … ', 16), rank "
+            "FROM letters_fts JOIN letters l ON l.id = letters_fts.rowid WHERE letters_fts MATCH ?"
+        )
+        params = [match]
+        for condition, value in (("l.letter_type = ?", letter_type), ("l.letter_date >= ?", since),
+                                 ("l.letter_date <= ?", until)):
+            if value:
+                sql += f" AND {condition}"
+                params.append(value)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{
+            "filePath": file_path, "fileName": file_name, "letterType": letter_type, "subject": subject,
+            "studentName": student_name, "amount": amount, "date": date, "snippet": " ".join(snippet.split()),
+            "score": round(-score, 4),
+        } for file_path, file_name, letter_type, subject, student_name, amount, date, snippet, score in rows]
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT letter_type, COUNT(*) FROM letters GROUP BY letter_type").fetchall()
+        return {"path": self.path, "letters": sum(count for _, count in rows), "by_type": dict(rows)}
+
+def index_disabled():
+    return os.getenv("LETTER_INDEX", "1").lower() in ("0", "false", "no")
+
+def open_index():
+    return LetterIndex(os.getenv("LETTER_INDEX_PATH", DEFAULT_INDEX_PATH))
+
+def get_letter_index():
+    """Process-wide index configured from the environment (None if disabled or it cannot be opened)"""
+    global _index
+    if index_disabled():
+        return None
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = open_index()
+            except Exception as e:
+                log.warning("⚠️ Letter index unavailable, continuing without it: %s", e)
+                _index = False
+        return _index or None
+
+def letter_entry(path, letter_type, text, subject="", student_name="", amount=None):
+    """Index row for one letter file; subject and student name fall back to what the text says"""
+    subject = _SUBJECT_PREFIX.sub("", subject or "").strip()
+    if not subject:
+        match = _SUBJECT_LINE.search(text or "")
+        subject = match.group(1).strip() if match else ""
+    if not student_name and letter_type in ("job_reco", "ms_reco"):
+        match = _STUDENT_NAME.search(text or "")
+        student_name = match.group(1).strip() if match else ""
+    try:
+        stat = os.stat(path)
+        size, mtime_ns = stat.st_size, stat.st_mtime_ns
+    except OSError:
+        # Still being written in the background
+        size = mtime_ns = None
+    return {
+        "file_path": relative_path(path),
+        "file_name": os.path.basename(path),
+        "letter_type": letter_type,
+        "subject": subject or "",
+        "student_name": student_name or "",
+        "amount": amount if amount is not None else extract_amount(text),
+        "letter_date": letter_date(path),
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "body": text or "",
+    }
+
+def index_letter(path, letter_type, text, subject="", student_name="", amount=None):
+    """Add a saved letter to the search index (never raises)"""
+    index = get_letter_index()
+    if not index:
+        return
+    try:
+        index.add([letter_entry(path, letter_type, text, subject, student_name, amount)])
+    except Exception as e:
+        log.warning("⚠️ Letter index write failed for %s: %s", path, e)
+
+# ==========================
+# Search
+# ==========================
+def match_query(query):
+    """FTS5 expression for free text: words minus stopwords, each a quoted prefix term, OR-ed"""
+    words = [word for word in re.findall(r"\w+", (query or "").lower()) if word not in STOPWORDS]
+    if not words:
+        raise ValueError("Nothing to search for")
+    return " OR ".join(f'"{word}"*' for word in dict.fromkeys(words))
+
+def search_letters(query, letter_type=None, since=None, until=None, limit=DEFAULT_LIMIT, raw=False):
+    """Search the index; returns the JSON result with ranked hits under "results" """
+    started = time.perf_counter()
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    match = query if raw else match_query(query)
+    # LETTER_INDEX=0 only stops indexing; searching still opens the index
+    index = get_letter_index() or open_index()
+    try:
+        hits = index.search(match, letter_type, since, until, limit)
+    except sqlite3.OperationalError as e:
+        raise ValueError(f"Invalid search query: {e}")
+    return {
+        "success": True,
+        "query": query,
+        "match": match,
+        "total": len(hits),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "results": hits,
+    }
+
+def handle_search_request(request):
+    """Letter service route: {query, type, since, until, limit, raw} -> ranked hits"""
+    return search_letters(request.get("query") or "", request.get("type"), request.get("since"),
+                          request.get("until"), request.get("limit") or DEFAULT_LIMIT, bool(request.get("raw")))
+
+# ==========================
+# Backfill
+# ==========================
+def letter_files(directories):
+    """Every .docx below the directories (temp files skipped)"""
+    for directory in directories:
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                if name.lower().endswith(".docx") and not name.startswith((".tmp-", "~$")):
+                    yield os.path.join(root, name)
+
+def backfill(directories=None):
+    """Index existing .docx letters that are new or changed since they were indexed"""
+    from docx import Document
+    from bundle_letters import letter_roots
+
+    started = time.perf_counter()
+    directories = directories or [root for root in letter_roots() if os.path.isdir(root)]
+    index = open_index()
+    known = index.stamps()
+    counts = {"indexed": 0, "unchanged": 0, "failed": 0}
+    pending = []
+    for path in letter_files(directories):
+        stat = os.stat(path)
+        if known.get(relative_path(path)) == (stat.st_size, stat.st_mtime_ns):
+            counts["unchanged"] += 1
+            continue
+        try:
+            text = document_text(Document(path))
+        except Exception as e:
+            log.warning("⚠️ Could not read %s: %s", path, e)
+            counts["failed"] += 1
+            continue
+        pending.append(letter_entry(path, guess_letter_type(path), text))
+        if len(pending) >= BACKFILL_BATCH:
+            index.add(pending)
+            counts["indexed"] += len(pending)
+            pending = []
+            print(f"  {counts['indexed']} indexed...", file=sys.stderr)
+    if pending:
+        index.add(pending)
+        counts["indexed"] += len(pending)
+    counts.update(success=True, directories=directories,
+                  elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+    return counts
+
+# ==========================
+# Main Function
+# ==========================
+def parse_search_args(args):
+    options = {"query": [], "type": None, "since": None, "until": None, "limit": DEFAULT_LIMIT, "raw": False}
+    while args:
+        flag = args.pop(0)
+        if flag in ("--type", "--since", "--until", "--limit") and args:
+            options[flag[2:]] = args.pop(0)
+        elif flag == "--raw":
+            options["raw"] = True
+        elif not flag.startswith("--"):
+            options["query"].append(flag)
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    options["query"] = " ".join(options["query"])
+    return options
+
+def main():
+    args = sys.argv[1:]
+    command = args.pop(0) if args else "stats"
+    if command == "search":
+        options = parse_search_args(args)
+        result = search_letters(options["query"], options["type"], options["since"], options["until"],
+                                options["limit"], options["raw"])
+        for hit in result["results"]:
+            print(f"{hit['date']}  {hit['letterType']:<8} {hit['subject'] or hit['fileName']}\n    {hit['filePath']}\n"
+                  f"    {hit['snippet']}", file=sys.stderr)
+        print(f"{result['total']} hit(s) in {result['elapsed_ms']} ms", file=sys.stderr)
+        print(json.dumps(result))
+    elif command == "backfill":
+        result = backfill(args or None)
+        print(f"✅ Backfill: {result['indexed']} indexed, {result['unchanged']} unchanged, "
+              f"{result['failed']} unreadable", file=sys.stderr)
+        print(json.dumps(result))
+    elif command == "stats":
+        print(json.dumps(open_index().stats(), indent=2))
+    else:
+        raise ValueError(f"Unknown command: {command} (use search, backfill or stats)")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,289 @@
+# backend/python/letter_service.py
+"""Long-running local service that serves NFA, job and MS recommendation letters from one warm process.
+
+Usage:
+    python letter_service.py [--host 127.0.0.1] [--port 5055]
+    python letter_service.py --unix-socket /tmp/letter_service.sock
+
+Every letter type is a POST route taking and returning JSON:
+    POST /nfa/generate    {subject, summary, nfaType, needBullets, tableData}
+    POST /nfa/edit        {text, prompt}
+    POST /nfa/download    {editedText, subject, summary, nfaType, tableData}
+    POST /job/generate    {name, title, summary}
+    POST /ms/generate     {name, title, summary}
+    POST /bundle          {files: [filePath, ...]} -> application/zip (streamed)
+    POST /search          {query, type, since, until, limit} -> ranked hits (see letter_index.py)
+    GET  /health
+
+Add "stream": true to an /nfa/generate or /nfa/edit body to get an
+application/x-ndjson response: {"event": "delta", "text"} lines as tokens
+arrive, then the usual result object tagged "event": "result".
+
+Send "Accept: application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+to /nfa/generate or /nfa/download to get the rendered .docx itself as the
+response body (file name in Content-Disposition, stored path in
+X-Letter-File-Path); add "persist": "async" or "none" to skip waiting for
+the disk write. Failures still answer with the JSON error result.
+"Accept: application/pdf" answers with the PDF rendering instead (see
+nfa_pdf.py); "format": "pdf" or "both" in a JSON request writes the PDF
+instead of / next to the docx.
+"""
+import sys
+import os
+import json
+import itertools
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from letter_common import start_timer, get_logger, set_log_request_id, dump_log_buffer, get_openai_client
+from nfa_pdf import FORMAT_PDF, PDF_MIME_TYPE
+import generate_nfa_automation_fixed as nfa
+import generate_job_reco as job_reco
+import generate_ms_reco as ms_reco
+import bundle_letters
+import letter_index
+
+log = get_logger("service")
+
+# Tags log records of concurrent requests so a failure replays only its own
+_request_counter = itertools.count(1)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5055
+
+# ==========================
+# Letter Type Registry
+# ==========================
+def _recommendation_handler(generate_fn):
+    """Wrap a generate_*_recommendation function as a JSON request handler"""
+    def handler(request):
+        name = request.get("name")
+        title = request.get("title")
+        summary = request.get("summary")
+        if not name or not title or not summary:
+            return {"success": False, "error": "name, title and summary are required"}
+
+        file_path = generate_fn(name, title, summary)
+        return {
+            "success": True,
+            "filePath": file_path,
+            "fileName": os.path.basename(file_path)
+        }
+    return handler
+
+LETTER_ROUTES = {
+    "/nfa/generate": nfa.handle_generate_request,
+    "/nfa/edit": nfa.handle_edit_request,
+    "/nfa/download": nfa.handle_download_request,
+    "/job/generate": _recommendation_handler(job_reco.generate_job_recommendation),
+    "/ms/generate": _recommendation_handler(ms_reco.generate_ms_recommendation),
+    "/search": letter_index.handle_search_request,
+}
+
+# Routes whose handler accepts emit= for streamed token deltas
+STREAMING_ROUTES = {"/nfa/generate", "/nfa/edit"}
+
+# Routes that can answer with the .docx (Accept: DOCX_MIME_TYPE) or PDF (Accept: PDF_MIME_TYPE) bytes
+DOCUMENT_ROUTES = {"/nfa/generate", "/nfa/download"}
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Streams a ZIP of already generated letters (see bundle_letters.py)
+BUNDLE_ROUTE = "/bundle"
+
+def handle_route(path, request, emit=None):
+    """Run the handler registered for path, turning failures into JSON error results with timings"""
+    handler = LETTER_ROUTES.get(path)
+    if not handler:
+        return 404, {"success": False, "error": f"Unknown route: {path}"}
+    if not isinstance(request, dict):
+        return 400, {"success": False, "error": "Request body must be a JSON object"}
+
+    timer = start_timer()
+    set_log_request_id(request.get("id") or f"{path}#{next(_request_counter)}")
+    try:
+        if emit and path in STREAMING_ROUTES:
+            status, result = 200, handler(request, emit=emit)
+        else:
+            status, result = 200, handler(request)
+    except Exception as e:
+        log.error("Request to %s failed: %s", path, e)
+        status, result = 500, {"success": False, "error": str(e), "error_type": type(e).__name__}
+    result["timings"] = timer.as_dict()
+    if not result.get("success"):
+        dump_log_buffer(f"{path} failed")
+    set_log_request_id(None)
+    return status, result
+
+# ==========================
+# HTTP Transport
+# ==========================
+class LetterRequestHandler(BaseHTTPRequestHandler):
+    server_version = "LetterService/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_document(self, status, result):
+        """Answer with the rendered .docx or PDF, or with the JSON result when there is none"""
+        data = result.pop("document_bytes", None)
+        if not result.get("success") or data is None:
+            self._send_json(status if not result.get("success") else 500, result)
+            return
+        pdf = result.get("format") == FORMAT_PDF
+        file_name = result.get("fileName") or result.get("file_name") or ("letter.pdf" if pdf else "letter.docx")
+        file_path = result.get("filePath") or result.get("file_path")
+        self.send_response(200)
+        self.send_header("Content-Type", PDF_MIME_TYPE if pdf else DOCX_MIME_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f'attachment; filename="{file_name}"')
+        if file_path:
+            self.send_header("X-Letter-File-Path", file_path)
+        self.send_header("X-Letter-Persisted", result.get("persisted") or "")
+        self.send_header("X-Letter-Total-Ms", str(result["timings"]["total_ms"]))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"success": True, "routes": sorted([*LETTER_ROUTES, BUNDLE_ROUTE])})
+        else:
+            self._send_json(404, {"success": False, "error": f"Unknown route: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b"{}"
+        try:
+            request = json.loads(raw_body.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self._send_json(400, {"success": False, "error": f"Invalid JSON request: {e}"})
+            return
+
+        if self.path == BUNDLE_ROUTE:
+            self._send_bundle(request)
+            return
+
+        if isinstance(request, dict) and request.get("stream") and self.path in STREAMING_ROUTES:
+            self._stream_route(request)
+            return
+
+        accept = self.headers.get("Accept") or ""
+        if isinstance(request, dict) and self.path in DOCUMENT_ROUTES and (DOCX_MIME_TYPE in accept or PDF_MIME_TYPE in accept):
+            request["inline"] = "bytes"
+            if PDF_MIME_TYPE in accept:
+                request["format"] = FORMAT_PDF
+            status, result = handle_route(self.path, request)
+            self._send_document(status, result)
+            return
+
+        status, result = handle_route(self.path, request)
+        self._send_json(status, result)
+
+    def _stream_route(self, request):
+        """Answer with NDJSON events; the body ends when the connection closes (HTTP/1.0)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def emit(event):
+            self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+        _, result = handle_route(self.path, request, emit=emit)
+        result["event"] = "result"
+        try:
+            emit(result)
+        except (BrokenPipeError, ConnectionResetError):
+            log.debug("Client disconnected before the result of %s", self.path)
+
+    def _send_bundle(self, request):
+        """Answer with a streamed ZIP of the requested letters; the body ends when the connection closes"""
+        try:
+            entries = bundle_letters.plan_bundle(bundle_letters.file_references(request))
+        except ValueError as e:
+            self._send_json(400, {"success": False, "error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f'attachment; filename="{bundle_letters.bundle_file_name()}"')
+        self.end_headers()
+        try:
+            summary = bundle_letters.write_bundle(entries, self.wfile)
+            log.debug("Bundled %s letters (%s bytes) in %sms", summary["files"], summary["archive_bytes"], summary["elapsed_ms"])
+        except (BrokenPipeError, ConnectionResetError):
+            log.debug("Client disconnected during the bundle download")
+        except OSError as e:
+            # A letter failed mid-read: the archive was cut off without a central directory
+            log.warning("⚠️ Bundle aborted: %s", e)
+            self.close_connection = True
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix-socket"
+
+    def log_message(self, format, *args):
+        log.debug("%s - " + format, self.address_string(), *args)
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    """Create (but do not start) the HTTP server on a TCP port or a Unix socket"""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, LetterRequestHandler)
+    return ThreadingHTTPServer((host, port), LetterRequestHandler)
+
+# ==========================
+# Main Function
+# ==========================
+def parse_args(argv):
+    """Parse --host/--port/--unix-socket, falling back to LETTER_SERVICE_* env vars"""
+    options = {
+        "host": os.getenv("LETTER_SERVICE_HOST", DEFAULT_HOST),
+        "port": int(os.getenv("LETTER_SERVICE_PORT", DEFAULT_PORT)),
+        "unix_socket": os.getenv("LETTER_SERVICE_SOCKET"),
+    }
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == "--host" and args:
+            options["host"] = args.pop(0)
+        elif flag == "--port" and args:
+            options["port"] = int(args.pop(0))
+        elif flag == "--unix-socket" and args:
+            options["unix_socket"] = args.pop(0)
+        else:
+            raise ValueError(f"Unknown argument: {flag}")
+    return options
+
+def main():
+    options = parse_args(sys.argv[1:])
+    server = create_server(**options)
+    where = options["unix_socket"] or f"http://{options['host']}:{options['port']}"
+    # Build the shared client before requests race for it
+    get_openai_client()
+    print(f"✅ Letter service listening on {where}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if options["unix_socket"] and os.path.exists(options["unix_socket"]):
+            os.remove(options["unix_socket"])
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        log.error("Letter service failed: %s", e)
+        dump_log_buffer("service failed")
+        sys.exit(1)
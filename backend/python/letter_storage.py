@@ -0,0 +1,187 @@
+# backend/python/letter_storage.py
+"""Collision-free, atomic storage for generated letters.
+
+Every letter gets a unique id (UTC timestamp + random suffix) in its file
+name, so concurrent requests for the same subject or student and two edits
+in the same second never overwrite each other. Files are written to a
+temporary name in the target directory and renamed into place, so readers
+never see a half-written docx. Each letter-type directory is sharded by
+month and two hex characters of the id (nfa/2026-10/3f/...), which keeps
+every directory small.
+
+Rendered documents can also be handed back in memory (base64 in the JSON
+result, or raw bytes from the letter service) with disk persistence done
+synchronously (default), in the background, or not at all.
+
+Environment:
+    LETTER_STORAGE_SHARDING=0   write into the flat letter-type directory (old layout)
+    LETTER_PERSIST              sync (default) | async | none, when a request does not say
+"""
+import os
+import re
+import uuid
+import base64
+import tempfile
+import threading
+from io import BytesIO
+from datetime import datetime, timezone
+from letter_common import get_logger
+
+log = get_logger("letter_storage")
+
+PERSIST_SYNC = "sync"
+PERSIST_ASYNC = "async"
+PERSIST_NONE = "none"
+PERSIST_MODES = (PERSIST_SYNC, PERSIST_ASYNC, PERSIST_NONE)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+# Characters Windows and the old sanitizers never allowed in file names
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+def sharding_enabled():
+    return os.getenv("LETTER_STORAGE_SHARDING", "1").lower() not in ("0", "false", "no")
+
+def new_letter_id():
+    """Unique, time-sortable id: 20261018T190107Z-3f9a1c2e"""
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}"
+
+def safe_name_part(text, max_length=None):
+    """File-name-safe version of a subject/name: spaces to underscores, unsafe characters replaced"""
+    text = (text or "").replace(' ', '_')
+    if max_length:
+        text = text[:max_length]
+    return _UNSAFE_CHARS.sub('_', text)
+
+def letter_path(directory, stem, extension=".docx", letter_id=None):
+    """Full path for a new letter file: <directory>/<shard>/<stem>_<id><extension>.
+
+    Nothing is created here: the shard directory appears when the file is
+    written, so in-memory (persist "none") letters leave no empty directories.
+    """
+    letter_id = letter_id or new_letter_id()
+    if sharding_enabled():
+        directory = os.path.join(directory, letter_id[:4] + "-" + letter_id[4:6], letter_id[-8:-6])
+    return os.path.join(directory, f"{stem}_{letter_id}{extension}")
+
+def url_path(path, root, url_prefix):
+    """URL of a stored file below root: /generated_letters/nfa + /2026-10/3f/name.docx"""
+    relative = os.path.relpath(path, root).replace(os.sep, "/")
+    return f"{url_prefix.rstrip('/')}/{relative}"
+
+def atomic_save(doc, path):
+    """Save a python-docx Document (or anything with .save(file)) to path via a temp file + rename"""
+    return _atomic_replace(path, doc.save)
+
+def atomic_write(data, path):
+    """Write already rendered bytes to path via a temp file + rename"""
+    return _atomic_replace(path, lambda stream: stream.write(data))
+
+def atomic_write_stream(path, write):
+    """Call write(stream) on a temp file that is renamed to path once it returns (e.g. a streamed ZIP)"""
+    return _atomic_replace(path, write)
+
+def _atomic_replace(path, write):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(handle, "wb") as stream:
+            write(stream)
+            stream.flush()
+            os.fsync(stream.fileno())
+        # mkstemp creates 0600; letters are served by the web server like before
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    log.debug("Saved %s", path)
+    return path
+
+# ==========================
+# In-Memory Delivery
+# ==========================
+def resolve_persist_mode(requested=None):
+    """Persistence for this request: the request's choice, else LETTER_PERSIST, else sync"""
+    mode = (requested or os.getenv("LETTER_PERSIST") or PERSIST_SYNC).lower()
+    if mode not in PERSIST_MODES:
+        raise ValueError(f"Unknown persist mode '{mode}' (expected one of: {', '.join(PERSIST_MODES)})")
+    return mode
+
+def render_bytes(doc):
+    """The .docx bytes of a document, rendered in memory"""
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def _background_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from concurrent.futures import ThreadPoolExecutor
+            # Not a daemon: pending writes still finish when a one-shot run exits
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="letter-persist")
+        return _writer
+
+def persist_in_background(data, path, on_saved=None):
+    """Queue an atomic write; on_saved(path) runs after it lands. Returns the Future"""
+    def write():
+        try:
+            atomic_write(data, path)
+            if on_saved:
+                on_saved(path)
+        except Exception as e:
+            log.error("❌ Background save of %s failed: %s", path, e)
+            raise
+    return _background_writer().submit(write)
+
+def wait_for_pending_writes():
+    """Block until every queued background write has finished"""
+    with _writer_lock:
+        writer = _writer
+    if writer:
+        writer.submit(lambda: None).result()
+
+def deliver_document(doc, path, persist=PERSIST_SYNC, inline=False, on_saved=None):
+    """Persist and/or return a rendered document; returns the result fields.
+
+    sync writes before returning (the old behaviour), async renders in memory
+    and queues the write, none never touches the disk. With inline the bytes
+    come back as document_base64 (inline="bytes": raw document_bytes, for
+    in-process callers such as the letter service).
+    """
+    if persist == PERSIST_SYNC and not inline:
+        # Saved straight into the temp file; its position is the size, no stat of the result
+        sizes = []
+        def save(stream):
+            doc.save(stream)
+            sizes.append(stream.tell())
+        _atomic_replace(path, save)
+        if on_saved:
+            on_saved(path)
+        return {"persisted": persist, "document_size": sizes[0]}
+
+    return deliver_bytes(render_bytes(doc), path, persist, inline, on_saved)
+
+def deliver_bytes(data, path, persist=PERSIST_SYNC, inline=False, on_saved=None):
+    """deliver_document for an already rendered file (e.g. a PDF)"""
+    if persist == PERSIST_SYNC:
+        atomic_write(data, path)
+        if on_saved:
+            on_saved(path)
+    elif persist == PERSIST_ASYNC:
+        persist_in_background(data, path, on_saved)
+    return document_fields(data, persist, inline)
+
+def document_fields(data, persist, inline):
+    fields = {"persisted": persist, "document_size": len(data)}
+    if inline == "bytes":
+        fields["document_bytes"] = data
+    elif inline:
+        fields["document_base64"] = base64.b64encode(data).decode("ascii")
+    return fields
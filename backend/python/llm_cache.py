@@ -0,0 +1,325 @@
+# backend/python/llm_cache.py
+"""Disk-backed cache for chat completion responses, shared across processes.
+
+Entries are keyed by model, full prompt (all messages), temperature and
+max_tokens, stored in SQLite with a TTL and an LRU size limit.
+
+Environment:
+    LLM_CACHE_PATH         SQLite file (default backend/cache/llm_cache.sqlite3)
+    LLM_CACHE_TTL          seconds an entry stays valid (default 7 days)
+    LLM_CACHE_MAX_ENTRIES  LRU entry limit (default 5000)
+    LLM_CACHE_MAX_BYTES    LRU size limit for stored responses (default 50 MB)
+    LLM_CACHE_BYPASS=1     skip the cache entirely (no reads, no writes)
+
+Usage:
+    python llm_cache.py stats
+    python llm_cache.py clear
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from letter_common import backend_dir, timed_stage, record_llm_usage, get_logger
+
+log = get_logger("llm_cache")
+
+DEFAULT_CACHE_PATH = os.path.join(backend_dir, "cache", "llm_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+_cache = None
+_cache_lock = threading.Lock()
+
+class LLMCache:
+    """SQLite-backed LRU + TTL cache of completion text and token usage"""
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                usage TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens):
+        """Hash of everything that determines the completion"""
+        payload = json.dumps({
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _bump(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        """Return {"content", "usage"} for a live entry, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, usage, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds and now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+
+            if not row:
+                self.misses += 1
+                self._bump("misses")
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._bump("hits")
+            return {"content": row[0], "usage": json.loads(row[1]) if row[1] else None}
+
+    def put(self, key, model, content, usage=None):
+        """Store a completion and evict least-recently-used entries over the limits"""
+        now = time.time()
+        content = content or ""
+        usage_json = json.dumps(usage) if usage else None
+        size = len(content.encode("utf-8")) + len(usage_json or "")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, usage, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, content, usage_json, size, now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total_bytes -= size
+            evicted += 1
+        if evicted:
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('evictions', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (evicted,)
+            )
+
+    def stats(self):
+        """Entry/byte totals plus process-local and lifetime hit/miss counters"""
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "path": self.path,
+            "entries": count,
+            "bytes": total_bytes,
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM counters")
+
+def cache_bypassed():
+    return os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+def get_llm_cache():
+    """Process-wide cache instance configured from the environment (None if it cannot be opened)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = LLMCache(
+                    os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    ttl_seconds=int(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                )
+            except Exception as e:
+                log.warning("⚠️ LLM cache unavailable, continuing without it: %s", e)
+                _cache = False
+        return _cache or None
+
+def usage_to_dict(usage):
+    """Plain dict of token counts from an OpenAI usage object"""
+    if not usage:
+        return None
+    # Prompt tokens the API served from its prefix cache (absent on older API versions)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+        "cached_prompt_tokens": getattr(details, "cached_tokens", None),
+    }
+
+def _cache_for_call(use_cache):
+    return get_llm_cache() if use_cache and not cache_bypassed() else None
+
+def _lookup(cache, key, model):
+    try:
+        hit = cache.get(key)
+    except sqlite3.Error as e:
+        log.warning("⚠️ LLM cache read failed: %s", e)
+        return None
+    if hit:
+        log.debug("✅ LLM cache hit (%s)", model)
+        return {"content": hit["content"], "usage": hit["usage"], "cached": True}
+    return None
+
+def _store(cache, key, model, response):
+    content = response.choices[0].message.content or ""
+    usage = usage_to_dict(getattr(response, "usage", None))
+    if cache:
+        try:
+            cache.put(key, model, content, usage)
+        except sqlite3.Error as e:
+            log.warning("⚠️ LLM cache write failed: %s", e)
+    return {"content": content, "usage": usage, "cached": False}
+
+def cached_chat_completion(client, model, messages, max_tokens, temperature, use_cache=True, on_delta=None, label=None):
+    """chat.completions.create() behind the disk cache.
+
+    Returns {"content", "usage", "cached"}; errors from the API propagate so
+    callers keep their existing fallbacks. With on_delta the completion is
+    streamed and on_delta(text) is called for every content delta (a cache
+    hit is delivered as a single delta). Time and token usage are recorded in
+    the current StageTimer under "llm"; label names the call in its per-call usage.
+    """
+    with timed_stage("llm"):
+        completion = _cached_chat_completion(client, model, messages, max_tokens, temperature, use_cache, on_delta)
+    record_llm_usage(completion["usage"], cached=completion["cached"], label=label)
+    return completion
+
+def _cached_chat_completion(client, model, messages, max_tokens, temperature, use_cache, on_delta):
+    cache = _cache_for_call(use_cache)
+    key = LLMCache.make_key(model, messages, temperature, max_tokens) if cache else None
+    if cache:
+        hit = _lookup(cache, key, model)
+        if hit:
+            if on_delta and hit["content"]:
+                on_delta(hit["content"])
+            return hit
+
+    if on_delta:
+        content, usage = _stream_completion(client, model, messages, max_tokens, temperature, on_delta)
+        if cache:
+            try:
+                cache.put(key, model, content, usage)
+            except sqlite3.Error as e:
+                log.warning("⚠️ LLM cache write failed: %s", e)
+        return {"content": content, "usage": usage, "cached": False}
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+    return _store(cache, key, model, response)
+
+def _stream_completion(client, model, messages, max_tokens, temperature, on_delta):
+    """Run a streaming completion, forwarding deltas; returns (full content, usage)"""
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = usage_to_dict(chunk.usage)
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            parts.append(text)
+            on_delta(text)
+    return "".join(parts), usage
+
+async def cached_chat_completion_async(client, model, messages, max_tokens, temperature, use_cache=True):
+    """cached_chat_completion() for an AsyncOpenAI client (same cache, same result shape)"""
+    cache = _cache_for_call(use_cache)
+    key = LLMCache.make_key(model, messages, temperature, max_tokens) if cache else None
+    if cache:
+        hit = _lookup(cache, key, model)
+        if hit:
+            return hit
+
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+    return _store(cache, key, model, response)
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = get_llm_cache()
+    if not cache:
+        print(json.dumps({"success": False, "error": "LLM cache could not be opened"}))
+        sys.exit(1)
+
+    if command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif command == "clear":
+        cache.clear()
+        print(json.dumps({"success": True, "message": "LLM cache cleared"}))
+    else:
+        print("Usage: llm_cache.py [stats|clear]", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# backend/python/nfa_edits.py
+"""Section-targeted AI edits for NFA text.
+
+A request such as "change the venue in bullet 2" only needs bullet 2. The
+edit text is split into lines (subject, paragraphs, bullets, conclusion,
+plus letterhead/table lines that are never edited). The request is matched
+to the line(s) it names and only those go to the model, with the subject as
+context. The rewritten lines are spliced back in place, so every other line
+comes back byte for byte. Requests that cannot be pinned to a few lines
+return None and the caller falls back to the full-document edit.
+"""
+import re
+from functools import lru_cache
+from letter_common import get_logger
+from nfa_sections import CONCLUSION_RE, is_subject
+
+log = get_logger("nfa_edits")
+
+SUBJECT = "subject"
+PARAGRAPH = "paragraph"
+BULLET = "bullet"
+CONCLUSION = "conclusion"
+FIXED = "fixed"
+
+# More than this many targeted lines is not a small edit any more
+MAX_TARGET_LINES = 4
+MAX_SECTION_TOKENS = 200
+
+_ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "last": -1}
+_ORDINAL = r"(first|second|third|fourth|fifth|sixth|last|\d+)(?:st|nd|rd|th)?"
+_NUMBERED_RE = {
+    BULLET: (re.compile(_ORDINAL + r"\s+bullet", re.IGNORECASE),
+             re.compile(r"bullet(?:\s+point)?\s*(?:#|no\.?|number)?\s*(\d+)", re.IGNORECASE)),
+    PARAGRAPH: (re.compile(_ORDINAL + r"\s+paragraph", re.IGNORECASE),
+                re.compile(r"paragraph\s*(?:#|no\.?|number)?\s*(\d+)", re.IGNORECASE)),
+}
+_ALL_BULLETS_RE = re.compile(r"\bbullet", re.IGNORECASE)
+_OPENING_RE = re.compile(r"\b(opening|intro(?:duction)?|request paragraph|first paragraph|main paragraph)\b", re.IGNORECASE)
+_SUBJECT_RE = re.compile(r"\b(subject|title)\b", re.IGNORECASE)
+_CONCLUSION_REQUEST_RE = re.compile(r"\b(conclusion|closing|final (?:line|paragraph|sentence))\b", re.IGNORECASE)
+_GLOBAL_RE = re.compile(r"\b(whole|entire|everything|overall|throughout|all sections|rewrite|regenerate|document|tone)\b", re.IGNORECASE)
+_QUOTED_RE = re.compile(r"[\"“']([^\"”']{3,})[\"”']")
+_FROM_TO_RE = re.compile(r"\bfrom\s+(.{3,}?)\s+to\s+", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9&.-]{3,}", re.IGNORECASE)
+_STOPWORDS = frozenset("""
+    about above add after again also change correct could delete edit from have into it's just keep line
+    make mention more need please remove replace reword same should that their them then there these this
+    update want what when which with would instead rather point points bullet bullets paragraph sentence
+""".split())
+
+SECTION_EDIT_SYSTEM_PROMPT = (
+    "You edit part of an NFA (Note For Approval). Apply the requested change to the given section(s) only "
+    "and keep everything else in them unchanged, in the same formal style and about the same length unless "
+    "asked otherwise. Bullet lines start with \"• \". Reply with only the rewritten section(s), each under "
+    "its own \"### n\" header line, and no commentary."
+)
+
+# ==========================
+# Line Structure
+# ==========================
+def _is_fixed(line):
+    """Letterhead, date, title and preview-table lines are never sent to the model"""
+    stripped = line.strip()
+    return (
+        not stripped
+        or stripped.startswith("Date:")
+        or stripped == "Note For Approval (NFA)"
+        or stripped.endswith("Table:")
+        or " | " in stripped
+        or stripped.startswith("+-")
+    )
+
+@lru_cache(maxsize=32)
+def parse_edit_lines(text):
+    """Classify every line of the edit text -> ((kind, ordinal), ...), cached per text.
+
+    The preview text starts with the letterhead block, which ends at the
+    NFA title; everything above it is fixed.
+    """
+    lines = text.split("\n")
+    title = next((i for i, line in enumerate(lines) if line.strip() == "Note For Approval (NFA)"), None)
+    counts = {}
+    kinds = []
+    subject_seen = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if (title is not None and i <= title) or _is_fixed(line):
+            kind = FIXED
+        elif is_subject(stripped) or (not subject_seen and not counts.get(PARAGRAPH) and not counts.get(BULLET)
+                                      and not stripped.startswith("Request for approval")):
+            kind = SUBJECT
+        elif stripped.startswith("•"):
+            kind = BULLET
+        elif CONCLUSION_RE.search(stripped):
+            kind = CONCLUSION
+        else:
+            kind = PARAGRAPH
+        subject_seen = subject_seen or kind == SUBJECT
+        counts[kind] = counts.get(kind, 0) + 1
+        kinds.append((kind, counts[kind]))
+    return tuple(kinds)
+
+def _lines_of(kinds, kind):
+    return [i for i, (line_kind, _) in enumerate(kinds) if line_kind == kind]
+
+def _numbered(kinds, kind, number):
+    """Line index of the n-th line of a kind (-1 = last), or None"""
+    indexes = _lines_of(kinds, kind)
+    if not indexes:
+        return None
+    if number == -1:
+        return indexes[-1]
+    return indexes[number - 1] if 0 < number <= len(indexes) else None
+
+# ==========================
+# Targeting
+# ==========================
+def find_edit_targets(text, edit_prompt):
+    """Line indexes the edit request is about, or None when it should edit the whole document"""
+    kinds = parse_edit_lines(text)
+    lines = text.split("\n")
+    if _GLOBAL_RE.search(edit_prompt):
+        return None
+
+    targets = set()
+    for kind, (ordinal_re, number_re) in _NUMBERED_RE.items():
+        for match in ordinal_re.finditer(edit_prompt):
+            word = match.group(1).lower()
+            index = _numbered(kinds, kind, _ORDINALS[word] if word in _ORDINALS else int(word))
+            if index is not None:
+                targets.add(index)
+        for match in number_re.finditer(edit_prompt):
+            index = _numbered(kinds, kind, int(match.group(1)))
+            if index is not None:
+                targets.add(index)
+
+    # "add a bullet", "shorten the bullets": the bullet list as a whole
+    if not targets and _ALL_BULLETS_RE.search(edit_prompt):
+        targets.update(_lines_of(kinds, BULLET))
+    if _OPENING_RE.search(edit_prompt):
+        targets.update(_lines_of(kinds, PARAGRAPH)[:1])
+    if _SUBJECT_RE.search(edit_prompt):
+        targets.update(_lines_of(kinds, SUBJECT))
+    if _CONCLUSION_REQUEST_RE.search(edit_prompt):
+        targets.update(_lines_of(kinds, CONCLUSION))
+
+    if not targets:
+        targets.update(_literal_targets(lines, kinds, edit_prompt))
+
+    if not targets or len(targets) > MAX_TARGET_LINES:
+        return None
+    return sorted(targets)
+
+def _literal_targets(lines, kinds, edit_prompt):
+    """Lines holding text the request quotes ("from X to Y", 'X') or, failing that, its distinctive words"""
+    editable = [i for i, (kind, _) in enumerate(kinds) if kind != FIXED]
+    phrases = [match.group(1) for match in _QUOTED_RE.finditer(edit_prompt)]
+    phrases += [match.group(1).strip(" \"'“”") for match in _FROM_TO_RE.finditer(edit_prompt)]
+    for phrase in phrases:
+        hits = [i for i in editable if phrase.lower() in lines[i].lower()]
+        if hits:
+            return hits
+
+    # Words from the request that appear in exactly one editable line
+    hits = set()
+    for word in _WORD_RE.findall(edit_prompt):
+        word = word.lower().rstrip(".")
+        if word in _STOPWORDS:
+            continue
+        matches = [i for i in editable if re.search(r"\b" + re.escape(word) + r"\b", lines[i], re.IGNORECASE)]
+        if len(matches) == 1:
+            hits.add(matches[0])
+    return hits
+
+def group_targets(targets):
+    """Consecutive line indexes form one block -> [[i, i+1], [j], ...]"""
+    blocks = []
+    for index in targets:
+        if blocks and index == blocks[-1][-1] + 1:
+            blocks[-1].append(index)
+        else:
+            blocks.append([index])
+    return blocks
+
+# ==========================
+# Prompt and Splice
+# ==========================
+def plan_section_edit(text, edit_prompt):
+    """Everything a section edit needs (blocks, messages, token budget), or None for a full edit"""
+    targets = find_edit_targets(text, edit_prompt)
+    if not targets:
+        return None
+    kinds = parse_edit_lines(text)
+    lines = text.split("\n")
+    blocks = group_targets(targets)
+
+    subject_index = next((i for i, (kind, _) in enumerate(kinds) if kind == SUBJECT), None)
+    parts = []
+    if subject_index is not None and subject_index not in targets:
+        parts.append(f"Subject of the NFA: {lines[subject_index].strip()}")
+    for number, block in enumerate(blocks, 1):
+        label = ", ".join(sorted({kinds[i][0] for i in block}))
+        parts.append(f"### {number} ({label})\n" + "\n".join(lines[i] for i in block))
+    parts.append(f"Change: {edit_prompt}")
+
+    words = sum(len(lines[i].split()) for i in targets)
+    return {
+        "lines": lines,
+        "blocks": blocks,
+        "kinds": [kinds[i][0] for i in targets],
+        "messages": [
+            {"role": "system", "content": SECTION_EDIT_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n\n".join(parts)},
+        ],
+        # Room for the rewritten lines plus one added bullet
+        "max_tokens": min(MAX_SECTION_TOKENS, int(words * 1.5) + 60),
+    }
+
+def _reply_blocks(reply, count):
+    """Split the model reply on its ### headers -> list of line lists, or None if it does not match the request"""
+    sections = re.split(r"^\s*###\s*\d+[^\n]*$", reply.strip(), flags=re.MULTILINE)
+    if sections and not sections[0].strip():
+        sections = sections[1:]
+    if len(sections) != count:
+        return None
+    blocks = []
+    for section in sections:
+        block_lines = [line.rstrip() for line in section.strip().split("\n") if line.strip()]
+        if not block_lines:
+            return None
+        blocks.append(block_lines)
+    return blocks
+
+def apply_section_reply(plan, reply):
+    """Splice the rewritten blocks into the original lines; None when the reply cannot be used"""
+    replacements = _reply_blocks(reply, len(plan["blocks"]))
+    if replacements is None:
+        return None
+    lines = plan["lines"]
+    kinds = parse_edit_lines("\n".join(lines))
+    replaced = {}
+    for block, new_lines in zip(plan["blocks"], replacements):
+        block_kinds = {kinds[i][0] for i in block}
+        # A reply that rewrote more than it was given (a whole NFA, a new conclusion) is not a section edit
+        if len(new_lines) > len(block) + 2:
+            return None
+        if CONCLUSION not in block_kinds and any(CONCLUSION_RE.search(line) for line in new_lines):
+            return None
+        if SUBJECT not in block_kinds and any(is_subject(line) for line in new_lines):
+            return None
+        # Bullet blocks stay bullets even if the model dropped the symbol
+        if block_kinds == {BULLET}:
+            new_lines = [line if line.lstrip().startswith("•") else f"• {line.strip()}" for line in new_lines]
+        replaced[block[0]] = new_lines
+    skipped = {i for block in plan["blocks"] for i in block[1:]}
+
+    output = []
+    for i, line in enumerate(lines):
+        if i in replaced:
+            output.extend(replaced[i])
+        elif i not in skipped:
+            output.append(line)
+    return "\n".join(output)
+
+def section_edit(client, text, edit_prompt, on_delta=None):
+    """Edit only the lines the request targets; returns the full edited text, or None for a full edit.
+
+    on_delta receives the finished document as a single delta (the streamed
+    section text alone would not be a document preview).
+    """
+    plan = plan_section_edit(text, edit_prompt)
+    if plan is None:
+        return None
+    log.debug("Section edit: %s line(s) (%s)", sum(len(block) for block in plan["blocks"]), ", ".join(plan["kinds"]))
+
+    from llm_cache import cached_chat_completion
+    completion = cached_chat_completion(
+        client,
+        model="gpt-4o-mini",
+        messages=plan["messages"],
+        max_tokens=plan["max_tokens"],
+        temperature=0.1,
+        label="edit_section"
+    )
+    edited = apply_section_reply(plan, completion["content"])
+    if edited is None:
+        log.warning("⚠️ Section edit reply did not match the requested sections, editing the whole document")
+        return None
+    if on_delta:
+        on_delta(edited)
+    return edited
@@ -0,0 +1,462 @@
+# backend/python/nfa_layout.py
+"""Single-page fit estimator for NFA documents.
+
+Measures a built document (paragraph text against font metrics, spacing,
+table rows, the header image and the signature grid) and predicts how much
+of the page it uses. fit_to_single_page() then applies the least aggressive
+layout profile that is predicted to fit, so the document is only tightened
+as much as it needs to be.
+"""
+import os
+import math
+from letter_common import get_logger
+
+log = get_logger("nfa_layout")
+
+PT_PER_TWIP = 1 / 20
+PT_PER_EMU = 1 / 12700
+
+# Keep a little room for what the estimate does not model (kerning, widow control)
+FIT_MARGIN = 0.02
+
+# Helvetica/Arial advance widths (1/1000 em) for ASCII 32..126
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_DEFAULT_WIDTH = 556
+_BOLD_FACTOR = 1.06
+
+# (width factor relative to Arial, natural line height as a multiple of the font size)
+FONT_METRICS = {
+    "arial": (1.0, 1.15),
+    "helvetica": (1.0, 1.15),
+    "calibri": (0.9, 1.22),
+    "times new roman": (0.88, 1.15),
+    "cambria": (0.95, 1.17),
+}
+# The default template's theme font
+DEFAULT_FONT = "calibri"
+
+# Layout profiles, least aggressive first. Sizes scale from the built document:
+# body text 11pt -> 10pt, bullets -> 9.5pt, tables 10pt -> 9pt at the tightest.
+FIT_PROFILES = (
+    {"name": "as_built"},
+    {"name": "tight_spacing", "spacing": 0, "line": 240},
+    {"name": "compact_blank_lines", "spacing": 0, "line": 240, "blank_pt": 6},
+    {"name": "small_text", "spacing": 0, "line": 240, "blank_pt": 6,
+     "text_scale": 10.5 / 11, "table_scale": 0.95},
+    {"name": "condensed", "spacing": 0, "line": 240, "blank_pt": 4,
+     "text_scale": 10 / 11, "bullet_scale": 9.5 / 11, "table_scale": 0.9},
+)
+MIN_FONT_PT = 9
+
+# A shorten request may drop at most this share of the body; beyond that the table is the problem
+MAX_SHORTEN_SHARE = 0.5
+
+_TAGS = {}
+
+# ==========================
+# Font Metrics
+# ==========================
+def font_metrics(font_name):
+    return FONT_METRICS.get((font_name or DEFAULT_FONT).lower(), FONT_METRICS[DEFAULT_FONT])
+
+def text_units(text):
+    """Advance width of text in 1/1000 em (Arial metrics)"""
+    total = 0
+    for ch in text:
+        code = ord(ch)
+        total += _HELVETICA_WIDTHS[code - 32] if 32 <= code < 127 else _DEFAULT_WIDTH
+    return total
+
+def scaled_size(size_pt, scale):
+    """Font size after scaling, in the half points Word stores, never below MIN_FONT_PT"""
+    if not scale or scale == 1:
+        return size_pt
+    return max(min(size_pt, MIN_FONT_PT), round(size_pt * scale * 2) / 2)
+
+# ==========================
+# Measuring
+# ==========================
+def _tag(name):
+    """Clark-notation tag for a prefixed name, cached (qn() per cell dominates long tables)"""
+    tag = _TAGS.get(name)
+    if tag is None:
+        from docx.oxml.ns import qn
+        tag = _TAGS[name] = qn(name)
+    return tag
+
+def _styles(doc):
+    """Paragraph defaults the measurement falls back to: docDefaults, then Normal"""
+    defaults = {"size": 11.0, "font": None, "before": 0, "after": 0, "line": 240, "rule": "auto"}
+    styles = doc.styles.element
+    doc_defaults = styles.find(_tag('w:docDefaults'))
+    if doc_defaults is not None:
+        _read_rpr(doc_defaults.find(_tag('w:rPrDefault') + '/' + _tag('w:rPr')), defaults)
+        _read_ppr(doc_defaults.find(_tag('w:pPrDefault') + '/' + _tag('w:pPr')), defaults)
+    try:
+        normal = doc.styles['Normal'].element
+        _read_rpr(normal.find(_tag('w:rPr')), defaults)
+        _read_ppr(normal.find(_tag('w:pPr')), defaults)
+    except KeyError:
+        pass
+    return defaults
+
+def _read_rpr(rPr, props):
+    """Copy size/font/bold from an <w:rPr> into props (only what it sets)"""
+    if rPr is None:
+        return props
+    sz = rPr.find(_tag('w:sz'))
+    if sz is not None and sz.get(_tag('w:val')):
+        props["size"] = int(sz.get(_tag('w:val'))) / 2
+    fonts = rPr.find(_tag('w:rFonts'))
+    if fonts is not None and fonts.get(_tag('w:ascii')):
+        props["font"] = fonts.get(_tag('w:ascii'))
+    bold = rPr.find(_tag('w:b'))
+    if bold is not None:
+        props["bold"] = bold.get(_tag('w:val')) not in ("0", "false")
+    return props
+
+def _read_ppr(pPr, props):
+    """Copy spacing (before/after/line/rule) from an <w:pPr> into props (only what it sets)"""
+    if pPr is None:
+        return props
+    spacing = pPr.find(_tag('w:spacing'))
+    if spacing is not None:
+        for key, attr in (("before", 'w:before'), ("after", 'w:after'), ("line", 'w:line')):
+            value = spacing.get(_tag(attr))
+            if value is not None:
+                props[key] = int(value)
+        rule = spacing.get(_tag('w:lineRule'))
+        if rule:
+            props["rule"] = rule
+    return props
+
+def _table_style_ppr(doc, tbl):
+    """Paragraph spacing a table style applies to its cells (Table Grid: single, no space after)"""
+    style = tbl.find(_tag('w:tblPr') + '/' + _tag('w:tblStyle'))
+    if style is None:
+        return {}
+    for candidate in doc.styles:
+        if candidate.style_id == style.get(_tag('w:val')):
+            return _read_ppr(candidate.element.find(_tag('w:pPr')), {})
+    return {}
+
+def _measure_paragraph(p, defaults):
+    """One paragraph: its word widths at the built font sizes plus spacing and images"""
+    w_r, w_t, w_tab, w_br = _tag('w:r'), _tag('w:t'), _tag('w:tab'), _tag('w:br')
+    pPr = p.find(_tag('w:pPr'))
+    props = _read_ppr(pPr, dict(defaults))
+    mark = _read_rpr(pPr.find(_tag('w:rPr')) if pPr is not None else None, dict(defaults))
+
+    words, word = [], 0.0
+    sizes, fonts, text_parts, space_width = [], [], [], 0.0
+    image_pt = 0.0
+    for r in p.iter(w_r):
+        run = _read_rpr(r.find(_tag('w:rPr')), {"size": props.get("size", defaults["size"]),
+                                               "font": defaults["font"], "bold": False})
+        width_factor = font_metrics(run["font"])[0] * (_BOLD_FACTOR if run.get("bold") else 1)
+        em = run["size"] * width_factor / 1000
+        space_width = max(space_width, 278 * em)
+        for child in r:
+            if child.tag == w_t and child.text:
+                sizes.append(run["size"])
+                fonts.append(run["font"])
+                text_parts.append(child.text)
+                for index, piece in enumerate(child.text.split(' ')):
+                    if index:
+                        words.append(word)
+                        word = 0.0
+                    word += text_units(piece) * em
+            elif child.tag == w_tab:
+                word += 4 * 278 * em
+            elif child.tag == w_br:
+                words.append(word)
+                words.append(None)
+                word = 0.0
+        for extent in r.iter(_tag('wp:extent')):
+            image_pt = max(image_pt, int(extent.get('cy', 0)) * PT_PER_EMU)
+    words.append(word)
+
+    text = "".join(text_parts).strip()
+    if image_pt:
+        kind = "image"
+    elif not text:
+        kind = "blank"
+    elif text.startswith('•'):
+        kind = "bullet"
+    else:
+        kind = "text"
+    return {
+        "kind": kind,
+        "element": p,
+        "words": words,
+        "space": space_width,
+        "size": max(sizes) if sizes else mark["size"],
+        "font": fonts[0] if fonts else mark["font"],
+        "before": props["before"] * PT_PER_TWIP,
+        "after": props["after"] * PT_PER_TWIP,
+        "line": props["line"],
+        "rule": props["rule"],
+        "image_pt": image_pt,
+    }
+
+def _measure_table(doc, tbl, defaults):
+    """One table: per row, per cell the usable width and the measured paragraphs"""
+    cell_defaults = dict(defaults)
+    cell_defaults.update(_table_style_ppr(doc, tbl))
+    grid = [int(col.get(_tag('w:w'), 0)) * PT_PER_TWIP for col in tbl.iter(_tag('w:gridCol'))]
+    # Table Grid and the default table style both pad cells by 0.08" left and right
+    padding = 2 * 108 * PT_PER_TWIP
+    rows = []
+    for tr in tbl.iterchildren(_tag('w:tr')):
+        cells = []
+        col = 0
+        for tc in tr.iterchildren(_tag('w:tc')):
+            span = tc.find(_tag('w:tcPr') + '/' + _tag('w:gridSpan'))
+            span = int(span.get(_tag('w:val'))) if span is not None else 1
+            width = sum(grid[col:col + span]) if grid else 0
+            col += span
+            paragraphs = [_measure_paragraph(p, cell_defaults) for p in tc.iterchildren(_tag('w:p'))]
+            cells.append({"width": max(width - padding, 1.0), "paragraphs": paragraphs})
+        rows.append(cells)
+    return {"kind": "table", "element": tbl, "rows": rows}
+
+def measure_document(doc):
+    """Measure every body block once -> {"page": ..., "blocks": [...]} for estimate_height"""
+    section = doc.sections[-1]
+    page = {
+        "width": (section.page_width - section.left_margin - section.right_margin) * PT_PER_EMU,
+        "height": (section.page_height - section.top_margin - section.bottom_margin) * PT_PER_EMU,
+    }
+    defaults = _styles(doc)
+    blocks = []
+    for child in doc.element.body.iterchildren():
+        if child.tag == _tag('w:p'):
+            blocks.append(_measure_paragraph(child, defaults))
+        elif child.tag == _tag('w:tbl'):
+            blocks.append(_measure_table(doc, child, defaults))
+    if blocks and blocks[-1]["kind"] == "table":
+        # Word always ends the body with a paragraph, even when python-docx saved none
+        trailing = {"kind": "blank", "element": None, "words": [0.0], "space": 0.0, "size": defaults["size"],
+                    "font": defaults["font"], "before": defaults["before"] * PT_PER_TWIP,
+                    "after": defaults["after"] * PT_PER_TWIP, "line": defaults["line"], "rule": defaults["rule"],
+                    "image_pt": 0.0}
+        blocks.append(trailing)
+    return {"page": page, "blocks": blocks, "body": doc.element.body}
+
+# ==========================
+# Estimating
+# ==========================
+def count_lines(words, space, width):
+    """Greedy word wrap, the way Word breaks a justified/left-aligned line"""
+    lines, line = 1, 0.0
+    for word in words:
+        if word is None:
+            lines += 1
+            line = 0.0
+            continue
+        if line and line + word > width:
+            lines += 1
+            line = 0.0
+        if word > width:
+            lines += int(word // width)
+            word = word % width
+        line += word + space
+    return lines
+
+def paragraph_size(block, profile, in_table=False):
+    """Font size the profile gives this paragraph"""
+    if block["kind"] == "blank" and profile.get("blank_pt"):
+        return min(block["size"], profile["blank_pt"])
+    if in_table:
+        return scaled_size(block["size"], profile.get("table_scale"))
+    if block["kind"] == "bullet" and profile.get("bullet_scale"):
+        return scaled_size(block["size"], profile["bullet_scale"])
+    if block["kind"] in ("text", "bullet"):
+        return scaled_size(block["size"], profile.get("text_scale"))
+    return block["size"]
+
+def paragraph_height(block, width, profile, in_table=False):
+    """(height in points, wrapped lines, line height) of one measured paragraph under a profile"""
+    size = paragraph_size(block, profile, in_table)
+    ratio = size / block["size"] if block["size"] else 1
+    if "spacing" in profile:
+        before = after = profile["spacing"]
+    else:
+        before, after = block["before"], block["after"]
+    line, rule = (profile["line"], "auto") if "line" in profile else (block["line"], block["rule"])
+
+    natural = size * font_metrics(block["font"])[1]
+    if rule == "exact":
+        line_height = line * PT_PER_TWIP
+    elif rule == "atLeast":
+        line_height = max(natural, line * PT_PER_TWIP)
+    else:
+        line_height = natural * line / 240
+
+    if block["kind"] == "image":
+        return block["image_pt"] + before + after, 1, block["image_pt"]
+    if block["kind"] == "blank":
+        lines = 1
+    else:
+        lines = count_lines(block["words"], block["space"], width / ratio)
+    return lines * line_height + before + after, lines, line_height
+
+def estimate_height(measured, profile, limit=None):
+    """Predicted height of the body in points, plus the lines and words of text outside tables.
+
+    With limit, counting stops once the height passes it (long annexures
+    need not be walked row by row to know they overflow).
+    """
+    width = measured["page"]["width"]
+    total, text_lines, text_words, line_height = 0.0, 0, 0, 0.0
+    for block in measured["blocks"]:
+        if limit is not None and total > limit:
+            break
+        if block["kind"] == "table":
+            for cells in block["rows"]:
+                row = 0.0
+                for cell in cells:
+                    height = sum(paragraph_height(p, cell["width"], profile, in_table=True)[0]
+                                 for p in cell["paragraphs"])
+                    row = max(row, height)
+                total += row
+                if limit is not None and total > limit:
+                    break
+            continue
+        height, lines, block_line_height = paragraph_height(block, width, profile)
+        total += height
+        if block["kind"] in ("text", "bullet"):
+            text_lines += lines
+            text_words += sum(1 for word in block["words"] if word)
+            line_height = max(line_height, block_line_height)
+    return {"height": total, "text_lines": text_lines, "text_words": text_words, "line_height": line_height}
+
+# ==========================
+# Applying a Profile
+# ==========================
+def _set_spacing(block, profile):
+    """Write the profile's spacing unless the paragraph already has it"""
+    spacing = profile.get("spacing")
+    line = profile.get("line")
+    if spacing is None and line is None:
+        return
+    if ((spacing is None or block["before"] == block["after"] == spacing)
+            and (line is None or (block["line"] == line and block["rule"] == "auto"))):
+        return
+    element = block["element"].get_or_add_pPr().get_or_add_spacing()
+    if spacing is not None:
+        twips = str(int(spacing / PT_PER_TWIP))
+        element.set(_tag('w:before'), twips)
+        element.set(_tag('w:after'), twips)
+    if line is not None:
+        element.set(_tag('w:line'), str(line))
+        element.set(_tag('w:lineRule'), 'auto')
+
+def _set_size(p, size):
+    """Give every run (and the paragraph mark) of a paragraph an explicit size"""
+    from docx.oxml import OxmlElement
+    from docx.shared import Pt
+
+    half_points = str(int(round(size * 2)))
+    pPr = p.get_or_add_pPr()
+    mark = pPr.find(_tag('w:rPr'))
+    if mark is None:
+        mark = OxmlElement('w:rPr')
+        pPr.append(mark)
+    for rPr in [mark] + [r.get_or_add_rPr() for r in p.iter(_tag('w:r'))]:
+        sz = rPr.find(_tag('w:sz'))
+        if sz is not None:
+            sz.set(_tag('w:val'), half_points)
+        else:
+            rPr.sz_val = Pt(size)
+
+def _apply_to_paragraph(block, profile, in_table=False):
+    _set_spacing(block, profile)
+    size = paragraph_size(block, profile, in_table)
+    if size != block["size"]:
+        _set_size(block["element"], size)
+
+def apply_profile(measured, profile):
+    """Write a profile's spacing and font sizes into the measured document"""
+    for block in measured["blocks"]:
+        if block["element"] is None:
+            # Make Word's implicit closing paragraph real so the profile can size it
+            block["element"] = measured["body"].add_p()
+        if block["kind"] == "table":
+            for cells in block["rows"]:
+                for cell in cells:
+                    for paragraph in cell["paragraphs"]:
+                        _apply_to_paragraph(paragraph, profile, in_table=True)
+        else:
+            _apply_to_paragraph(block, profile)
+
+# ==========================
+# Fitting
+# ==========================
+def fit_to_single_page(doc, profiles=FIT_PROFILES):
+    """Apply the first profile predicted to fit on one page and return the plan.
+
+    When none fits, overflow_lines is measured at the tightest profile (what a
+    shorter body would have to make up) but only the spacing profile is
+    applied: shrinking the text of a document that spills over anyway would
+    just make every page harder to read.
+    """
+    measured = measure_document(doc)
+    page_height = measured["page"]["height"]
+    available = page_height * (1 - FIT_MARGIN)
+    # A document twice the page height is out of reach for any profile or a shorter body
+    for profile in profiles:
+        estimate = estimate_height(measured, profile, limit=2 * page_height)
+        if estimate["height"] <= available:
+            break
+
+    overflow = max(estimate["height"] - available, 0.0)
+    overflow_lines = math.ceil(overflow / (estimate["line_height"] or 12.0)) if overflow else 0
+    if overflow and len(profiles) > 1:
+        profile = profiles[1]
+        applied = estimate_height(measured, profile)
+    else:
+        applied = estimate
+
+    if profile is not profiles[0]:
+        apply_profile(measured, profile)
+
+    plan = {
+        "fits": overflow == 0,
+        "profile": profile["name"],
+        "pages": max(1, math.ceil(applied["height"] / page_height)),
+        "used_pt": round(applied["height"], 1),
+        "available_pt": round(available, 1),
+        "text_lines": estimate["text_lines"],
+        "text_words": estimate["text_words"],
+        "overflow_lines": overflow_lines,
+    }
+    log.debug("Layout plan: %s", plan)
+    return plan
+
+def shorten_enabled():
+    """NFA_FIT_SHORTEN=0 turns off the follow-up shorten request when the tightest layout overflows"""
+    return os.getenv("NFA_FIT_SHORTEN", "1").lower() not in ("0", "false", "no")
+
+def words_to_cut(plan, body_text):
+    """Words a shorten request should remove from body_text so the plan fits, or 0 when it cannot help.
+
+    Only worth asking when the overflow is body text the model wrote: if the
+    table and signatures alone overflow, trimming the body would not fit it.
+    """
+    if plan["fits"] or not plan["text_lines"]:
+        return 0
+    words = len(body_text.split())
+    per_line = plan["text_words"] / plan["text_lines"]
+    # One extra line of slack so the retry lands inside the page
+    cut = math.ceil((plan["overflow_lines"] + 1) * per_line)
+    if cut > words * MAX_SHORTEN_SHARE:
+        return 0
+    return cut
@@ -0,0 +1,251 @@
+# backend/python/nfa_pdf.py
+"""Direct PDF rendering of an NFA with reportlab (no office suite involved).
+
+Lays out the same content as create_proper_nfa_document: header image,
+date, title, subject, body paragraphs and bullets, the annexure table, the
+conclusion and the 2x2 signature grid (with scanned signatures when there
+are any), on a Letter page with the docx margins and Helvetica standing in
+for Arial (same metrics). Like the docx single-page fit, it tries the
+layout profiles from least to most compact and keeps the first one that
+fits on one page.
+
+reportlab is imported only when a PDF is rendered, so the generators work
+without it as long as nobody asks for PDF output.
+
+Environment:
+    NFA_OUTPUT_FORMAT   docx (default) | pdf | both, when a request does not say
+"""
+import os
+import importlib.util
+from io import BytesIO
+from datetime import datetime
+from xml.sax.saxutils import escape
+from letter_common import find_header_image, get_logger
+from nfa_sections import split_sections
+
+log = get_logger("nfa_pdf")
+
+FORMAT_DOCX = "docx"
+FORMAT_PDF = "pdf"
+FORMAT_BOTH = "both"
+OUTPUT_FORMATS = (FORMAT_DOCX, FORMAT_PDF, FORMAT_BOTH)
+PDF_MIME_TYPE = "application/pdf"
+
+# Page geometry of the docx template (inches)
+PAGE_SIZE_IN = (8.5, 11)
+MARGINS_IN = {"top": 0.5, "bottom": 0.5, "left": 0.75, "right": 0.75}
+SIGNATURE_COLUMNS_IN = (2.2, 1.6, 2.2)
+
+# Least aggressive first, mirroring nfa_layout.FIT_PROFILES (sizes in pt)
+PDF_FIT_PROFILES = (
+    {"name": "as_built", "text": 11, "bullet": 11, "table": 1.0, "blank": None},
+    {"name": "compact_blank_lines", "text": 11, "bullet": 11, "table": 1.0, "blank": 6},
+    {"name": "small_text", "text": 10.5, "bullet": 10.5, "table": 0.95, "blank": 6},
+    {"name": "condensed", "text": 10, "bullet": 9.5, "table": 0.9, "blank": 4},
+)
+
+# Characters outside the standard PDF fonts' encoding
+_REPLACEMENTS = {"₹": "Rs. ", "−": "-"}
+
+_image_sizes = {}
+
+def pdf_available():
+    return importlib.util.find_spec("reportlab") is not None
+
+def resolve_output_format(requested=None):
+    """Output format for this request: the request's choice, else NFA_OUTPUT_FORMAT, else docx"""
+    output_format = (requested or os.getenv("NFA_OUTPUT_FORMAT") or FORMAT_DOCX).lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}' (expected one of: {', '.join(OUTPUT_FORMATS)})")
+    if output_format != FORMAT_DOCX and not pdf_available():
+        raise ValueError("PDF output needs reportlab (pip install reportlab)")
+    return output_format
+
+# ==========================
+# Flowables
+# ==========================
+def markup(text):
+    """Plain text as reportlab paragraph markup"""
+    text = "".join(_REPLACEMENTS.get(ch, ch) for ch in str(text or ""))
+    return escape(text).replace("\n", "<br/>")
+
+def _image_size(path):
+    """Pixel size of an image file, decoded once per modification time"""
+    from reportlab.lib.utils import ImageReader
+
+    key = (path, os.path.getmtime(path))
+    if key not in _image_sizes:
+        _image_sizes[key] = ImageReader(path).getSize()
+    return _image_sizes[key]
+
+def _styles(profile):
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.enums import TA_JUSTIFY, TA_RIGHT, TA_CENTER, TA_LEFT
+
+    text, bullet, table = profile["text"], profile["bullet"], profile["table"]
+    return {
+        "body": ParagraphStyle("body", fontName="Helvetica", fontSize=text, leading=text * 1.15, alignment=TA_JUSTIFY),
+        "bullet": ParagraphStyle("bullet", fontName="Helvetica", fontSize=bullet, leading=bullet * 1.15, alignment=TA_JUSTIFY),
+        "date": ParagraphStyle("date", fontName="Helvetica", fontSize=11, leading=11 * 1.15, alignment=TA_RIGHT),
+        "title": ParagraphStyle("title", fontName="Helvetica-Bold", fontSize=12, leading=12 * 1.15, alignment=TA_CENTER),
+        "table_header": ParagraphStyle("table_header", fontName="Helvetica-Bold", fontSize=11 * table,
+                                       leading=11 * table * 1.15, alignment=TA_CENTER),
+        "table_body": ParagraphStyle("table_body", fontName="Helvetica", fontSize=10 * table,
+                                     leading=10 * table * 1.15, alignment=TA_CENTER),
+        "signature": ParagraphStyle("signature", fontName="Helvetica", fontSize=10, leading=11.5, alignment=TA_LEFT),
+    }
+
+def _blank(profile, styles):
+    from reportlab.platypus import Spacer
+
+    return Spacer(1, profile["blank"] if profile["blank"] is not None else styles["body"].leading)
+
+def _annexure_table(table_data, width, styles):
+    """Bordered table: bold header (repeated on every page) and total row, centered cells"""
+    from reportlab.platypus import Table, TableStyle, Paragraph
+    from reportlab.lib import colors
+
+    cols = len(table_data[0]) if table_data else 0
+    if cols == 0:
+        return None
+    last = len(table_data) - 1
+    rows = []
+    for index, row in enumerate(table_data):
+        style = styles["table_header"] if index in (0, last) else styles["table_body"]
+        values = [markup(value) for value in list(row)[:cols]]
+        values += [""] * (cols - len(values))
+        rows.append([Paragraph(value, style) for value in values])
+    table = Table(rows, colWidths=[width / cols] * cols, repeatRows=1, hAlign="CENTER")
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 1),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+    ]))
+    return table
+
+def _signature_image(signer):
+    """Scaled signature scan as a reportlab Image fitted to the docx signature box, or None"""
+    from reportlab.platypus import Image
+    from reportlab.lib.utils import ImageReader
+    from nfa_signatures import (
+        find_signature_image, prepared_signature, SIGNATURE_MAX_WIDTH_IN, SIGNATURE_MAX_HEIGHT_IN
+    )
+
+    path = find_signature_image(signer)
+    data = prepared_signature(path) if path else None
+    if not data:
+        return None
+    width, height = ImageReader(BytesIO(data)).getSize()
+    # add_picture sizes images at 72 dpi unless told otherwise; the box then scales them down
+    scale = min(SIGNATURE_MAX_WIDTH_IN * 72 / width, SIGNATURE_MAX_HEIGHT_IN * 72 / height, 1)
+    image = Image(BytesIO(data), width=width * scale, height=height * scale)
+    image.hAlign = "LEFT"
+    return image
+
+def _signature_table(left, right, styles):
+    """One row of the 2x2 grid: [image] line, name, designation for two signers"""
+    from reportlab.platypus import Table, TableStyle, Paragraph
+    from reportlab.lib.units import inch
+
+    def line_cell(signer):
+        image = _signature_image(signer)
+        line = Paragraph("_________________", styles["signature"])
+        return [image, line] if image else line
+
+    rows = [
+        [line_cell(left), "", line_cell(right)],
+        [Paragraph(markup(left.get("name", "")), styles["signature"]), "",
+         Paragraph(markup(right.get("name", "")), styles["signature"])],
+        [Paragraph(markup(left.get("designation", "")), styles["signature"]), "",
+         Paragraph(markup(right.get("designation", "")), styles["signature"])],
+        ["", "", ""],
+    ]
+    table = Table(rows, colWidths=[width * inch for width in SIGNATURE_COLUMNS_IN], hAlign="LEFT")
+    table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "BOTTOM"),
+        ("TOPPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 1),
+    ]))
+    return table
+
+def build_story(content, profile, width):
+    """Flowables for the whole NFA in document order"""
+    from reportlab.platypus import Paragraph, Image
+
+    styles = _styles(profile)
+    story = []
+    header_image_path = content.get("header_image_path")
+    if header_image_path and os.path.exists(header_image_path):
+        image_width, image_height = _image_size(header_image_path)
+        story.append(Image(header_image_path, width=width, height=width * image_height / image_width))
+        story += [_blank(profile, styles), _blank(profile, styles)]
+
+    story.append(Paragraph(f"Date: {content['date']}", styles["date"]))
+    story.append(_blank(profile, styles))
+    story.append(Paragraph("Note For Approval (NFA)", styles["title"]))
+    story.append(_blank(profile, styles))
+    story.append(Paragraph(f"<b>Subject: </b>{markup(content['subject'])}", styles["body"]))
+    story.append(_blank(profile, styles))
+
+    for section in split_sections(content["body"] or ""):
+        if '•' in section:
+            for line in section.split('\n'):
+                line = line.strip()
+                if line.startswith('•') and line[1:].strip():
+                    story.append(Paragraph(f"• {markup(line[1:].strip())}", styles["bullet"]))
+        elif section:
+            story.append(Paragraph(markup(section), styles["body"]))
+    story.append(_blank(profile, styles))
+
+    table = _annexure_table(content.get("table") or [], width, styles)
+    if table is not None:
+        story += [table, _blank(profile, styles)]
+
+    story.append(Paragraph(markup(content["closing"]), styles["body"]))
+    story.append(_blank(profile, styles))
+
+    layout = content["signatures"]
+    story.append(_blank(profile, styles))
+    story.append(_signature_table(layout.get("top_left") or {}, layout.get("top_right") or {}, styles))
+    story.append(_blank(profile, styles))
+    story.append(_signature_table(layout.get("bottom_left") or {}, layout.get("bottom_right") or {}, styles))
+    return story
+
+# ==========================
+# Rendering
+# ==========================
+def _render(content, profile):
+    """(pdf bytes, page count) for one layout profile"""
+    from reportlab.platypus import SimpleDocTemplate
+    from reportlab.lib.units import inch
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=(PAGE_SIZE_IN[0] * inch, PAGE_SIZE_IN[1] * inch),
+        topMargin=MARGINS_IN["top"] * inch, bottomMargin=MARGINS_IN["bottom"] * inch,
+        leftMargin=MARGINS_IN["left"] * inch, rightMargin=MARGINS_IN["right"] * inch,
+        title="Note For Approval (NFA)", subject=content["subject"], author="RV University",
+    )
+    doc.build(build_story(content, profile, doc.width))
+    return buffer.getvalue(), doc.page
+
+def render_nfa_pdf(subject_line, body_text, closing_line, table_data, signature_layout, header_image_path=None):
+    """Render the NFA as PDF; returns (bytes, plan) with the chosen profile and page count"""
+    content = {
+        "subject": subject_line,
+        "body": body_text,
+        "closing": closing_line,
+        "table": table_data,
+        "signatures": signature_layout,
+        "header_image_path": header_image_path or find_header_image(),
+        "date": datetime.now().strftime('%d-%m-%Y'),
+    }
+    for profile in PDF_FIT_PROFILES:
+        data, pages = _render(content, profile)
+        if pages == 1:
+            break
+    if pages > 1:
+        log.warning("⚠️ PDF still needs %s page(s) with the tightest layout", pages)
+    return data, {"profile": profile["name"], "pages": pages, "fits": pages == 1}
@@ -0,0 +1,56 @@
+# backend/python/nfa_prompts.py
+"""Prompt profiles for NFA generation.
+
+"full" is the original long-form prompt each generator builds itself.
+"compact" sends the same rules as one short system message that never
+changes between calls (so the API can reuse the cached prefix) followed by
+a user message that carries only the request's inputs.
+"""
+import os
+
+FULL = "full"
+COMPACT = "compact"
+PROMPT_PROFILES = (FULL, COMPACT)
+DEFAULT_PROMPT_PROFILE = FULL
+
+_COMPACT_RULES = """You write NFA (Note For Approval) documents for a university. Reply in plain text (no markdown) with exactly this layout:
+
+{first_line}
+
+Request for approval regarding <specific details from the summary>. <one or two short sentences of context>
+
+When bullets are requested, follow with exactly 3 lines starting with "• ", one sentence each, built from specific details of the summary (names, dates, places, participants, objectives); no generic filler. When they are not, stop after the paragraph.
+
+Rules:
+- The request paragraph is at most 3 short sentences.
+- Use only facts from the user's subject and summary.
+- Do not write a conclusion, approval line or signatures; they are added separately.
+- Keep it short: the note must fit on one page above a table.{style}"""
+
+# The original generator puts "Subject:" on the first line and asks for a more formal register
+COMPACT_SYSTEM_PROMPT = _COMPACT_RULES.format(first_line="<subject>", style="")
+COMPACT_SYSTEM_PROMPT_WITH_PREFIX = _COMPACT_RULES.format(
+    first_line="Subject: <subject>",
+    style="\n- Write in polished, formal English with precise vocabulary and flawless grammar.",
+)
+
+def resolve_prompt_profile(requested=None):
+    """Profile for this call: the request's choice, else NFA_PROMPT_PROFILE, else full"""
+    profile = (requested or os.getenv("NFA_PROMPT_PROFILE") or DEFAULT_PROMPT_PROFILE).lower()
+    if profile not in PROMPT_PROFILES:
+        raise ValueError(f"Unknown prompt profile '{profile}' (expected one of: {', '.join(PROMPT_PROFILES)})")
+    return profile
+
+def compact_generate_messages(subject, summary, nfa_type, need_bullets, subject_prefix=False):
+    """Chat messages for the compact profile: fixed system prefix, then only the inputs"""
+    system = COMPACT_SYSTEM_PROMPT_WITH_PREFIX if subject_prefix else COMPACT_SYSTEM_PROMPT
+    inputs = (
+        f"Subject: {subject}\n"
+        f"Summary: {summary}\n"
+        f"Type: {nfa_type}\n"
+        f"Bullets: {'yes' if need_bullets else 'no'}"
+    )
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": inputs},
+    ]
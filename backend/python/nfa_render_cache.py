@@ -0,0 +1,213 @@
+# backend/python/nfa_render_cache.py
+"""Content-addressed reuse of rendered NFA downloads.
+
+A download is keyed by a hash of everything that ends up in the docx: the
+normalized edited text, subject, type, table, signature layout, the
+renderer (script, the layout modules in RENDER_MODULES and
+RENDER_TEMPLATE_VERSION), the header image and today's date (printed in
+the letter). A repeat download with the same key returns
+the file that is already on disk instead of rendering it again.
+
+The index is a small SQLite table next to the LLM cache; the documents
+themselves stay where they always were. An entry whose file is gone or was
+rewritten since (size or modification time differ) is dropped and rendered
+again.
+
+Environment:
+    NFA_RENDER_CACHE_PATH    SQLite file (default backend/cache/render_cache.sqlite3)
+    NFA_RENDER_CACHE_TTL     seconds an entry stays valid (default 7 days)
+    NFA_RENDER_CACHE_BYPASS=1  always render (no reads, no writes)
+
+Usage:
+    python nfa_render_cache.py stats
+    python nfa_render_cache.py clear
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+from letter_common import backend_dir, find_header_image, get_logger
+
+log = get_logger("nfa_render_cache")
+
+# Bump when the download renderer changes in a way the inputs do not capture
+# (e.g. layout code outside the renderer script and RENDER_MODULES)
+RENDER_TEMPLATE_VERSION = 1
+
+# Layout code shared by the renderer scripts: a change to any of them changes the document
+RENDER_MODULES = ("letter_common.py", "nfa_sections.py", "nfa_tables.py", "nfa_layout.py", "nfa_signatures.py", "nfa_pdf.py")
+
+DEFAULT_CACHE_PATH = os.path.join(backend_dir, "cache", "render_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# ==========================
+# Keys
+# ==========================
+def normalize_text(text):
+    """Edited text as it affects the document: NFC, LF line ends, no trailing spaces or blank edges"""
+    text = unicodedata.normalize("NFC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_mtime_ns, stat.st_size]
+    except (OSError, TypeError):
+        return [path, None, None]
+
+def render_key(renderer, edited_text, subject, nfa_type, table_data, signatures, extra=None):
+    """Hash of every input of one download render.
+
+    renderer is the rendering script's path: its modification time and those
+    of the RENDER_MODULES next to it are part of the key, so deploying a
+    change to the layout code never serves a stale document. Changes that
+    live anywhere else need a RENDER_TEMPLATE_VERSION bump.
+    """
+    modules = [os.path.join(os.path.dirname(os.path.abspath(renderer)), name) for name in RENDER_MODULES]
+    payload = json.dumps({
+        "template": [os.path.basename(renderer), RENDER_TEMPLATE_VERSION, _file_stamp(renderer)[1],
+                     [_file_stamp(path)[1] for path in modules]],
+        "text": normalize_text(edited_text),
+        "subject": (subject or "").strip(),
+        "nfa_type": nfa_type,
+        "table": table_data or [],
+        "signatures": signatures,
+        "extra": extra,
+        "header": _file_stamp(find_header_image()),
+        "date": datetime.now().strftime("%Y-%m-%d"),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# ==========================
+# Index
+# ==========================
+class RenderCache:
+    """SQLite index: render key -> document already on disk"""
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS renders (
+                key TEXT PRIMARY KEY,
+                disk_path TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def get(self, key):
+        """(file_path, file_name, disk_path) of a live entry whose document is unchanged on disk, or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT disk_path, file_path, file_name, size, mtime_ns, created_at FROM renders WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            disk_path, file_path, file_name, size, mtime_ns, created_at = row
+            if _file_stamp(disk_path)[1:] != [mtime_ns, size] or (self.ttl_seconds and now - created_at > self.ttl_seconds):
+                self._conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE renders SET hits = hits + 1 WHERE key = ?", (key,))
+            return file_path, file_name, disk_path
+
+    def put(self, key, disk_path, file_path, file_name):
+        """Remember a freshly saved document; expired entries are pruned on the way"""
+        now = time.time()
+        stat = os.stat(disk_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO renders (key, disk_path, file_path, file_name, size, mtime_ns, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, disk_path, file_path, file_name, stat.st_size, stat.st_mtime_ns, now)
+            )
+            if self.ttl_seconds:
+                self._conn.execute("DELETE FROM renders WHERE created_at < ?", (now - self.ttl_seconds,))
+
+    def stats(self):
+        with self._lock:
+            count, hits = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM renders").fetchone()
+        return {"path": self.path, "entries": count, "hits": hits}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM renders")
+
+def cache_bypassed():
+    return os.getenv("NFA_RENDER_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+def get_render_cache():
+    """Process-wide index configured from the environment (None if bypassed or it cannot be opened)"""
+    global _cache
+    if cache_bypassed():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = RenderCache(
+                    os.getenv("NFA_RENDER_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    ttl_seconds=int(os.getenv("NFA_RENDER_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                )
+            except Exception as e:
+                log.warning("⚠️ Render cache unavailable, continuing without it: %s", e)
+                _cache = False
+        return _cache or None
+
+def lookup_render(key):
+    """(file_path, file_name, disk_path) of an earlier identical download, or None"""
+    cache = get_render_cache()
+    if not cache:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        log.warning("⚠️ Render cache lookup failed: %s", e)
+        return None
+
+def store_render(key, disk_path, file_path, file_name):
+    cache = get_render_cache()
+    if not cache:
+        return
+    try:
+        cache.put(key, disk_path, file_path, file_name)
+    except Exception as e:
+        log.warning("⚠️ Render cache write failed: %s", e)
+
+# ==========================
+# Main Function
+# ==========================
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = RenderCache(os.getenv("NFA_RENDER_CACHE_PATH", DEFAULT_CACHE_PATH))
+    if command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif command == "clear":
+        cache.clear()
+        print(json.dumps({"cleared": True, "path": cache.path}))
+    else:
+        print(json.dumps({"error": f"Unknown command: {command} (use stats or clear)"}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# backend/python/nfa_sections.py
+"""Section classifier shared by every NFA parsing path (generate, edit, download).
+
+The phrase sets are compiled once into case-insensitive alternation regexes,
+so each section or line is scanned a single time instead of once per keyword.
+"""
+import re
+
+# Sections/lines with these phrases are the conclusion (it is re-added after the table)
+CONCLUSION_PHRASES = (
+    "proposal is submitted",
+    "request your approval",
+    "kindly be released",
+    "kindly be reimbursed",
+    "above proposal is submitted",
+    "submitted for approval",
+    "organizing committee",
+    "after the event",
+    "upon submission",
+    "online report",
+    "receipts and gst bills",
+)
+
+# Shorter pieces of a conclusion that the AI sometimes leaves on their own line
+CONCLUSION_FRAGMENTS = (
+    "proposal is submitted",
+    "kindly be",
+    "organizing committee",
+    "after the event",
+    "upon submission",
+    "receipts and gst",
+)
+
+# The closing line the fixed generator keeps for the preview
+CLOSING_PHRASES = (
+    "proposal is submitted",
+    "request your approval",
+    "kindly be released",
+    "kindly be reimbursed",
+)
+
+SUBJECT = "subject"
+BODY = "body"
+BULLETS = "bullets"
+CONCLUSION = "conclusion"
+
+def compile_phrases(phrases):
+    """One case-insensitive alternation regex for a set of literal phrases"""
+    ordered = sorted(set(phrases), key=len, reverse=True)
+    return re.compile("|".join(re.escape(phrase) for phrase in ordered), re.IGNORECASE)
+
+CONCLUSION_RE = compile_phrases(CONCLUSION_PHRASES)
+CONCLUSION_LINE_RE = compile_phrases(CONCLUSION_PHRASES + CONCLUSION_FRAGMENTS)
+CLOSING_RE = compile_phrases(CLOSING_PHRASES)
+SUBJECT_RE = re.compile(r"\s*subject:", re.IGNORECASE)
+
+# ==========================
+# Matching
+# ==========================
+def is_conclusion(text, matcher=CONCLUSION_RE):
+    return matcher.search(text) is not None
+
+def is_conclusion_line(line):
+    """Conclusion phrase or leftover conclusion fragment (line-level filtering of AI output)"""
+    return CONCLUSION_LINE_RE.search(line) is not None
+
+def is_subject(text):
+    return SUBJECT_RE.match(text) is not None
+
+# ==========================
+# Sections
+# ==========================
+def split_sections(nfa_text):
+    """Split NFA text on blank lines, dropping empty sections"""
+    return [section.strip() for section in nfa_text.split('\n\n') if section.strip()]
+
+def classify_section(section, first=False, matcher=CONCLUSION_RE):
+    """Classify one section as subject / conclusion / bullets / body"""
+    if first:
+        return SUBJECT
+    if matcher.search(section):
+        return CONCLUSION
+    if is_subject(section):
+        return SUBJECT
+    if '•' in section:
+        return BULLETS
+    return BODY
+
+def classify_sections(nfa_text, matcher=CONCLUSION_RE, first_is_subject=True):
+    """Split and classify every section in a single pass -> [(kind, section)]"""
+    return [
+        (classify_section(section, first_is_subject and index == 0, matcher), section)
+        for index, section in enumerate(split_sections(nfa_text))
+    ]
+
+def last_of_kind(classified, kind):
+    """Text of the last section of the given kind, or None"""
+    for section_kind, section in reversed(classified):
+        if section_kind == kind:
+            return section
+    return None
+
+def content_sections(classified):
+    """Body and bullet sections in order (subject and conclusion sections dropped)"""
+    return [section for kind, section in classified if kind in (BODY, BULLETS)]
+
+def strip_conclusion_lines(text, matcher=CONCLUSION_LINE_RE, keep_subject=False):
+    """Drop every line with a conclusion phrase; subject lines always survive when keep_subject is set"""
+    kept = []
+    for line in text.split('\n'):
+        if keep_subject and line.strip().lower().startswith('subject'):
+            kept.append(line)
+        elif not matcher.search(line):
+            kept.append(line)
+    return '\n'.join(kept)
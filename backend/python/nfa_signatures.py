@@ -0,0 +1,293 @@
+# backend/python/nfa_signatures.py
+"""Signature layout for NFAs, cached per process.
+
+The 2x2 layout is read from database/signatures.json once and re-read only
+when the file's modification time (or size) changes. The rendered
+signature block (spacer paragraphs + two signature tables) is kept as a
+ready-made XML fragment per layout and page width, so every later document
+gets a copy of it instead of building eight cells run by run.
+
+Scanned signatures in uploads/signatures are placed above the signature
+lines. A signer's image is the file named by its "signature" field in
+signatures.json, or else <name>.png/.jpg (spaces -> underscores). Each scan
+is trimmed and scaled once (Pillow, optional) into an in-process and
+on-disk cache keyed by the file's mtime, so a document only carries a small
+PNG per signer.
+
+Environment:
+    NFA_SIGNATURE_IMAGES=0   never embed signature images
+"""
+import os
+import copy
+import json
+import hashlib
+import threading
+from io import BytesIO
+from letter_common import backend_dir, signatures_dir, get_logger
+
+log = get_logger("nfa_signatures")
+
+SIGNATURES_DB_PATH = os.path.join(backend_dir, "database", "signatures.json")
+
+DEFAULT_SIGNATURE_LAYOUT = {
+    'top_left': {'name': 'Dr Phani Kumar Pullela', 'designation': 'Dean, Student Affairs'},
+    'top_right': {'name': 'Mr Chandrasekhar KN', 'designation': 'Head Finance'},
+    'bottom_left': {'name': 'Dr Sahana D Gowda', 'designation': 'Registrar - RV University'},
+    'bottom_right': {'name': 'Prof (Dr) Dwarika Prasad Uniyal', 'designation': 'Vice Chancellor (i/c)'},
+}
+
+SIGNATURE_IMAGE_CACHE_DIR = os.path.join(backend_dir, "cache", "signatures")
+SIGNATURE_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Display box of a signature above its line, and the pixel size it is scaled to (~300 dpi)
+SIGNATURE_MAX_WIDTH_IN = 1.6
+SIGNATURE_MAX_HEIGHT_IN = 0.5
+SIGNATURE_MAX_PIXELS = (480, 150)
+# Without Pillow a scan is embedded as-is only up to this size
+SIGNATURE_MAX_RAW_BYTES = 200 * 1024
+# Prepared images kept in memory (one per scan path; long-running workers never grow past this)
+SIGNATURE_MEMORY_CACHE_SIZE = 64
+
+_lock = threading.Lock()
+_layout_cache = {}
+_fragments = {}
+_images = {}  # path -> (stamp, prepared bytes or None)
+
+# ==========================
+# Layout
+# ==========================
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+def layout_from_signatures(signatures):
+    """Map the roles of signatures.json onto the 2x2 grid (approved_by order 1 / 2 on the right)"""
+    approved = {}
+    for signer in signatures.get('approved_by') or []:
+        approved.setdefault(signer.get('order'), signer)
+    return {
+        'top_left': (signatures.get('prepared_by') or [{}])[0],
+        'top_right': approved.get(1, {}),
+        'bottom_left': (signatures.get('recommended_by') or [{}])[0],
+        'bottom_right': approved.get(2, {}),
+    }
+
+def load_signature_layout(path=SIGNATURES_DB_PATH, default=DEFAULT_SIGNATURE_LAYOUT):
+    """The signature layout from signatures.json, parsed again only when the file changes.
+
+    A missing or unreadable file gives the default layout (re-checked on
+    every call, so a file that appears later is picked up).
+    """
+    stamp = _file_stamp(path)
+    with _lock:
+        cached = _layout_cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        layout = default
+        if stamp is None:
+            log.debug("Signature database not found at %s, using default layout", path)
+        else:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    signatures = json.load(f).get('signatures', {})
+                layout = layout_from_signatures(signatures)
+                log.debug("Loaded signatures for %s roles from %s", len(signatures), path)
+            except Exception as e:
+                log.error("Error loading signature layout: %s", e)
+        _layout_cache[path] = (stamp, layout)
+        return layout
+
+def layout_version(layout):
+    """Short fingerprint of a layout (part of the fragment and render cache keys)"""
+    payload = json.dumps(layout, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+# ==========================
+# Signature Images
+# ==========================
+def signature_images_enabled():
+    return os.getenv("NFA_SIGNATURE_IMAGES", "1").lower() not in ("0", "false", "no")
+
+def find_signature_image(signer, directory=signatures_dir):
+    """Path of the scanned signature for one signer, or None"""
+    if not signer or not signature_images_enabled():
+        return None
+    named = signer.get('signature') or signer.get('signature_image')
+    candidates = [os.path.join(directory, named)] if named else []
+    name = (signer.get('name') or "").strip()
+    if name:
+        stem = name.replace(' ', '_')
+        candidates += [os.path.join(directory, stem + extension) for extension in SIGNATURE_IMAGE_EXTENSIONS]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _prepare_with_pillow(path):
+    """Trim the paper around the ink and scale down; returns PNG bytes"""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        gray = image.convert("L")
+        # Ink = anything noticeably darker than the paper
+        bbox = gray.point(lambda value: 255 if value < 200 else 0).getbbox()
+        if bbox:
+            gray = gray.crop(bbox)
+        gray.thumbnail(SIGNATURE_MAX_PIXELS, Image.LANCZOS)
+        buffer = BytesIO()
+        gray.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+def _prepare_raw(path):
+    size = os.path.getsize(path)
+    if size > SIGNATURE_MAX_RAW_BYTES:
+        log.warning("⚠️ Signature %s is %s KB; install Pillow to embed a scaled copy", os.path.basename(path), size // 1024)
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+def prepared_signature(path, cache_dir=SIGNATURE_IMAGE_CACHE_DIR):
+    """Trimmed and scaled image bytes for a signature scan (None if unusable).
+
+    Cached in memory and as <cache_dir>/<hash of path, mtime, size>.png, so a
+    scan is decoded once until it changes. A disk cache that cannot be
+    written only costs the re-decode next time.
+    """
+    stamp = _file_stamp(path)
+    if stamp is None:
+        return None
+    key = (path, stamp)
+    with _lock:
+        cached = _images.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    cached_path = os.path.join(cache_dir, digest + ".png")
+    data = None
+    try:
+        with open(cached_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        try:
+            data = _prepare_with_pillow(path)
+        except ImportError:
+            data = _prepare_raw(path)
+        except Exception as e:
+            log.warning("⚠️ Could not prepare signature %s: %s", os.path.basename(path), e)
+            data = None
+        else:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                from letter_storage import atomic_write
+                atomic_write(data, cached_path)
+            except OSError as e:
+                log.warning("⚠️ Could not cache signature %s: %s", os.path.basename(path), e)
+    with _lock:
+        # Replaces the entry of an older version of the same scan
+        _images.pop(path, None)
+        if len(_images) >= SIGNATURE_MEMORY_CACHE_SIZE:
+            _images.pop(next(iter(_images)))
+        _images[path] = (stamp, data)
+    return data
+
+def signature_images_version(layout):
+    """File stamps of the layout's signature images (part of the fragment and render cache keys)"""
+    stamps = []
+    for position in sorted(layout):
+        path = find_signature_image(layout.get(position))
+        stamps.append((position, path, _file_stamp(path) if path else None))
+    return tuple(stamps)
+
+def add_signature_image(cell, signer):
+    """Put the signer's scanned signature above the signature line in cell (no-op without one)"""
+    path = find_signature_image(signer)
+    data = prepared_signature(path) if path else None
+    if not data:
+        return False
+    from docx.shared import Inches, Emu
+
+    paragraph = cell.paragraphs[0].insert_paragraph_before()
+    paragraph.paragraph_format.space_before = 0
+    paragraph.paragraph_format.space_after = 0
+    picture = paragraph.add_run().add_picture(BytesIO(data))
+    # Fit into the signature box, keeping the aspect ratio
+    scale = min(Inches(SIGNATURE_MAX_WIDTH_IN) / picture.width, Inches(SIGNATURE_MAX_HEIGHT_IN) / picture.height, 1)
+    picture.width, picture.height = Emu(int(picture.width * scale)), Emu(int(picture.height * scale))
+    return True
+
+def _image_blobs(doc, elements):
+    """Image bytes behind every picture (a:blip r:embed) in elements, by relationship id"""
+    from docx.oxml.ns import qn
+
+    blobs = {}
+    for element in elements:
+        for blip in element.iter(qn('a:blip')):
+            rel_id = blip.get(qn('r:embed'))
+            if rel_id and rel_id not in blobs:
+                blobs[rel_id] = doc.part.related_parts[rel_id].blob
+    return blobs
+
+def _relink_images(doc, element, blobs):
+    """Add the fragment's images to doc and point the copied pictures at them"""
+    from docx.oxml.ns import qn
+
+    for blip in element.iter(qn('a:blip')):
+        blob = blobs.get(blip.get(qn('r:embed')))
+        if blob is not None:
+            rel_id, _ = doc.part.get_or_add_image(BytesIO(blob))
+            blip.set(qn('r:embed'), rel_id)
+
+# ==========================
+# Rendered Block
+# ==========================
+def _block_width(doc):
+    section = doc.sections[-1]
+    return (section.page_width, section.left_margin, section.right_margin)
+
+def _content_elements(body):
+    from docx.oxml.ns import qn
+
+    sect_pr = qn('w:sectPr')
+    return [element for element in body if element.tag != sect_pr]
+
+def _insert_at_end(body, element):
+    """Append to the document body, before the final section properties"""
+    sect_pr = body.sectPr
+    if sect_pr is not None:
+        sect_pr.addprevious(element)
+    else:
+        body.append(element)
+
+def add_cached_signature_block(doc, variant, layout, build):
+    """Append the signature block that build(doc, layout) renders, building it once per layout.
+
+    variant names the renderer (the two generators format the block
+    differently). The first call runs build on doc itself and keeps a copy
+    of the body elements it added; later calls with the same variant, layout
+    and page width append copies of those elements.
+    """
+    key = (variant, layout_version(layout), signature_images_version(layout), _block_width(doc))
+    body = doc.element.body
+    with _lock:
+        fragment = _fragments.get(key)
+    if fragment is not None:
+        elements, blobs = fragment
+        for element in elements:
+            element = copy.deepcopy(element)
+            if blobs:
+                _relink_images(doc, element, blobs)
+            _insert_at_end(body, element)
+        return
+
+    content_before = len(_content_elements(body))
+    build(doc, layout)
+    added = _content_elements(body)[content_before:]
+    with _lock:
+        _fragments[key] = ([copy.deepcopy(element) for element in added], _image_blobs(doc, added))
+    log.debug("Cached signature block '%s' (%s elements)", variant, len(added))
@@ -0,0 +1,186 @@
+# backend/python/nfa_tables.py
+"""Bulk table writer for NFA annexures.
+
+Builds the whole <w:tbl> XML (table style, repeating header row, column
+widths, per-row run formatting) in one pass and parses it once, instead of
+filling and formatting cells one at a time through python-docx.
+"""
+import re
+from xml.sax.saxutils import escape
+from letter_common import get_logger
+
+log = get_logger("nfa_tables")
+
+TWIPS_PER_INCH = 1440
+EMU_PER_TWIP = 635
+
+# Characters python-docx rejects as not XML compatible (tab/newline/CR are handled separately)
+_INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_TABLE_BORDERS = (
+    '<w:tblBorders>'
+    + "".join(f'<w:{edge} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+              for edge in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    + '</w:tblBorders>'
+)
+
+# ==========================
+# XML Fragments
+# ==========================
+def clean_cell_text(value):
+    """Cell text the way the table functions always cleaned it: stripped, single line, XML safe"""
+    text = str(value).strip() if value is not None else ""
+    text = text.replace('\x00', '').replace('\r', '').replace('\n', ' ')
+    return _INVALID_XML_CHARS.sub('', text)
+
+def attribute(value):
+    """Escape a value for use inside a double-quoted XML attribute"""
+    return escape(value, {'"': "&quot;"})
+
+def run_properties_xml(size_pt, bold=False, font_name=None):
+    """<w:rPr> for one row format (shared by every cell in the row)"""
+    parts = []
+    if font_name:
+        font = attribute(font_name)
+        parts.append(f'<w:rFonts w:ascii="{font}" w:hAnsi="{font}"/>')
+    if bold:
+        parts.append('<w:b/>')
+    parts.append(f'<w:sz w:val="{int(size_pt * 2)}"/>')
+    return f'<w:rPr>{"".join(parts)}</w:rPr>'
+
+def text_xml(text):
+    """<w:t>/<w:tab/> children for cell text (tabs become real tab elements like run.text does)"""
+    return '<w:tab/>'.join(
+        f'<w:t xml:space="preserve">{escape(piece)}</w:t>' if piece else ''
+        for piece in text.split('\t')
+    )
+
+def table_style_id(doc, style_name):
+    """Style id for a table style name, or None when the template does not define it"""
+    try:
+        return doc.styles[style_name].style_id
+    except KeyError:
+        return None
+
+def block_width_twips(doc):
+    """Width between the margins of the last section, in twips (what doc.add_table uses)"""
+    from docx.shared import Inches
+
+    section = doc.sections[-1]
+    width = (section.page_width or Inches(8.5)) - (section.left_margin or Inches(1)) - (section.right_margin or Inches(1))
+    return int(width) // EMU_PER_TWIP
+
+# ==========================
+# Bulk Table Writer
+# ==========================
+def build_table_xml(table_data, column_widths, style_id=None, header_size=11, body_size=10,
+                    font_name=None, bold_last_row=False):
+    """Serialize the whole table (header row first) as one <w:tbl> string"""
+    from docx.oxml.ns import nsdecls
+
+    cols = len(column_widths)
+    cell_pPr = ('<w:pPr><w:spacing w:before="0" w:after="0" w:line="240" w:lineRule="auto"/>'
+                '<w:jc w:val="center"/></w:pPr>')
+    header_rPr = run_properties_xml(header_size, bold=True, font_name=font_name)
+    body_rPr = run_properties_xml(body_size, font_name=font_name)
+    last_rPr = run_properties_xml(header_size, bold=True, font_name=font_name) if bold_last_row else body_rPr
+    tcPrs = [f'<w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>' for width in column_widths]
+    empty_cells = [f'<w:tc>{tcPr}<w:p/></w:tc>' for tcPr in tcPrs]
+
+    parts = [f'<w:tbl {nsdecls("w")}><w:tblPr>']
+    if style_id:
+        parts.append(f'<w:tblStyle w:val="{attribute(style_id)}"/>')
+    parts.append('<w:tblW w:type="auto" w:w="0"/><w:jc w:val="center"/>')
+    if not style_id:
+        parts.append(_TABLE_BORDERS)
+    parts.append('<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+                 'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>')
+    parts.extend(f'<w:gridCol w:w="{width}"/>' for width in column_widths)
+    parts.append('</w:tblGrid>')
+
+    last_row = len(table_data) - 1
+    for row_idx, row_data in enumerate(table_data):
+        if row_idx == 0:
+            # Header row repeats at the top of every page the table spans
+            parts.append('<w:tr><w:trPr><w:tblHeader/></w:trPr>')
+            rPr = header_rPr
+        else:
+            parts.append('<w:tr>')
+            rPr = last_rPr if row_idx == last_row else body_rPr
+
+        values = list(row_data)[:cols]
+        for col_idx, value in enumerate(values):
+            parts.append(f'<w:tc>{tcPrs[col_idx]}<w:p>{cell_pPr}<w:r>{rPr}{text_xml(clean_cell_text(value))}</w:r></w:p></w:tc>')
+        parts.extend(empty_cells[len(values):])
+        parts.append('</w:tr>')
+
+    parts.append('</w:tbl>')
+    return "".join(parts)
+
+def add_bulk_table(doc, table_data, column_widths_in=None, style_name='Table Grid', header_size=11,
+                   body_size=10, font_name=None, bold_last_row=False):
+    """Append a formatted table (first row = header) to the document body; returns the docx Table.
+
+    column_widths_in gives widths in inches per column; by default the page
+    width is split evenly the way doc.add_table does.
+    """
+    from docx.oxml import parse_xml
+    from docx.table import Table
+
+    cols = len(table_data[0]) if table_data else 0
+    if cols == 0:
+        log.debug("Table has no columns, skipping")
+        return None
+
+    if column_widths_in:
+        column_widths = [int(width * TWIPS_PER_INCH) for width in column_widths_in[:cols]]
+    else:
+        column_widths = [block_width_twips(doc) // cols] * cols
+
+    style_id = table_style_id(doc, style_name)
+    if style_name and not style_id:
+        log.warning("Warning: table style '%s' not in template, using explicit borders", style_name)
+
+    tbl = parse_xml(build_table_xml(table_data, column_widths, style_id, header_size, body_size,
+                                    font_name, bold_last_row))
+    doc.element.body._insert_tbl(tbl)
+    return Table(tbl, doc._body)
+
+def default_column_widths(cols):
+    """Sl.no narrow, total slightly wider, everything between 1.5" (inches)"""
+    if cols == 1:
+        return [0.8]
+    return [0.8] + [1.5] * (cols - 2) + [1.0]
+
+# ==========================
+# Table Walks
+# ==========================
+# These read the table XML directly; python-docx's row.cells and
+# paragraph.text run an XPath query per cell/paragraph, which dominates the
+# render time of long annexures.
+def iter_text_elements(table):
+    """Every <w:t> inside one table"""
+    from docx.oxml.ns import qn
+
+    return table._tbl.iter(qn('w:t'))
+
+def cell_text(tc):
+    """Text of one <w:tc>, paragraphs joined by newlines (tabs and breaks kept, like _Cell.text)"""
+    from docx.oxml.ns import qn
+
+    w_t, w_tab, w_br = qn('w:t'), qn('w:tab'), qn('w:br')
+    paragraphs = []
+    for p in tc.iterchildren(qn('w:p')):
+        pieces = []
+        for element in p.iter(w_t, w_tab, w_br):
+            if element.tag == w_t:
+                pieces.append(element.text or "")
+            elif element.getparent().tag == qn('w:r'):
+                pieces.append("\t" if element.tag == w_tab else "\n")
+        paragraphs.append("".join(pieces))
+    return "\n".join(paragraphs)
+
+def iter_row_texts(table):
+    """Cell texts of each row, read from the row XML (the NFA tables have no merged cells)"""
+    for tr in table._tbl.tr_lst:
+        yield [cell_text(tc) for tc in tr.tc_lst]
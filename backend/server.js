@@ -129,6 +129,14 @@ app.get("/api/health", (req, res) => {
   res.json({ success: true, message: "Backend is healthy 🚀" });
 });
 
+// Write a JSON request to a Python script started with --stdin
+const sendRequestPayload = (pythonProcess, payload) => {
+  pythonProcess.stdin.on('error', (error) => {
+    console.log(`⚠️ Could not write request to Python stdin: ${error.message}`);
+  });
+  pythonProcess.stdin.end(payload);
+};
+
 // ✅ NFA Generation API endpoint
 app.post("/api/generate-nfa", async (req, res) => {
   console.log("📝 NFA Generation API called");
@@ -136,7 +144,13 @@ app.post("/api/generate-nfa", async (req, res) => {
   try {
     const { subject, summary, nfaType, needBullets, tableData } = req.body;
     
-    console.log("📝 NFA Generation inputs:", { subject, summary, nfaType, needBullets, tableData });
+    console.log("📝 NFA Generation inputs:", {
+      subjectLength: (subject || "").length,
+      summaryLength: (summary || "").length,
+      nfaType,
+      needBullets,
+      tableRows: Array.isArray(tableData) ? tableData.length : 0
+    });
     
     if (!subject || !summary) {
       return res.status(400).json({
@@ -147,12 +161,19 @@ app.post("/api/generate-nfa", async (req, res) => {
     
     // Prepare Python script arguments
     const pythonScript = path.join(__dirname, 'python', 'generate_nfa_automation_fixed.py');
-    const bulletsArg = needBullets ? 'yes' : 'no';
-    const tableDataJson = JSON.stringify(tableData || []);
+    // Inputs go over stdin as one JSON request (no argv size limits, nothing in `ps`)
+    const payload = JSON.stringify({
+      mode: 'generate',
+      subject,
+      summary,
+      nfaType,
+      needBullets: Boolean(needBullets),
+      tableData: tableData || []
+    });
     
-    const args = [pythonScript, subject, summary, nfaType, bulletsArg, tableDataJson];
+    const args = [pythonScript, '--stdin'];
     
-    console.log("🐍 Running Python script with args:", args);
+    console.log(`🐍 Running Python script with a ${Buffer.byteLength(payload)} byte request on stdin`);
     
     // Try different Python commands
     const pythonCommands = ['python', 'python3', 'py'];
@@ -178,6 +199,7 @@ app.post("/api/generate-nfa", async (req, res) => {
     }
     
     console.log(`✅ Python process spawned with command: ${pythonCommand}`);
+    sendRequestPayload(pythonProcess, payload);
     
     let stdout = '';
     let stderr = '';
@@ -192,13 +214,13 @@ app.post("/api/generate-nfa", async (req, res) => {
     
     pythonProcess.on('close', (code) => {
       console.log(`🐍 Python process exited with code: ${code}`);
-      console.log(`📤 Python stdout: ${stdout}`);
-      console.log(`📤 Python stderr: ${stderr}`);
+      console.log(`📤 Python stdout: ${stdout.length} bytes`);
+      if (stderr) console.log(`📤 Python stderr: ${stderr}`);
       
       if (code === 0) {
         try {
           const result = JSON.parse(stdout);
-          console.log("✅ NFA generation successful:", result);
+          console.log("✅ NFA generation successful:", result.file_path);
           res.json(result);
         } catch (parseError) {
           console.error("❌ Failed to parse Python output:", parseError);
@@ -317,7 +339,10 @@ app.get("/api/test-python", (req, res) => {
 
 // ✅ Edit NFA using Python script with fallback
 app.post("/api/edit-nfa", (req, res) => {
-  console.log("✏️ Edit NFA request received:", req.body);
+  console.log("✏️ Edit NFA request received:", {
+    textLength: (req.body.text || "").length,
+    promptLength: (req.body.prompt || "").length
+  });
   
   const { text, prompt, subject, summary, nfaType, bulletsRequired, tableData } = req.body;
   
@@ -333,9 +358,10 @@ app.post("/api/edit-nfa", (req, res) => {
   
   try {
     const pythonScript = path.join(__dirname, 'python', 'generate_nfa_automation.py');
-    const args = ['--edit-mode', text, prompt];
+    const args = ['--stdin'];
+    const payload = JSON.stringify({ mode: 'edit', text: text || "", prompt: prompt || "" });
     
-    console.log("🐍 Running Python script for edit:", pythonScript, "with args:", args);
+    console.log(`🐍 Running Python script for edit: ${pythonScript} (${Buffer.byteLength(payload)} byte request on stdin)`);
     
     // Try different Python commands - prioritize 'python' on Windows
     const pythonCommands = ['python', 'python3', 'py'];
@@ -361,6 +387,7 @@ app.post("/api/edit-nfa", (req, res) => {
     }
     
     console.log(`🐍 Using Python command for edit: ${pythonCommand}`);
+    sendRequestPayload(pythonProcess, payload);
     
     let stdout = '';
     let stderr = '';
@@ -375,13 +402,13 @@ app.post("/api/edit-nfa", (req, res) => {
     
     pythonProcess.on('close', (code) => {
       console.log(`🐍 Python edit process exited with code ${code}`);
-      console.log("📤 Python stdout:", stdout);
-      console.log("📤 Python stderr:", stderr);
+      console.log(`📤 Python stdout: ${stdout.length} bytes`);
+      if (stderr) console.log("📤 Python stderr:", stderr);
       
       if (code === 0) {
         try {
           const result = JSON.parse(stdout);
-          console.log("✅ Python edit success:", result);
+          console.log(`✅ Python edit success: ${(result.editedText || "").length} characters`);
           res.json(result);
         } catch (parseError) {
           console.error("❌ Error parsing Python edit output:", parseError);
@@ -409,9 +436,14 @@ app.post("/api/edit-nfa", (req, res) => {
 
 // ✅ Download Edited NFA using Python script with fallback
 app.post("/api/download-edited-nfa", (req, res) => {
-  console.log("📥 Download Edited NFA request received:", req.body);
+  console.log("📥 Download Edited NFA request received:", {
+    editedTextLength: (req.body.editedText || "").length,
+    nfaType: req.body.nfaType,
+    format: req.body.format || "docx",
+    tableRows: Array.isArray(req.body.tableData) ? req.body.tableData.length : 0
+  });
   
-  const { editedText, subject, summary, nfaType, tableData } = req.body;
+  const { editedText, subject, summary, nfaType, tableData, format } = req.body;
   
   // Fallback response for download mode
   const createDownloadFallbackResponse = () => {
@@ -426,17 +458,21 @@ app.post("/api/download-edited-nfa", (req, res) => {
   };
   
   try {
-    const pythonScript = path.join(__dirname, 'python', 'generate_nfa_automation.py');
-    const args = [
-      '--download-mode',
-      editedText || "",
-      subject || "NFA Request",
-      summary || "NFA Request Summary",
-      nfaType || "reimbursement",
-      JSON.stringify(tableData || [])
-    ];
+    // docx downloads keep the original renderer; only the fixed script can write PDFs
+    const wantsPdf = Boolean(format) && format !== 'docx';
+    const pythonScript = path.join(__dirname, 'python', wantsPdf ? 'generate_nfa_automation_fixed.py' : 'generate_nfa_automation.py');
+    const args = ['--stdin'];
+    const payload = JSON.stringify({
+      mode: 'download',
+      editedText: editedText || "",
+      subject: subject || "NFA Request",
+      summary: summary || "NFA Request Summary",
+      nfaType: nfaType || "reimbursement",
+      tableData: tableData || [],
+      ...(wantsPdf ? { format } : {})
+    });
     
-    console.log("🐍 Running Python script for download:", pythonScript, "with args:", args);
+    console.log(`🐍 Running Python script for download: ${pythonScript} (${Buffer.byteLength(payload)} byte request on stdin)`);
     
     // Try different Python commands - prioritize 'python' on Windows
     const pythonCommands = ['python', 'python3', 'py'];
@@ -462,6 +498,7 @@ app.post("/api/download-edited-nfa", (req, res) => {
     }
     
     console.log(`🐍 Using Python command for download: ${pythonCommand}`);
+    sendRequestPayload(pythonProcess, payload);
     
     let stdout = '';
     let stderr = '';
@@ -476,13 +513,13 @@ app.post("/api/download-edited-nfa", (req, res) => {
     
     pythonProcess.on('close', (code) => {
       console.log(`🐍 Python download process exited with code ${code}`);
-      console.log("📤 Python stdout:", stdout);
-      console.log("📤 Python stderr:", stderr);
+      console.log(`📤 Python stdout: ${stdout.length} bytes`);
+      if (stderr) console.log("📤 Python stderr:", stderr);
       
       if (code === 0) {
         try {
           const result = JSON.parse(stdout);
-          console.log("✅ Python download success:", result);
+          console.log("✅ Python download success:", result.fileName);
           res.json(result);
         } catch (parseError) {
           console.error("❌ Error parsing Python download output:", parseError);
@@ -623,8 +660,8 @@ RV University`;
     
     pythonProcess.on('close', (code) => {
       console.log(`🐍 Python job recommendation script exited with code: ${code}`);
-      console.log("📤 Python stdout:", stdout);
-      console.log("📤 Python stderr:", stderr);
+      console.log(`📤 Python stdout: ${stdout.length} bytes`);
+      if (stderr) console.log("📤 Python stderr:", stderr);
       
       if (code === 0) {
         try {
@@ -739,8 +776,8 @@ app.post("/api/download-job-recommendation", (req, res) => {
     
     pythonProcess.on('close', (code) => {
       console.log(`🐍 Python job recommendation download script exited with code: ${code}`);
-      console.log("📤 Python stdout:", stdout);
-      console.log("📤 Python stderr:", stderr);
+      console.log(`📤 Python stdout: ${stdout.length} bytes`);
+      if (stderr) console.log("📤 Python stderr:", stderr);
       
       if (code === 0) {
         try {